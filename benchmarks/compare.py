@@ -0,0 +1,54 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python benchmarks/compare.py benchmarks/results/abc123.json benchmarks/results/def456.json
+
+Exits with status 1 when a case present in both files got slower (or, for
+memory cases, bigger) than the threshold (10% by default).
+"""
+
+import argparse
+import json
+import sys
+
+from run import result_value
+
+
+def compare(base, new, threshold):
+    """Return (rows, regressions); a row is (case, base, new, unit, relative change)."""
+    rows = []
+    regressions = []
+    for case in sorted(set(base["results"]) & set(new["results"])):
+        before, unit = result_value(base["results"][case])
+        after, _ = result_value(new["results"][case])
+        change = (after - before) / before if before else 0.0
+        rows.append((case, before, after, unit, change))
+        if change > threshold:
+            regressions.append(case)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown, 0.10 is 10%%")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    rows, regressions = compare(base, new, args.threshold)
+    print(f"{base['meta']['commit']} -> {new['meta']['commit']}")
+    for case, before, after, unit, change in rows:
+        flag = "  REGRESSION" if case in regressions else ""
+        print(f"{case:<70} {before:>12.2f} {after:>12.2f} {unit} {change:>+8.1%}{flag}")
+    missing = set(base["results"]) ^ set(new["results"])
+    if missing:
+        print(f"{len(missing)} case(s) only in one file: {', '.join(sorted(missing))}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Local stand-in for a relay controller speaking the SR/GR line protocol."""
+
+import socketserver
+import threading
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True  # acks go out line by line; do not let Nagle hold them back
+
+    def handle(self):
+        for line in self.rfile:
+            parts = line.decode("utf-8").split()
+            if len(parts) == 3 and parts[0] == "SR":
+                self.server.record(int(parts[1]), parts[2] == "on")
+                self.wfile.write(b"OK\n")
+            elif len(parts) == 2 and parts[0] == "GR":
+                state = self.server.relays.get(int(parts[1]), False)
+                self.wfile.write(b"on\n" if state else b"off\n")
+            elif parts:
+                self.wfile.write(b"ERR\n")
+
+
+class FakeRelayServer(socketserver.ThreadingTCPServer):
+    """Acknowledge every SR command, remember the last state of each relay and report it on GR."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.commands = 0
+        self.relays = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def record(self, relay_index, state):
+        with self._lock:
+            self.commands += 1
+            self.relays[relay_index] = state
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
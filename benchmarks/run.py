@@ -0,0 +1,335 @@
+"""Microbenchmarks of the ingestion and relay evaluation hot paths.
+
+Each case runs against a temporary SQLite file and a local fake relay
+controller, at every combination of the requested sensor and zone counts.
+Results are written as JSON; compare.py diffs two result files.
+
+    python benchmarks/run.py --sensors 100,10000 --zones 10,1000
+    python benchmarks/run.py --sensors 100000 --zones 1000 --cases update_sensor
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_relay import FakeRelayServer  # noqa: E402
+
+SHARED_RELAYS = 4  # zones per shared tamper/battery_low/offline relay group
+HE_EVENT = bytes([0x00, 0x23, 0x01, 0x10, 0x10, 0x01])
+OPT_EVENT = bytes([0x01, 0x1E, 0x10, 0x10, 0x01, 0x08])
+SOS_EVENT = bytes([0xff, 0x2e, 0x03])
+
+
+def measure(op, number, repeat=5, setup=None):
+    """Run ``op`` ``number`` times per round; return per-call stats of the best round."""
+    rounds = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        rounds.append((time.perf_counter() - start) / number)
+    best = min(rounds)
+    return {
+        "number": number,
+        "repeat": repeat,
+        "best_us": best * 1e6,
+        "mean_us": sum(rounds) / len(rounds) * 1e6,
+        "ops_per_sec": 1 / best if best else 0.0,
+    }
+
+
+def sensor_id(i):
+    return f"{i:016x}"
+
+
+def sensor_name(i, zones):
+    return f"sensor{i}_Z{i % zones}"
+
+
+class Fixture:
+    """A StateManager with ``sensors`` sensors spread over ``zones`` zones."""
+
+    def __init__(self, workdir, relay_port, sensors, zones):
+        import relay_controller
+        import state_manager as sm
+
+        relay_controller._pool = relay_controller.RelayConnectionPool(port=relay_port)
+        db_path = os.path.join(workdir, f"bench-{sensors}-{zones}.db")
+        self.manager = sm.StateManager(db_path=db_path, json_path=None)
+        self.manager.enable_write_behind(flush_interval=1, batch_size=500)
+        for z in range(zones):
+            group = z // SHARED_RELAYS
+            self.manager.zone_store.save_zone(f"Z{z}", {
+                "ip": "127.0.0.1",
+                "alarm": 100 + z,
+                "tamper": 3 * group,
+                "battery_low": 3 * group + 1,
+                "offline": 3 * group + 2,
+            })
+        self.manager._reload_zone_config()
+        for i in range(sensors):
+            self.manager.update_sensor(sensor_id(i), sensor_name(i, zones), {"alarm": False, "tamper": False})
+        self.manager.relay_dispatcher.wait_idle(timeout=60)
+        self.sensors = sensors
+        self.zones = zones
+
+    def close(self):
+        self.manager.relay_dispatcher.wait_idle(timeout=60)
+        self.manager.close()
+
+
+def bench_codecs(fixture):
+    from codec import invissys, milesight
+
+    frames = [HE_EVENT, OPT_EVENT] * 5000
+    return {
+        "codec.invissys.decode": measure(lambda: invissys.decode(OPT_EVENT), 20000),
+        "codec.milesight.decode": measure(lambda: milesight.decode(SOS_EVENT), 20000),
+        "codec.invissys.decode_batch[10000]": measure(lambda: invissys.decode_batch(frames), 5),
+    }
+
+
+def bench_on_message(fixture):
+    import mqtt_listener
+
+    mqtt_listener.state_manager = fixture.manager
+    mqtt_listener.setup_mqtt({"broker": "bench"}, ingest_cfg={"workers": 0, "dedup_window": 60})
+    messages = []
+    # A distinct fCnt per call (5 rounds of 2000), so no message is a duplicate
+    for n in range(5 * 2000):
+        i = n % min(fixture.sensors, 1000)
+        uplink = {
+            "devEUI": sensor_id(i),
+            "deviceName": sensor_name(i, fixture.zones),
+            "applicationName": "invissys",
+            "fCnt": n,
+            "data": HE_EVENT.hex(),
+        }
+        messages.append(types.SimpleNamespace(
+            topic=f"application/1/device/{sensor_id(i)}/event/up", payload=json.dumps(uplink).encode()
+        ))
+    counter = iter(range(10**12))
+
+    def op():
+        mqtt_listener.on_message(None, None, messages[next(counter) % len(messages)])
+
+    def duplicate():
+        mqtt_listener.on_message(None, None, messages[0])
+
+    return {"on_message": measure(op, 2000), "on_message[duplicate]": measure(duplicate, 2000)}
+
+
+def bench_update_sensor(fixture):
+    manager = fixture.manager
+    counter = iter(range(10**12))
+
+    def op():
+        i = next(counter)
+        sensor = i % fixture.sensors
+        # Alternate the alarm so zone status and relays actually change
+        manager.update_sensor(sensor_id(sensor), sensor_name(sensor, fixture.zones),
+                              {"alarm": bool((i // fixture.sensors) & 1), "tamper": False})
+
+    return {"update_sensor": measure(op, 2000)}
+
+
+def bench_shared_relays(fixture):
+    manager = fixture.manager
+
+    def op():
+        with manager.lock:
+            manager._update_shared_relays()
+
+    return {"update_shared_relays[all groups]": measure(op, 20)}
+
+
+def bench_offline_check(fixture):
+    manager = fixture.manager
+    seen = time.time() - 25 * 3600
+
+    def setup():
+        # Every sensor back online with a deadline already in the past
+        for i in range(fixture.sensors):
+            manager.update_sensor(sensor_id(i), sensor_name(i, fixture.zones), {})
+        with manager.lock:
+            for i in range(fixture.sensors):
+                manager._set_deadline(sensor_id(i), seen)
+
+    return {"run_offline_check[all expire]": measure(manager.run_offline_check, 1, setup=setup)}
+
+
+def bench_reconcile(fixture):
+    """Startup reconciliation when the controller already matches the stored states."""
+    manager = fixture.manager
+    manager.relay_dispatcher.wait_idle(timeout=60)
+
+    def op():
+        manager.reconcile_relays()
+        manager.relay_dispatcher.wait_idle(timeout=60)
+
+    return {"reconcile_relays[in sync]": measure(op, 20)}
+
+
+def bench_api_state(fixture):
+    import main
+
+    main.state_manager = fixture.manager
+    client = main.create_app().test_client()
+    manager = fixture.manager
+    counter = iter(range(10**12))
+
+    def changed():
+        i = next(counter) % fixture.sensors
+        manager.update_sensor(sensor_id(i), sensor_name(i, fixture.zones), {"tamper": False})
+        client.get("/api/state")
+
+    etag = client.get("/api/state").headers["ETag"]
+
+    def unchanged():
+        client.get("/api/state", headers={"If-None-Match": etag})
+
+    return {
+        "api_state[one change]": measure(changed, 20),
+        "api_state[304]": measure(unchanged, 200),
+    }
+
+
+def bench_state_memory(fixture):
+    """Memory retained per sensor added through update_sensor, indexes and snapshot included."""
+    manager = fixture.manager
+    extra = [sensor_id(fixture.sensors + i) for i in range(fixture.sensors)]
+    manager.store.flush()
+    manager.get_state_json()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i, dev_eui in enumerate(extra):
+            manager.update_sensor(dev_eui, sensor_name(fixture.sensors + i, fixture.zones), {
+                "alarm": False, "tamper": False, "battery_low": False, "battery_voltage": 3.6,
+            })
+        manager.relay_dispatcher.wait_idle(timeout=60)
+        manager.store.flush()
+        manager.get_state_json()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    for dev_eui in extra:
+        manager.remove_sensor(dev_eui)
+    return {"state_memory": {"bytes_per_sensor": retained / len(extra)}}
+
+
+CASES = {
+    "codecs": bench_codecs,
+    "on_message": bench_on_message,
+    "update_sensor": bench_update_sensor,
+    "shared_relays": bench_shared_relays,
+    "offline_check": bench_offline_check,
+    "reconcile": bench_reconcile,
+    "api_state": bench_api_state,
+    "state_memory": bench_state_memory,
+}
+SCALE_FREE = {"codecs"}  # run once, not per sensor/zone combination
+
+
+def result_value(stats):
+    """(value, unit) a result is compared on: best time, or bytes for memory cases."""
+    if "bytes_per_sensor" in stats:
+        return stats["bytes_per_sensor"], "B/sensor"
+    return stats["best_us"], "us"
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_cases(workdir, relay_port, sensor_counts, zone_counts, cases, results):
+    if "codecs" in cases:
+        results.update(bench_codecs(None))
+    for sensors in sensor_counts:
+        for zones in zone_counts:
+            fixture = Fixture(workdir, relay_port, sensors, zones)
+            try:
+                for name in cases:
+                    if name in SCALE_FREE:
+                        continue
+                    for case, stats in CASES[name](fixture).items():
+                        key = f"{case}[sensors={sensors},zones={zones}]"
+                        results[key] = stats
+                        value, unit = result_value(stats)
+                        print(f"{key:<70} {value:>12.2f} {unit}", file=sys.stderr)
+            finally:
+                fixture.close()
+
+
+def run(sensor_counts, zone_counts, cases):
+    results = {}
+    relay = FakeRelayServer().start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            # The default state manager instance creates state.db in the cwd
+            os.chdir(workdir)
+            try:
+                run_cases(workdir, relay.port, sensor_counts, zone_counts, cases, results)
+            finally:
+                os.chdir(ROOT)
+    finally:
+        relay.stop()
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "relay_commands": relay.commands,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the hot path microbenchmarks")
+    parser.add_argument("--sensors", default="100,10000", help="Comma separated sensor counts")
+    parser.add_argument("--zones", default="10,1000", help="Comma separated zone counts")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"Subset of {','.join(CASES)}")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, force=True)
+    cases = [c for c in args.cases.split(",") if c]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(sorted(unknown))}")
+    output = os.path.abspath(args.output or os.path.join(ROOT, "benchmarks", "results", f"{git_commit()}.json"))
+
+    report = run(
+        [int(n) for n in args.sensors.split(",")],
+        [int(n) for n in args.zones.split(",")],
+        cases,
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""Optional asyncio runtime for MQTT ingestion, relay I/O and timers.
+
+The paho client is driven from an event loop through its external socket
+hooks, relay commands go through asyncio streams, ingest workers are loop
+tasks and timers become loop callbacks. Work that takes locks or writes to
+SQLite (decoding into the StateManager, timer callbacks) and the blocking
+broker connect run in the loop's default executor, so nothing blocks the
+loop.
+"""
+
+import asyncio
+import functools
+import logging
+import paho.mqtt.client as mqtt
+import mqtt_listener
+from ingest_pipeline import OVERFLOW_POLICIES, shard_key
+from relay_controller import AsyncRelayConnectionPool, async_send_tcp_commands, async_query_relay_status
+from relay_dispatcher import reconcile_commands, unreached_fixes
+
+RECONNECT_INTERVAL = 5
+MISC_INTERVAL = 1  # seconds between paho keepalive/housekeeping calls
+
+
+class _LoopBound:
+    """Run methods on the loop thread, whichever thread calls them."""
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _call(self, fn, *args):
+        if self._in_loop() or self.loop.is_closed():
+            fn(*args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)
+
+
+class AsyncScheduler(_LoopBound):
+    """Scheduler backed by loop.call_later, same interface as scheduler.Scheduler."""
+
+    def __init__(self, loop):
+        super().__init__(loop)
+        self._handles = {}
+        self._groups = {}
+
+    def schedule(self, key, delay, callback):
+        self._call(self._schedule, key, delay, callback)
+
+    def _schedule(self, key, delay, callback):
+        handle = self._handles.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+        else:
+            self._count(key, 1)
+        self._handles[key] = self.loop.call_later(delay, self._fire, key, callback)
+
+    def _fire(self, key, callback):
+        self._handles.pop(key, None)
+        self._count(key, -1)
+        # Callbacks update the StateManager (locks, SQLite): keep them off the loop
+        self.loop.run_in_executor(None, self._run, callback)
+
+    @staticmethod
+    def _run(callback):
+        try:
+            callback()
+        except Exception as e:
+            logging.error(f"Scheduled callback failed: {e}")
+
+    def cancel(self, key):
+        pending = key in self._handles
+        self._call(self._cancel, key)
+        return pending
+
+    def _cancel(self, key):
+        handle = self._handles.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+            self._count(key, -1)
+
+    def _count(self, key, delta):
+        group = key[0] if isinstance(key, tuple) else key
+        self._groups[group] = self._groups.get(group, 0) + delta
+
+    def pending_count(self, group=None):
+        if group is None:
+            return len(self._handles)
+        return self._groups.get(group, 0)
+
+    def stop(self):
+        self._call(self._stop)
+
+    def _stop(self):
+        for handle in self._handles.values():
+            handle.cancel()
+        self._handles.clear()
+        self._groups.clear()
+
+
+class AsyncRelayDispatcher(_LoopBound):
+    """Relay dispatcher with one drain task per controller instead of a thread."""
+
+    def __init__(self, loop, pool=None):
+        super().__init__(loop)
+        self.pool = pool or AsyncRelayConnectionPool()
+        self._pending = {}  # ip -> {relay_index: state}
+        self._checks = {}  # ip -> {relay_index: desired state} to read back
+        self._on_unreached = {}  # ip -> callback of its last reconcile()
+        self._tasks = {}  # ip -> drain task
+
+    def submit(self, ip, relay_index, state):
+        self._call(self._submit, ip, relay_index, state)
+
+    def _submit(self, ip, relay_index, state):
+        # A newer command for the same relay replaces the queued one
+        self._pending.setdefault(ip, {})[relay_index] = state
+        self._start(ip)
+
+    def reconcile(self, ip, desired, on_unreached=None):
+        """Same as RelayDispatcher.reconcile(), on the controller's drain task."""
+        self._call(self._reconcile, ip, dict(desired), on_unreached)
+
+    def _reconcile(self, ip, desired, on_unreached):
+        self._checks.setdefault(ip, {}).update(desired)
+        self._on_unreached[ip] = on_unreached
+        self._start(ip)
+
+    def _start(self, ip):
+        if ip not in self._tasks:
+            self._tasks[ip] = self.loop.create_task(self._drain(ip))
+
+    async def _drain(self, ip):
+        try:
+            while self._checks.get(ip) or self._pending.get(ip):
+                check = self._checks.pop(ip, None)
+                fixes = {}
+                if check:
+                    actual = await async_query_relay_status(self.pool, ip, check)
+                    fixes = reconcile_commands(ip, check, actual)
+                    pending = self._pending.setdefault(ip, {})
+                    # Commands submitted meanwhile are newer than the checked state
+                    for relay_index, state in fixes.items():
+                        pending.setdefault(relay_index, state)
+                    if not pending:
+                        del self._pending[ip]
+                        continue
+                commands = list(self._pending.pop(ip).items())
+                acks = await async_send_tcp_commands(self.pool, ip, commands)
+                unreached = unreached_fixes(fixes, commands, acks)
+                on_unreached = self._on_unreached.get(ip)
+                if unreached and on_unreached is not None:
+                    # Takes the StateManager lock: not on the loop
+                    await self.loop.run_in_executor(None, on_unreached, ip, unreached)
+        finally:
+            del self._tasks[ip]
+
+    def pending_count(self):
+        return sum(len(p) for p in list(self._pending.values()))
+
+    async def _wait_idle(self):
+        while self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def wait_idle(self, timeout=None):
+        """Block the calling (non-loop) thread until every queued command is sent."""
+        if not self.loop.is_running():
+            return not self._tasks
+        future = asyncio.run_coroutine_threadsafe(self._wait_idle(), self.loop)
+        try:
+            future.result(timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    def stop(self, timeout=5.0):
+        if self._in_loop():
+            self.pool.close_all()
+            return
+        self.wait_idle(timeout)
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.pool.close_all)
+
+
+_STOP = object()
+
+
+class AsyncIngestPipeline(_LoopBound):
+    """IngestPipeline counterpart made of one loop task per shard.
+
+    Messages of a device keep their arrival order. The handler (decode and
+    StateManager update) runs in the loop's default executor. With the
+    ``block`` policy a message finding its queue full waits in a put task,
+    behind earlier waiting messages, instead of blocking the loop.
+    """
+
+    def __init__(self, loop, handler, workers=2, queue_size=1000, overflow="drop_oldest"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        super().__init__(loop)
+        self.handler = handler
+        self.overflow = overflow
+        self._queues = [asyncio.Queue(maxsize=queue_size) for _ in range(max(1, int(workers)))]
+        self._waiting = [0] * len(self._queues)  # put tasks waiting for room, per queue
+        self._tasks = []
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+
+    def start(self):
+        self._call(self._start)
+
+    def _start(self):
+        self._tasks = [self.loop.create_task(self._run(index, q)) for index, q in enumerate(self._queues)]
+
+    def submit(self, topic, payload):
+        """Enqueue a raw message; never blocks the loop."""
+        self._call(self._submit, topic, payload)
+
+    def _submit(self, topic, payload):
+        self.received += 1
+        index = hash(shard_key(topic)) % len(self._queues)
+        q = self._queues[index]
+        if self.overflow == "block":
+            if self._waiting[index] or q.full():
+                self._waiting[index] += 1
+                self.loop.create_task(self._put(index, payload))
+            else:
+                q.put_nowait(payload)
+            return
+        if q.full():
+            self.dropped += 1
+            if self.overflow == "drop_newest":
+                return
+            q.get_nowait()
+            q.task_done()
+        q.put_nowait(payload)
+
+    async def _put(self, index, payload):
+        try:
+            await self._queues[index].put(payload)
+        finally:
+            self._waiting[index] -= 1
+
+    async def _run(self, index, q):
+        while True:
+            payload = await q.get()
+            if payload is _STOP:
+                q.task_done()
+                return
+            try:
+                await self.loop.run_in_executor(None, self.handler, payload)
+            except Exception as e:
+                logging.error("Ingest worker %d failed: %s", index, e)
+            finally:
+                self.processed += 1
+                q.task_done()
+
+    def queue_depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self):
+        return {
+            "workers": len(self._queues),
+            "overflow": self.overflow,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "queue_depth": self.queue_depth(),
+        }
+
+    async def aclose(self):
+        """Process what is already queued, then end the worker tasks."""
+        for q in self._queues:
+            await q.put(_STOP)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stop(self, timeout=5.0):
+        if self._in_loop():
+            self.loop.create_task(self.aclose())
+        elif self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.aclose(), self.loop).result(timeout)
+
+
+class AsyncMqttDriver(_LoopBound):
+    """Plug a paho client into the event loop through its socket callbacks."""
+
+    def __init__(self, loop, client):
+        super().__init__(loop)
+        self.client = client
+        self._misc = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    # connect() runs in the executor: these may be called off the loop thread
+
+    def on_socket_open(self, client, userdata, sock):
+        self._call(self._open, client, sock)
+
+    def _open(self, client, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self._misc = self.loop.create_task(self._misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        self._call(self._close, sock)
+
+    def _close(self, sock):
+        self.loop.remove_reader(sock)
+        if self._misc is not None:
+            self._misc.cancel()
+            self._misc = None
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self._call(self.loop.add_writer, sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self._call(self.loop.remove_writer, sock)
+
+    async def _misc_loop(self):
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(MISC_INTERVAL)
+
+
+class AsyncRuntime:
+    """Run MQTT ingestion, relay commands and timers on one asyncio loop."""
+
+    def __init__(self, state_manager, mqtt_cfg, codec_cfg=None, ingest_cfg=None, capture_cfg=None):
+        self.state_manager = state_manager
+        self.mqtt_cfg = mqtt_cfg
+        self.codec_cfg = codec_cfg
+        self.ingest_cfg = ingest_cfg
+        self.capture_cfg = capture_cfg
+        self.loop = None
+        self._stopped = None
+        self._disconnected = None
+
+    def run(self):
+        """Block running the event loop until stop() is called."""
+        asyncio.run(self._main())
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._disconnected = asyncio.Event()
+        dispatcher = AsyncRelayDispatcher(self.loop)
+        self.state_manager.set_runtime(relay_dispatcher=dispatcher, scheduler=AsyncScheduler(self.loop))
+        self.state_manager.reconcile_relays()
+
+        # At least one ingest task: processing inline would block the loop
+        ingest_cfg = dict(self.ingest_cfg or {})
+        ingest_cfg["workers"] = max(1, ingest_cfg.get("workers", 0))
+        broker, port = mqtt_listener.setup_mqtt(
+            self.mqtt_cfg, self.codec_cfg, ingest_cfg, self.capture_cfg, self.state_manager,
+            pipeline_factory=functools.partial(AsyncIngestPipeline, self.loop),
+        )
+        client = mqtt_listener.client
+        on_disconnect = client.on_disconnect
+
+        def handle_disconnect(client, userdata, rc):
+            on_disconnect(client, userdata, rc)
+            self._disconnected.set()
+
+        client.on_disconnect = handle_disconnect
+        AsyncMqttDriver(self.loop, client)
+
+        connection = self.loop.create_task(self._keep_connected(client, broker, port))
+        await self._stopped.wait()
+        connection.cancel()
+        client.disconnect()
+        pipeline = mqtt_listener.ingest_pipeline
+        if pipeline is not None:
+            try:
+                await asyncio.wait_for(pipeline.aclose(), 5)
+            except asyncio.TimeoutError:
+                logging.warning(f"{pipeline.queue_depth()} MQTT message(s) not processed at shutdown")
+        try:
+            await asyncio.wait_for(dispatcher._wait_idle(), 5)
+        except asyncio.TimeoutError:
+            logging.warning(f"[RELAY] {dispatcher.pending_count()} command(s) not sent at shutdown")
+        dispatcher.pool.close_all()
+
+    async def _keep_connected(self, client, broker, port):
+        while True:
+            try:
+                # Blocking DNS lookup and TCP handshake: off the loop
+                await self.loop.run_in_executor(None, functools.partial(client.connect, broker, port, keepalive=60))
+                logging.info(f"Successfully connected to MQTT broker {broker}:{port}")
+            except Exception as e:
+                logging.error(f"Failed to connect to MQTT broker : {e}")
+                logging.error(f"New attempt in {RECONNECT_INTERVAL} secs...")
+                await asyncio.sleep(RECONNECT_INTERVAL)
+                continue
+            self._disconnected.clear()
+            await self._disconnected.wait()
+            await asyncio.sleep(RECONNECT_INTERVAL)
+
+    def stop(self):
+        """Disconnect from the broker and stop the loop (thread-safe)."""
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._stopped.set)
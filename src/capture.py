@@ -0,0 +1,93 @@
+"""Record raw MQTT messages to rotating JSON lines files, and read them back.
+
+Each line is ``{"t": receive epoch, "topic": ..., "p": payload}`` where the
+payload is kept as text when it is UTF-8 (ChirpStack JSON uplinks) and
+stored base64 encoded under ``"b"`` otherwise.
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+
+
+class CaptureWriter:
+    """Append messages to ``path``, rotating it to path.1 ... path.N by size."""
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backup_count=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def record(self, topic, payload, received_at=None):
+        entry = {"t": round(received_at or time.time(), 6), "topic": topic}
+        try:
+            entry["p"] = payload.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["b"] = base64.b64encode(payload).decode("ascii")
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            if self.max_bytes and self._size + len(line) > self.max_bytes and self._size:
+                self._rotate()
+            self._file.write(line)
+            self._size += len(line)
+            self.recorded += 1
+
+    def _rotate(self):
+        self._file.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = 0
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def capture_files(path):
+    """The capture file and its rotated backups, oldest first."""
+    backups = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        backups.append(f"{path}.{i}")
+        i += 1
+    files = backups[::-1]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_capture(paths):
+    """Yield (received_at, topic, payload bytes) from capture files in order."""
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "p" in entry:
+                    payload = entry["p"].encode("utf-8")
+                else:
+                    payload = base64.b64decode(entry["b"])
+                yield entry["t"], entry["topic"], payload
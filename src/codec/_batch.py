@@ -0,0 +1,53 @@
+"""Helpers shared by the codecs' decode_batch functions."""
+
+NUMPY_MIN_BATCH = 256  # below this the array setup costs more than it saves
+
+_numpy = False  # not imported yet
+
+
+def get_numpy():
+    """The numpy module, imported on first use, or None when it is not installed.
+
+    numpy is optional and only speeds up large batches; importing it costs
+    more than the rest of the application at startup.
+    """
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+def columns_from_rows(decode, payloads, fields=None):
+    """Decode payloads one by one into columns.
+
+    Each field of ``fields`` (default: every key returned by decode) becomes
+    a list with one value per payload. The extra ``error`` column holds the
+    error message of payloads that could not be decoded, whose other columns
+    are None.
+    """
+    rows = []
+    errors = []
+    for payload in payloads:
+        try:
+            rows.append(decode(payload))
+        except Exception as e:
+            rows.append({})
+            errors.append(str(e))
+        else:
+            errors.append(None)
+    if fields is None:
+        fields = dict.fromkeys(field for row in rows for field in row)
+    columns = {field: [row.get(field) for row in rows] for field in fields}
+    columns["error"] = errors
+    return columns
+
+
+def use_numpy(payloads, enabled):
+    """Whether a batch should take the NumPy path (``enabled`` None means auto)."""
+    if enabled is False or not enabled and len(payloads) < NUMPY_MIN_BATCH:
+        return False
+    return get_numpy() is not None
@@ -1,6 +1,8 @@
 """Codec for decoding Invissys sensor payloads."""
 
 import logging
+import struct
+from codec._batch import columns_from_rows, get_numpy, use_numpy
 
 applicationTypeMap = {
     1: "HE",
@@ -16,13 +18,29 @@ frameIdMap = {
     255: "UP_STATS"
 }
 
-def decode(payload: bytes) -> dict:
-    """Decode a binary payload from an Invissys device."""
+FIELDS = ("applicationType", "frameType", "tamper", "battery_low", "alarm", "alarm_expire", "battery_voltage")
+
+# flags, power supply, application type, frame id
+_HEADER = struct.Struct("4B")
+
+# 256-entry lookup tables indexed by a payload byte
+_APPLICATION_TYPES = tuple(applicationTypeMap.get(b, "UNKNOWN") for b in range(256))
+_FRAME_TYPES = tuple(frameIdMap.get(b, "UNKNOWN") for b in range(256))
+_VOLTAGE = tuple((b & 0x7F) / 10 for b in range(256))
+_HE_BATTERY_LOW = tuple(v <= 3.3 for v in _VOLTAGE)
+_OPT_BATTERY_LOW = tuple(v <= 2.5 for v in _VOLTAGE)
+_BIT0 = tuple(bool(b & 0x01) for b in range(256))
+# OPT event byte: infrared trouble (bit 4) or any of the four detections (bits 0-3)
+_OPT_ALARM = tuple(bool(b & 0x1F) for b in range(256))
+
+
+def _decode(payload, warn):
     if len(payload) < 4:
         raise ValueError("Payload too short")
 
-    application_type = applicationTypeMap.get(payload[2], "UNKNOWN")
-    frame_type = frameIdMap.get(payload[3], "UNKNOWN")
+    flags, supply, application, frame = _HEADER.unpack_from(payload)
+    application_type = _APPLICATION_TYPES[application]
+    frame_type = _FRAME_TYPES[frame]
 
     tamper = None
     battery_low = None
@@ -31,35 +49,29 @@ def decode(payload: bytes) -> dict:
     alarm_expire = None
 
     if application_type == "HE":
-        power_supply = (payload[1] & 0x7F) / 10
-        battery_low = power_supply <= 3.3
+        power_supply = _VOLTAGE[supply]
+        battery_low = _HE_BATTERY_LOW[supply]
         tamper = False
     elif application_type == "OPT":
-        power_supply = (payload[1] & 0x7F) / 10
-        battery_low = power_supply <= 2.5
-        tamper = bool(payload[0] & 0x01)
-    else:
+        power_supply = _VOLTAGE[supply]
+        battery_low = _OPT_BATTERY_LOW[supply]
+        tamper = _BIT0[flags]
+    elif warn:
         logging.warning("Unknown application type")
 
     if frame_type == "UP_EVENT":
-        if application_type == "HE":
+        if application_type in ("HE", "OPT"):
             if len(payload) < 6:
                 raise ValueError("Payload too short for UP_EVENT frame (need at least 6 bytes)")
-            alarm = bool(payload[5] & 0x01)
-            alarm_expire = False
-        elif application_type == "OPT":
-            if len(payload) < 6:
-                raise ValueError("Payload too short for UP_EVENT frame (need at least 6 bytes)")
-            infrared_trouble = bool((payload[5] >> 4) & 0x01)
-            infrared_detect4 = bool((payload[5] >> 3) & 0x01)
-            infrared_detect3 = bool((payload[5] >> 2) & 0x01)
-            infrared_detect2 = bool((payload[5] >> 1) & 0x01)
-            infrared_detect1 = bool(payload[5] & 0x01)
-            alarm = infrared_trouble or infrared_detect1 or infrared_detect2 or infrared_detect3 or infrared_detect4
-            alarm_expire = True
-        else:
+            if application_type == "HE":
+                alarm = _BIT0[payload[5]]
+                alarm_expire = False
+            else:
+                alarm = _OPT_ALARM[payload[5]]
+                alarm_expire = True
+        elif warn:
             logging.warning("No alarm matching field")
-    else:
+    elif warn:
         logging.warning("Not an event")
 
     return {
@@ -71,3 +83,65 @@ def decode(payload: bytes) -> dict:
         "alarm_expire": alarm_expire,
         "battery_voltage": power_supply,
     }
+
+
+def decode(payload: bytes) -> dict:
+    """Decode a binary payload from an Invissys device."""
+    return _decode(payload, True)
+
+
+def _decode_quiet(payload):
+    return _decode(payload, False)
+
+
+def decode_batch(payloads, vectorize=None) -> dict:
+    """Decode many payloads into columns (see codec._batch.columns_from_rows).
+
+    Values are the same as decode() would return, without its per-frame
+    warnings. Large batches are vectorized with NumPy when it is installed;
+    ``vectorize`` forces (True) or disables (False) that path.
+    """
+    if not use_numpy(payloads, vectorize):
+        return columns_from_rows(_decode_quiet, payloads, FIELDS)
+
+    np = get_numpy()
+    count = len(payloads)
+    lengths = np.fromiter((len(p) for p in payloads), dtype=np.int64, count=count)
+    frames = np.frombuffer(b"".join(bytes(p[:6]).ljust(6, b"\0") for p in payloads), dtype=np.uint8)
+    frames = frames.reshape(count, 6)
+    flags, supply, application, frame, event_byte = (frames[:, i] for i in (0, 1, 2, 3, 5))
+
+    too_short = lengths < 4
+    is_he = (application == 1) & ~too_short
+    is_opt = (application == 16) & ~too_short
+    known = is_he | is_opt
+    event = (frame == 16) & known
+    short_event = event & (lengths < 6)
+    failed = too_short | short_event
+    has_alarm = event & ~short_event
+    valid = ~failed
+
+    voltage = (supply & 0x7F) / 10
+    battery_low = np.where(is_he, voltage <= 3.3, voltage <= 2.5)
+    tamper = is_opt & ((flags & 0x01) != 0)
+    alarm = np.where(is_he, event_byte & 0x01, event_byte & 0x1F) != 0
+
+    def column(values, mask):
+        return [v if m else None for v, m in zip(values.tolist(), mask.tolist())]
+
+    application_types = np.array(_APPLICATION_TYPES, dtype=object)[application]
+    frame_types = np.array(_FRAME_TYPES, dtype=object)[frame]
+    errors = np.full(count, None, dtype=object)
+    errors[too_short] = "Payload too short"
+    errors[short_event] = "Payload too short for UP_EVENT frame (need at least 6 bytes)"
+    known_valid = known & valid
+    return {
+        "applicationType": column(application_types, valid),
+        "frameType": column(frame_types, valid),
+        "tamper": column(tamper, known_valid),
+        "battery_low": column(battery_low, known_valid),
+        "alarm": column(alarm, has_alarm),
+        "alarm_expire": column(is_opt, has_alarm),
+        "battery_voltage": column(voltage, known_valid),
+        "error": errors.tolist(),
+    }
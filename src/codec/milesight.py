@@ -1,37 +1,43 @@
 """Codec for decoding Milesight SOS button payloads."""
 
 import logging
+from codec._batch import columns_from_rows
 
-def decode(payload: bytes) -> dict:
-    """Decode a binary payload from a Milesight button."""
+FIELDS = ("applicationType", "frameType", "tamper", "battery_low", "alarm", "alarm_expire")
+
+BATTERY_CHANNEL = (0x01, 0x75)
+PRESS_CHANNEL = (0xff, 0x2e)
+
+# 256-entry lookup tables indexed by the channel value byte
+_BATTERY_LOW = tuple(b <= 50 for b in range(256))
+_PRESS_ALARM = tuple(b in (1, 2, 3) for b in range(256))
+
+
+def _decode(payload, warn):
+    frame_type = None
     battery_low = None
     alarm = None
     alarm_expire = None
     i = 0
-    while i < len(payload):
-        channel_id = payload[i]
-        i += 1
-        channel_type = payload[i]
-        i += 1
-
-        # BATTERY
-        if channel_id == 0x01 and channel_type == 0x75:
+    # channel id, channel type, one value byte
+    while i + 1 < len(payload):
+        channel = (payload[i], payload[i + 1])
+        if channel == BATTERY_CHANNEL:
             frame_type = "UP_HEARTBEAT"
-            battery_low = payload[i] <= 50
-            i += 1
-        # PRESS STATE
-        elif channel_id == 0xff and channel_type == 0x2e:
+            battery_low = _BATTERY_LOW[payload[i + 2]]
+        elif channel == PRESS_CHANNEL:
             frame_type = "UP_EVENT"
-            type = payload[i]
-            i += 1
-
-            if type in {1, 2, 3}:
+            if _PRESS_ALARM[payload[i + 2]]:
                 alarm = True
                 alarm_expire = True
-            else:
+            elif warn:
                 logging.warning("SOS: Unknown button action")
         else:
             break
+        i += 3
+
+    if frame_type is None:
+        raise ValueError("No battery or button channel in payload")
 
     return {
         "applicationType": "SOS",
@@ -40,4 +46,22 @@ def decode(payload: bytes) -> dict:
         "battery_low": battery_low,
         "alarm": alarm,
         "alarm_expire": alarm_expire,
-    }
\ No newline at end of file
+    }
+
+
+def decode(payload: bytes) -> dict:
+    """Decode a binary payload from a Milesight button."""
+    return _decode(payload, True)
+
+
+def _decode_quiet(payload):
+    return _decode(payload, False)
+
+
+def decode_batch(payloads, vectorize=None) -> dict:
+    """Decode many payloads into columns (see codec._batch.columns_from_rows).
+
+    Channels are variable length, so there is no vectorized path and
+    ``vectorize`` is ignored.
+    """
+    return columns_from_rows(_decode_quiet, payloads, FIELDS)
@@ -0,0 +1,140 @@
+"""Registry mapping an applicationName to its codec decode function."""
+
+import importlib
+import logging
+import pkgutil
+import threading
+import time
+from collections import OrderedDict
+import codec
+from codec._batch import columns_from_rows
+
+ENTRY_POINT_GROUP = "relaycontrol.codecs"
+UNKNOWN_WARNING_INTERVAL = 300  # seconds between warnings for the same name
+MAX_UNKNOWN_NAMES = 256  # names come from MQTT input; the least recent are forgotten
+
+
+class CodecRegistry:
+    """Discover codecs once and resolve them with a plain dict lookup.
+
+    Codecs are the modules of the ``codec`` package exposing ``decode`` and,
+    optionally, the ``relaycontrol.codecs`` entry points. When ``allowed`` is
+    given only those codec names can be loaded.
+    """
+
+    def __init__(self, allowed=None, entry_points=False):
+        self.allowed = set(allowed) if allowed else None
+        self.entry_points = entry_points
+        self._decoders = {}
+        self._batch_decoders = {}
+        self._unknown = OrderedDict()  # name -> [messages dropped, last warning time], LRU order
+        self._unknown_lock = threading.Lock()
+        self._discovered = False
+
+    def _accept(self, name):
+        return self.allowed is None or name in self.allowed
+
+    def discover(self):
+        """Import the available codecs and build the name -> decode map."""
+        decoders = {}
+        batch_decoders = {}
+        for module_info in pkgutil.iter_modules(codec.__path__):
+            name = module_info.name
+            if name.startswith("_") or not self._accept(name):
+                continue
+            try:
+                module = importlib.import_module(f"codec.{name}")
+            except Exception as e:
+                logging.error(f"Could not load codec {name}: {e}")
+                continue
+            if callable(getattr(module, "decode", None)):
+                decoders[name] = module.decode
+                if callable(getattr(module, "decode_batch", None)):
+                    batch_decoders[name] = module.decode_batch
+
+        if self.entry_points:
+            from importlib import metadata  # slow to import, only needed for plugins
+            for ep in metadata.entry_points(group=ENTRY_POINT_GROUP):
+                if ep.name in decoders or not self._accept(ep.name):
+                    continue
+                try:
+                    target = ep.load()
+                except Exception as e:
+                    logging.error(f"Could not load codec plugin {ep.name}: {e}")
+                    continue
+                decode = getattr(target, "decode", target)
+                if callable(decode):
+                    decoders[ep.name] = decode
+                    if callable(getattr(target, "decode_batch", None)):
+                        batch_decoders[ep.name] = target.decode_batch
+
+        self._decoders = decoders
+        self._batch_decoders = batch_decoders
+        with self._unknown_lock:
+            self._unknown = OrderedDict()
+        self._discovered = True
+        logging.info(f"Codecs available: {sorted(decoders)}")
+
+    def names(self):
+        if not self._discovered:
+            self.discover()
+        return sorted(self._decoders)
+
+    def get(self, name):
+        """Return the decode function for ``name`` or None when it is unknown."""
+        decode = self._decoders.get(name)
+        if decode is not None:
+            return decode
+        if not self._discovered:
+            self.discover()
+            decode = self._decoders.get(name)
+            if decode is not None:
+                return decode
+
+        now = time.monotonic()
+        with self._unknown_lock:
+            unknown = self._unknown.get(name)
+            if unknown is None:
+                if len(self._unknown) >= MAX_UNKNOWN_NAMES:
+                    self._unknown.popitem(last=False)
+                self._unknown[name] = [1, now]
+                dropped = 0
+            else:
+                self._unknown.move_to_end(name)
+                unknown[0] += 1
+                dropped = unknown[0]
+                if now - unknown[1] < UNKNOWN_WARNING_INTERVAL:
+                    return None
+                unknown[1] = now
+        if not dropped:
+            logging.warning(f"No codec available for applicationName {name!r}")
+        else:
+            logging.warning(
+                f"No codec available for applicationName {name!r} "
+                f"({dropped} messages dropped so far)"
+            )
+        return None
+
+    def get_batch(self, name):
+        """Return ``decode_batch(payloads)`` for ``name``, or None when it is unknown.
+
+        Codecs without their own decode_batch get one that calls decode per payload.
+        """
+        decode = self.get(name)
+        if decode is None:
+            return None
+        decode_batch = self._batch_decoders.get(name)
+        if decode_batch is None:
+            decode_batch = self._batch_decoders[name] = _row_batch(decode)
+        return decode_batch
+
+    def unknown_counts(self):
+        """Messages dropped per recently seen unknown applicationName."""
+        with self._unknown_lock:
+            return {name: entry[0] for name, entry in self._unknown.items()}
+
+
+def _row_batch(decode):
+    def decode_batch(payloads, vectorize=None):
+        return columns_from_rows(decode, payloads)
+    return decode_batch
@@ -1,10 +1,11 @@
-import yaml
 import os
 import copy
 
 DEFAULT_CONFIG = {
     "log": {
-        "level": "WARNING"
+        "level": "WARNING",
+        "queue_size": 10000,
+        "rate_limit_interval": 60
     },
     "mqtt": {
         "broker": "localhost",
@@ -20,9 +21,42 @@ DEFAULT_CONFIG = {
     "dashboard": {
         "enable": True,
         "bind": "0.0.0.0",
-        "port": 8080
+        "port": 8080,
+        "server": "development",
+        "threads": 8,
+        "max_streams": 6,
+        "keepalive_timeout": 2,
+        "request_timeout": 30,
+        "static_max_age": 86400
+    },
+    "storage": {
+        "write_behind": False,  # opt-in, loses up to flush_interval s of updates on a crash
+        "flush_interval": 5,
+        "flush_batch_size": 500,
+        "synchronous": "NORMAL",
+        "cache_size": -2000,
+        "mmap_size": 0
+    },
+    "runtime": {
+        "mode": "threads"
+    },
+    "ingest": {
+        "workers": 2,
+        "queue_size": 1000,
+        "overflow": "drop_oldest",
+        "dedup_window": 10,
+        "dedup_max_entries": 10000
+    },
+    "codecs": {
+        "allowed": [],
+        "entry_points": False
+    },
+    "capture": {
+        "enable": False,
+        "path": "capture.jsonl",
+        "max_bytes": 52428800,
+        "backup_count": 5
     }
-    
 }
 
 CONFIG = copy.deepcopy(DEFAULT_CONFIG)
@@ -30,6 +64,7 @@ CONFIG = copy.deepcopy(DEFAULT_CONFIG)
 def load_config(path=None):
     global CONFIG
     if path and os.path.exists(path):
+        import yaml  # only needed when there is a file to read
         try:
             with open(path, "r") as f:
                 user_config = yaml.safe_load(f)
@@ -57,8 +92,26 @@ def merge_dict(base, updates):
 def get_log_level():
     return CONFIG.get("log", {}).get("level", "INFO")
 
+def get_log_config():
+    return CONFIG["log"]
+
 def get_mqtt_config():
     return CONFIG["mqtt"]
 
 def get_dashboard_config():
     return CONFIG["dashboard"]
+
+def get_storage_config():
+    return CONFIG["storage"]
+
+def get_runtime_config():
+    return CONFIG["runtime"]
+
+def get_ingest_config():
+    return CONFIG["ingest"]
+
+def get_codecs_config():
+    return CONFIG["codecs"]
+
+def get_capture_config():
+    return CONFIG["capture"]
@@ -0,0 +1,69 @@
+"""Fan-out of state change events to push subscribers (SSE clients)."""
+
+import queue
+import threading
+
+OVERFLOW = object()  # queued to a subscriber that fell behind
+
+
+class Subscription:
+    """Bounded event queue of a single subscriber."""
+
+    def __init__(self, max_queue):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def get(self, timeout=None):
+        """Next (event, data) tuple, OVERFLOW, or None on timeout."""
+        if self.overflowed and self._queue.empty():
+            return OVERFLOW
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return OVERFLOW if self.overflowed else None
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.overflowed = True
+            return False
+
+
+class EventHub:
+    """Publish events to every subscriber without ever blocking the publisher.
+
+    A subscriber whose queue is full is dropped; it receives OVERFLOW once
+    its queue is drained and is expected to resubscribe for a new snapshot.
+    """
+
+    def __init__(self, max_queue=1000):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event, data):
+        if not self._subscribers:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if not subscription._put((event, data)):
+                self.unsubscribe(subscription)
@@ -0,0 +1,103 @@
+"""Bounded, device-sharded worker pool behind the MQTT callback."""
+
+import logging
+import queue
+import threading
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+_STOP = object()
+
+
+def shard_key(topic):
+    """Return the devEUI of an uplink topic, or the topic itself."""
+    # application/<app>/device/<devEUI>/event/up
+    parts = topic.split("/")
+    if len(parts) > 3 and parts[2] == "device":
+        return parts[3]
+    return topic
+
+
+class IngestPipeline:
+    """Queue raw payloads and process them on a pool of workers.
+
+    Messages of the same device always land on the same worker, so they are
+    handled in arrival order. When a worker queue is full the ``overflow``
+    policy either blocks the caller, drops the incoming message or drops the
+    oldest queued one.
+    """
+
+    def __init__(self, handler, workers=2, queue_size=1000, overflow="drop_oldest"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        self.handler = handler
+        self.overflow = overflow
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(max(1, int(workers)))]
+        self._threads = []
+        # Each counter has a single writer: submit() for received/dropped,
+        # one slot per worker for processed
+        self.received = 0
+        self.dropped = 0
+        self._processed = [0] * len(self._queues)
+
+    def start(self):
+        for index, q in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(index, q), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, topic, payload):
+        """Enqueue a raw message; never raises on overflow."""
+        self.received += 1
+        q = self._queues[hash(shard_key(topic)) % len(self._queues)]
+        if self.overflow == "block":
+            q.put(payload)
+            return
+        while True:
+            try:
+                q.put_nowait(payload)
+                return
+            except queue.Full:
+                if self.overflow == "drop_newest":
+                    self.dropped += 1
+                    return
+            try:
+                q.get_nowait()
+                q.task_done()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+
+    def _run(self, index, q):
+        while True:
+            payload = q.get()
+            if payload is _STOP:
+                q.task_done()
+                return
+            try:
+                self.handler(payload)
+            except Exception as e:
+                logging.error("Ingest worker %d failed: %s", index, e)
+            finally:
+                self._processed[index] += 1
+                q.task_done()
+
+    def queue_depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self):
+        return {
+            "workers": len(self._queues),
+            "overflow": self.overflow,
+            "received": self.received,
+            "processed": sum(self._processed),
+            "dropped": self.dropped,
+            "queue_depth": self.queue_depth(),
+        }
+
+    def stop(self, timeout=5.0):
+        """Process what is already queued, then stop the workers."""
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
@@ -1,13 +1,177 @@
-"""Configure logging for the application."""
+"""Configure logging for the application.
 
+Records are handed to a queue and written to stdout by a listener thread,
+so logging never blocks the ingestion path on terminal or syslog I/O.
+Repeated identical warnings and errors are suppressed for a while and then
+reported once with the number of suppressed copies, by the next copy or, if
+none comes, by a periodic flush and at shutdown.
+"""
+
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
+import threading
+import time
+
+FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+MAX_TRACKED_MESSAGES = 1000
+
+_listener = None
+_handler = None  # _DroppingQueueHandler feeding the listener
+_flusher = None  # (thread, stop event) emitting pending suppression summaries
+
+
+class RateLimitFilter(logging.Filter):
+    """Let an identical WARNING/ERROR message through once per ``interval`` seconds.
+
+    The next copy after the interval carries the number of copies dropped in
+    between; pending() hands out those summaries when no copy comes. Lower
+    levels are not limited.
+    """
+
+    def __init__(self, interval=60.0, level=logging.WARNING):
+        super().__init__()
+        self.interval = interval
+        self.level = level
+        self._seen = {}  # (level, location, message) -> [last emitted, suppressed, last suppressed record]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.level or self.interval <= 0:
+            return True
+        message = record.getMessage()
+        key = (record.levelno, record.pathname, record.lineno, message)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None:
+                if len(self._seen) >= MAX_TRACKED_MESSAGES:
+                    self._seen.clear()
+                self._seen[key] = [now, 0, None]
+                return True
+            if now - entry[0] < self.interval:
+                entry[1] += 1
+                entry[2] = record
+                return False
+            suppressed, entry[0], entry[1], entry[2] = entry[1], now, 0, None
+        if suppressed:
+            record.msg = f"{message} ({suppressed} identical messages suppressed)"
+            record.args = None
+        return True
+
+    def pending(self, flush_all=False):
+        """Summary records of the copies suppressed by intervals that have ended.
+
+        With ``flush_all`` every summary is returned, e.g. at shutdown. Those
+        messages are forgotten, so their next copy is logged right away.
+        """
+        now = time.monotonic()
+        summaries = []
+        with self._lock:
+            for key, entry in list(self._seen.items()):
+                if not flush_all and now - entry[0] < self.interval:
+                    continue
+                if entry[1]:
+                    record = logging.makeLogRecord(entry[2].__dict__)
+                    record.msg = f"{key[3]} ({entry[1]} identical messages suppressed)"
+                    record.args = None
+                    summaries.append(record)
+                del self._seen[key]
+        return summaries
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
 
-def setup_logging(level: str = "INFO") -> None:
+class _Listener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits for room instead of failing on a full queue."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def _emit_pending(handler, limiter, flush_all=False):
+    # Bypasses the filter; waits for room since the listener is still running
+    for record in limiter.pending(flush_all):
+        try:
+            handler.queue.put(handler.prepare(record), timeout=1)
+        except queue.Full:
+            handler.dropped += 1
+
+
+def _flush_loop(handler, limiter, stop):
+    while not stop.wait(limiter.interval):
+        _emit_pending(handler, limiter)
+
+
+def dropped_records() -> int:
+    """Records dropped because the logging queue was full."""
+    return _handler.dropped if _handler is not None else 0
+
+
+def setup_logging(level: str = "INFO", queue_size: int = 10000, rate_limit_interval: float = 60.0) -> None:
     """Configure global logging with the given level."""
+    global _listener, _handler, _flusher
+    stop_logging()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter(FORMAT))
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = _DroppingQueueHandler(log_queue)
+    # Only merge the arguments here; the listener side applies FORMAT
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    limiter = RateLimitFilter(rate_limit_interval)
+    handler.addFilter(limiter)
+
     logging.basicConfig(
         level=getattr(logging, level.upper(), logging.INFO),
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        handlers=[logging.StreamHandler(sys.stdout)],
+        handlers=[handler],
         force=True
     )
+    _listener = _Listener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    _handler = handler
+    if rate_limit_interval > 0:
+        stop = threading.Event()
+        thread = threading.Thread(target=_flush_loop, args=(handler, limiter, stop), daemon=True)
+        thread.start()
+        _flusher = (thread, stop)
+
+
+def stop_logging() -> None:
+    """Write out suppression summaries and queued records, then stop the listener thread."""
+    global _listener, _flusher
+    if _flusher is not None:
+        thread, stop = _flusher
+        stop.set()
+        thread.join()
+        _flusher = None
+    if _listener is not None:
+        for limiter in _handler.filters:
+            if isinstance(limiter, RateLimitFilter):
+                _emit_pending(_handler, limiter, flush_all=True)
+        if _handler.dropped:
+            record = logging.makeLogRecord({
+                "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": f"{_handler.dropped} log records were dropped because the logging queue was full",
+            })
+            try:
+                _handler.queue.put(record, timeout=1)
+            except queue.Full:
+                pass
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -1,42 +1,184 @@
 """Application entry point and HTTP API for relay control."""
 
 import argparse
+import json
 import logging
+import os
 import threading
 import sys
 import signal
-from flask import Flask, jsonify, send_from_directory, request, abort
+import time
 from config_loader import (
     load_config,
     get_log_level,
+    get_log_config,
     get_dashboard_config,
     get_mqtt_config,
+    get_storage_config,
+    get_codecs_config,
+    get_ingest_config,
+    get_runtime_config,
+    get_capture_config,
 )
-from logger_config import setup_logging
-from mqtt_listener import start_mqtt, stop_mqtt
-from state_manager import StateManager
-from state_manager_instance import state_manager
+from logger_config import setup_logging, stop_logging, dropped_records
+import metrics
+from mqtt_listener import start_mqtt, stop_mqtt, ingest_stats
+from event_hub import OVERFLOW
+from state_manager_instance import get_state_manager
+
+# Comment line sent to idle event streams so dead clients are detected
+STREAM_KEEPALIVE_SECONDS = 15
+
+# Seconds graceful_exit() waits for the asyncio runtime to finish
+RUNTIME_STOP_TIMEOUT = 10
 
 # MQTT thread placeholder, created in main()
 mqtt_thread = None
+# AsyncRuntime when runtime.mode is asyncio
+runtime = None
+# Shared StateManager, created in main()
+state_manager = None
+
+
+class StartupTimer:
+    """Durations of the startup steps, logged once at DEBUG."""
+
+    def __init__(self):
+        self.steps = []
+        self._last = time.perf_counter()
 
-def create_app() -> Flask:
-    """Create the Flask application with all routes registered."""
+    def step(self, name):
+        now = time.perf_counter()
+        self.steps.append((name, now - self._last))
+        self._last = now
 
-    app = Flask(__name__, static_folder="static")
+    def log(self):
+        total = sum(seconds for _, seconds in self.steps)
+        details = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.steps)
+        logging.debug(f"Startup took {total * 1000:.1f} ms: {details}")
 
-    @app.route("/")
-    def index():
-        return send_from_directory("static", "index.html")
+
+def create_app(static_assets=None, max_streams=None):
+    """Create the Flask application with all routes registered.
+
+    When ``static_assets`` (a StaticAssets) is given, static files are served
+    from memory, gzipped and with cache headers, instead of from disk.
+    Past ``max_streams`` open event streams, /api/stream answers 503 and the
+    dashboard falls back to polling.
+    """
+    # Imported here so a headless controller never loads Flask
+    from flask import Flask, Response, jsonify, send_from_directory, request, abort
+
+    app = Flask(__name__, static_folder=None if static_assets else "static")
+
+    if static_assets is None:
+        @app.route("/")
+        def index():
+            return send_from_directory("static", "index.html")
+    else:
+        @app.route("/")
+        def index():
+            # The entry page is always revalidated so new asset versions show up
+            return static_assets.response(request, "index.html", max_age=0)
+
+        @app.route("/static/<path:filename>")
+        def static(filename):
+            response = static_assets.response(request, filename)
+            if response is None:
+                abort(404)
+            return response
+
+    def versioned(tag, version, load):
+        """Answer 304 when the client already has ``version``, else send load().
+
+        ``load`` returns (version, data); bytes are sent as an encoded JSON body.
+        """
+        etag = f"{tag}{version}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            version, data = load()
+            etag = f"{tag}{version}"
+            if isinstance(data, bytes):
+                response = Response(data, mimetype="application/json")
+            else:
+                response = jsonify(data)
+        response.set_etag(etag)
+        # Let browsers keep the body but revalidate it on every poll
+        response.headers["Cache-Control"] = "no-cache"
+        return response
 
     @app.route("/api/state")
     def api_state():
         # logging.debug(f"/api/state: refreshing states with {state_manager.get_state()}")
-        return jsonify(state_manager.get_state())
+        since = request.args.get("since", type=int)
+        if since is not None:
+            return jsonify(state_manager.get_state_since(since))
+        return versioned("s", state_manager.state_version, state_manager.get_state_json)
+
+    @app.route("/api/state/<dev_eui>", methods=["DELETE"])
+    def remove_sensor(dev_eui):
+        if not state_manager.remove_sensor(dev_eui):
+            abort(404)
+        return jsonify({"status": "ok"})
+
+    # Each open stream holds a server thread for as long as it lasts
+    stream_slots = threading.BoundedSemaphore(max_streams) if max_streams is not None else None
+
+    @app.route("/api/stream")
+    def api_stream():
+        if stream_slots is not None and not stream_slots.acquire(blocking=False):
+            return Response("Too many event streams\n", status=503, mimetype="text/plain", headers={"Retry-After": "30"})
+        events = state_manager.events
+        try:
+            subscription, state, zones = state_manager.subscribe_events()
+        except Exception:
+            if stream_slots is not None:
+                stream_slots.release()
+            raise
+
+        def sse(event, data):
+            return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+        def generate():
+            yield sse("snapshot", {"state": state, "zones": zones})
+            while True:
+                item = subscription.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                if item is None:
+                    yield ": keepalive\n\n"
+                elif item is OVERFLOW:
+                    return  # the client reconnects and gets a fresh snapshot
+                else:
+                    yield sse(*item)
+
+        response = Response(
+            generate(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+        # Called by the server even if the client left before the first event
+        @response.call_on_close
+        def close():
+            events.unsubscribe(subscription)
+            if stream_slots is not None:
+                stream_slots.release()
+
+        return response
+
+    register_gauges()
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/api/ingest")
+    def api_ingest():
+        return jsonify(ingest_stats())
 
     @app.route("/api/zones")
     def api_zones():
-        return jsonify(state_manager.get_zone_states())
+        return versioned("z", state_manager.zones_version, state_manager.get_zone_states_versioned)
 
     # Zone configuration endpoints
     @app.route("/api/zone", methods=["GET"])
@@ -51,18 +193,61 @@ def create_app() -> Flask:
                 abort(404)
             return jsonify(data)
         if request.method in ["POST", "PUT"]:
-            state_manager.zone_store.save_zone(zone, request.json or {})
+            state_manager.save_zone_config(zone, request.json or {})
             return jsonify({"status": "ok"})
         if request.method == "DELETE":
-            state_manager.zone_store.delete_zone(zone)
+            state_manager.delete_zone_config(zone)
             return jsonify({"status": "ok"})
 
     return app
 
+def register_gauges():
+    """Expose queue and timer counts, read at scrape time."""
+    from state_manager import ALARM_RESET_KEY, OFFLINE_CHECK_KEY  # loaded with the manager by then
+    metrics.gauge("relaycontrol_sensors", "Known sensors", lambda: len(state_manager.state))
+    metrics.gauge(
+        "relaycontrol_scheduler_pending",
+        "Timers waiting to fire, per kind",
+        lambda: {group: state_manager.scheduler.pending_count(group) for group in (ALARM_RESET_KEY, OFFLINE_CHECK_KEY)},
+        ("kind",),
+    )
+    metrics.gauge(
+        "relaycontrol_relay_queue_pending", "Relay commands waiting to be sent",
+        lambda: state_manager.relay_dispatcher.pending_count(),
+    )
+    metrics.gauge(
+        "relaycontrol_write_behind_pending", "Sensor rows waiting to be flushed to SQLite",
+        lambda: state_manager.store.queue_depth,
+    )
+    metrics.gauge(
+        "relaycontrol_ingest_queue_depth", "MQTT messages waiting for an ingest worker",
+        lambda: ingest_stats().get("queue_depth", 0),
+    )
+    metrics.gauge(
+        "relaycontrol_event_subscribers", "Open dashboard event streams",
+        lambda: state_manager.events.subscriber_count(),
+    )
+    metrics.gauge(
+        "relaycontrol_log_records_dropped", "Log records dropped because the logging queue was full",
+        dropped_records,
+    )
+
 def graceful_exit(signum, frame):
     logging.info("Stopping program...")
-    stop_mqtt()
+    if runtime is not None:
+        runtime.stop()
+        # The loop drains the ingest tasks and their executor handlers before
+        # run() returns; they still write to the state manager until then
+        if mqtt_thread is not None:
+            mqtt_thread.join(RUNTIME_STOP_TIMEOUT)
+            if mqtt_thread.is_alive():
+                logging.warning(f"asyncio runtime still running after {RUNTIME_STOP_TIMEOUT} s, closing anyway")
+    else:
+        stop_mqtt()
+    if state_manager is not None:
+        state_manager.close()
     logging.info("Goodbye.")
+    stop_logging()
     sys.exit(0)
 
 def main():
@@ -71,26 +256,86 @@ def main():
     parser.add_argument("--log-level", help="Enforce debug level (DEBUG, INFO, WARNING, ERROR)")
     args = parser.parse_args()
 
+    timer = StartupTimer()
     load_config(args.config)
+    timer.step("config")
     log_level = args.log_level or get_log_level()
-    setup_logging(log_level)
+    log_cfg = get_log_config()
+    setup_logging(
+        log_level,
+        queue_size=log_cfg.get("queue_size", 10000),
+        rate_limit_interval=log_cfg.get("rate_limit_interval", 60),
+    )
+    timer.step("logging")
+
+    global state_manager, mqtt_thread, runtime
+    state_manager = get_state_manager()
+    timer.step("state")
+    storage_cfg = get_storage_config()
+    state_manager.configure_database(
+        synchronous=storage_cfg.get("synchronous"),
+        cache_size=storage_cfg.get("cache_size"),
+        mmap_size=storage_cfg.get("mmap_size"),
+    )
+    if storage_cfg.get("write_behind", False):
+        state_manager.enable_write_behind(
+            flush_interval=storage_cfg.get("flush_interval", 5),
+            batch_size=storage_cfg.get("flush_batch_size", 500),
+        )
+    timer.step("storage")
 
     # MQTT thread
-    global mqtt_thread
-    mqtt_thread = threading.Thread(target=start_mqtt, args=(get_mqtt_config(),), daemon=True)
+    if get_runtime_config().get("mode", "threads") == "asyncio":
+        from async_runtime import AsyncRuntime
+        runtime = AsyncRuntime(
+            state_manager, get_mqtt_config(), get_codecs_config(), get_ingest_config(), get_capture_config()
+        )
+        mqtt_thread = threading.Thread(target=runtime.run, daemon=True)
+    else:
+        # Runs on the relay workers; the asyncio runtime starts it on its loop
+        state_manager.reconcile_relays()
+        mqtt_thread = threading.Thread(
+            target=start_mqtt,
+            args=(get_mqtt_config(), get_codecs_config(), get_ingest_config(), get_capture_config(), state_manager),
+            daemon=True,
+        )
     mqtt_thread.start()
+    timer.step("mqtt")
 
     dashboard_cfg = get_dashboard_config()
 
     if dashboard_cfg.get("enable", False):
         log = logging.getLogger("werkzeug")
         log.setLevel(log_level.upper())
-        app = create_app()
-        app.run(
-            host=dashboard_cfg.get("bind", "0.0.0.0"),
-            port=dashboard_cfg.get("port", 8080),
-        )
+        host = dashboard_cfg.get("bind", "0.0.0.0")
+        port = dashboard_cfg.get("port", 8080)
+        if dashboard_cfg.get("server", "development") == "production":
+            from static_assets import StaticAssets
+            from wsgi_server import serve
+            static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+            threads = dashboard_cfg.get("threads", 8)
+            # Keep at least one thread for plain requests
+            max_streams = max(0, min(dashboard_cfg.get("max_streams", 6), threads - 1))
+            app = create_app(
+                StaticAssets(static_folder, max_age=dashboard_cfg.get("static_max_age", 86400)), max_streams
+            )
+            timer.step("dashboard")
+            timer.log()
+            serve(
+                app,
+                host,
+                port,
+                threads=threads,
+                keepalive_timeout=dashboard_cfg.get("keepalive_timeout", 2),
+                request_timeout=dashboard_cfg.get("request_timeout", 30),
+            )
+        else:
+            app = create_app()
+            timer.step("dashboard")
+            timer.log()
+            app.run(host=host, port=port)
     else:
+        timer.log()
         mqtt_thread.join()  # Keep running even without Flask
     
 
@@ -0,0 +1,227 @@
+"""In-process counters and histograms exposed in the Prometheus text format.
+
+Metrics are module-level objects updated from the hot paths; an update is a
+dict lookup and an addition under a per-metric lock. Values computed on
+demand (queue depths, pending timers) are registered as callback gauges.
+"""
+
+import bisect
+import threading
+import time
+
+# Seconds, from 50 us to 2.5 s
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+_registry = {}  # name -> metric, in registration order
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry[metric.name] = metric
+    return metric
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count, optionally split by label values."""
+
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, labels, (le,)), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), series[-1]
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class CallbackGauge:
+    """Gauge read from ``fn()`` at scrape time; fn returns a number or {labels: number}."""
+
+    type = "gauge"
+
+    def __init__(self, name, help, fn, labelnames=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        value = self.fn()
+        if isinstance(value, dict):
+            for labels, v in value.items():
+                labels = labels if isinstance(labels, tuple) else (labels,)
+                yield self.name, _format_labels(self.labelnames, labels), v
+        else:
+            yield self.name, "", value
+
+
+class TimedLock:
+    """threading.Lock recording how long callers wait for it and hold it."""
+
+    def __init__(self, wait, hold):
+        self._lock = threading.Lock()
+        self._wait = wait
+        self._hold = hold
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = now = time.perf_counter()
+            self._wait.observe(now - start)
+        return acquired
+
+    def release(self):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        self._hold.observe(held)
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def counter(name, help, labelnames=()):
+    return _register(Counter(name, help, labelnames))
+
+
+def histogram(name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram(name, help, labelnames, buckets))
+
+
+def gauge(name, help, fn, labelnames=()):
+    """Register (or replace) a callback gauge."""
+    return _register(CallbackGauge(name, help, fn, labelnames))
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# Pipeline metrics
+MESSAGES_RECEIVED = counter("relaycontrol_mqtt_messages_total", "MQTT messages received")
+MESSAGES_DECODED = counter(
+    "relaycontrol_messages_decoded_total", "Uplinks decoded and applied, per codec", ("codec",)
+)
+MESSAGES_FAILED = counter(
+    "relaycontrol_messages_failed_total", "Uplinks dropped, per codec and reason", ("codec", "reason")
+)
+MESSAGES_DUPLICATE = counter(
+    "relaycontrol_messages_duplicate_total", "Uplink copies dropped as duplicates (same devEUI and fCnt)"
+)
+DECODE_SECONDS = histogram("relaycontrol_decode_seconds", "Codec decode time", ("codec",))
+STATE_LOCK_WAIT_SECONDS = histogram("relaycontrol_state_lock_wait_seconds", "Time waiting for StateManager.lock")
+STATE_LOCK_HOLD_SECONDS = histogram("relaycontrol_state_lock_hold_seconds", "Time holding StateManager.lock")
+SQLITE_WRITE_SECONDS = histogram(
+    "relaycontrol_sqlite_write_seconds", "SQLite write transaction time", ("table",)
+)
+SQLITE_ROWS_WRITTEN = counter("relaycontrol_sqlite_rows_written_total", "Rows written to SQLite", ("table",))
+RELAY_RTT_SECONDS = histogram(
+    "relaycontrol_relay_rtt_seconds", "Time to send a command batch and read its acks", ("ip",)
+)
+RELAY_COMMANDS = counter("relaycontrol_relay_commands_total", "Relay commands acknowledged", ("ip",))
+RELAY_FAILURES = counter("relaycontrol_relay_failures_total", "Relay command batches that failed", ("ip",))
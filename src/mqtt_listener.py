@@ -1,18 +1,27 @@
 """MQTT listener that decodes messages and updates the StateManager."""
 
-import yaml
-import importlib
 import re
 import logging
 import time
 import json
 import base64
-import paho.mqtt.client as mqtt
-from state_manager import StateManager
-from state_manager_instance import state_manager
+import metrics
+from state_manager_instance import get_state_manager
+from codec_registry import CodecRegistry
+from ingest_pipeline import IngestPipeline
+from capture import CaptureWriter
+from uplink_dedup import DuplicateFilter, uplink_key
 
-client = mqtt.Client(client_id="relaycontroller")
+UNKNOWN_CODEC = "unknown"  # metric label of uplinks without a registered codec
+
+client = None  # paho client, created by setup_mqtt()
+state_manager = None  # set by setup_mqtt()
 mqtt_cfg = None
+codec_registry = CodecRegistry()
+ingest_pipeline = None
+capture = None  # CaptureWriter when capture is enabled
+dedup = None  # DuplicateFilter when duplicate suppression is enabled
+handler = None  # processes one raw payload, process_message unless setup_mqtt() is given one
 
 def connect_with_retries(client, host, port, keepalive, retry_interval=5):
     """Connect to the broker and retry forever on failure."""
@@ -40,13 +49,49 @@ def on_disconnect(client, userdata, rc):
     logging.warning("Disconnected from MQTT Broker")
 
 def on_message(client, userdata, msg):
-    """Decode an incoming message and forward it to the state manager."""
+    """Hand the message to the ingest workers, or process it inline.
+
+    With duplicate suppression the message is parsed here, so copies are
+    dropped before they take a worker queue slot; the workers get the parsed
+    uplink.
+    """
+    metrics.MESSAGES_RECEIVED.inc()
+    if capture is not None:
+        capture.record(msg.topic, msg.payload)
+    message = msg.payload
+    if dedup is not None:
+        try:
+            message = json.loads(message.decode())
+            key = uplink_key(message)
+        except Exception as e:
+            metrics.MESSAGES_FAILED.inc(UNKNOWN_CODEC, "parse")
+            logging.error("Error while processing MQTT message: %s", e)
+            return
+        if key is not None and dedup.is_duplicate(key):
+            metrics.MESSAGES_DUPLICATE.inc()
+            logging.debug("Dropped duplicate uplink from %s", key[0])
+            return
+    if ingest_pipeline is not None:
+        ingest_pipeline.submit(msg.topic, message)
+    else:
+        (handler or process_message)(message)
+
+def process_message(raw):
+    """Decode an uplink, raw bytes or already parsed, and forward it to the state manager."""
+    # Metric label: applicationName comes from MQTT input, so only registered
+    # codec names are used and every other value shares UNKNOWN_CODEC
+    codec_name = UNKNOWN_CODEC
+    stage = "parse"
     try:
-        payload = json.loads(msg.payload.decode())
-        logging.debug(f"Received message: {payload}")
+        payload = raw if isinstance(raw, dict) else json.loads(raw.decode())
         dev_eui = payload.get("devEUI")
+        logging.debug("Received message: %s", payload)
         dev_name = payload.get("deviceName")
-        codec_name = payload.get("applicationName")
+        decode = codec_registry.get(payload.get("applicationName"))
+        if decode is None:
+            metrics.MESSAGES_FAILED.inc(UNKNOWN_CODEC, "unknown_codec")
+            return
+        codec_name = payload["applicationName"]
         data_encode = payload.get("data_encode", "")
 
         if data_encode in ("", "hexstring"):
@@ -56,26 +101,77 @@ def on_message(client, userdata, msg):
             data = payload.get("data", "")
             payload_bytes = base64.b64decode(data)
         else:
-            logging.error(
-                f"Ignored message from {dev_eui} (data_encode={data_encode}) unsupported"
-            )
+            logging.error("Ignored message from %s (data_encode=%s) unsupported", dev_eui, data_encode)
+            metrics.MESSAGES_FAILED.inc(codec_name, "encoding")
             return
-        
-        codec = importlib.import_module(f"codec.{codec_name}")
-        data_decoded = codec.decode(payload_bytes)
-        logging.debug(f"{dev_eui}: decoded payload is {data_decoded}")
 
+        stage = "decode"
+        start = time.perf_counter()
+        data_decoded = decode(payload_bytes)
+        metrics.DECODE_SECONDS.observe(time.perf_counter() - start, codec_name)
+        logging.debug("%s: decoded payload is %s", dev_eui, data_decoded)
+
+        stage = "state"
         state_manager.update_sensor(dev_eui, dev_name, data_decoded)
+        metrics.MESSAGES_DECODED.inc(codec_name)
 
     except Exception as e:
-        logging.error(f"Error while processing MQTT message: {e}")
+        metrics.MESSAGES_FAILED.inc(codec_name, stage)
+        logging.error("Error while processing MQTT message: %s", e)
 
-def start_mqtt(cfg=None):
-    """Start the MQTT loop with the provided configuration."""
-    global mqtt_cfg
+def create_client():
+    """Create the paho client; paho is only imported here."""
+    import paho.mqtt.client as mqtt
+    return mqtt.Client(client_id="relaycontroller")
+
+def setup_mqtt(cfg=None, codec_cfg=None, ingest_cfg=None, capture_cfg=None, manager=None, message_handler=None,
+               pipeline_factory=IngestPipeline):
+    """Prepare codecs, ingest workers, capture and client callbacks; return (broker, port).
+
+    Decoded uplinks go to ``manager``, by default the shared StateManager.
+    ``message_handler(raw)`` replaces process_message for the raw payloads,
+    e.g. to time it. ``pipeline_factory`` builds the ingest workers, threads
+    by default.
+    """
+    global mqtt_cfg, codec_registry, ingest_pipeline, capture, dedup, client, state_manager, handler
     # configuration file loaded by the main program. A configuration
     # dictionary can be passed directly for testing purposes.
     mqtt_cfg = cfg
+    handler = message_handler or process_message
+    if manager is not None:
+        state_manager = manager
+    elif state_manager is None:
+        state_manager = get_state_manager()
+    if client is None:
+        client = create_client()
+
+    if codec_cfg is not None:
+        codec_registry = CodecRegistry(
+            allowed=codec_cfg.get("allowed"),
+            entry_points=codec_cfg.get("entry_points", False),
+        )
+    codec_registry.discover()
+
+    if ingest_cfg and ingest_cfg.get("workers", 0) > 0:
+        ingest_pipeline = pipeline_factory(
+            handler,
+            workers=ingest_cfg["workers"],
+            queue_size=ingest_cfg.get("queue_size", 1000),
+            overflow=ingest_cfg.get("overflow", "drop_oldest"),
+        )
+        ingest_pipeline.start()
+
+    if ingest_cfg is not None:
+        window = ingest_cfg.get("dedup_window", 10)
+        dedup = DuplicateFilter(window, ingest_cfg.get("dedup_max_entries", 10000)) if window > 0 else None
+
+    if capture_cfg and capture_cfg.get("enable", False):
+        capture = CaptureWriter(
+            capture_cfg.get("path", "capture.jsonl"),
+            max_bytes=capture_cfg.get("max_bytes", 50 * 1024 * 1024),
+            backup_count=capture_cfg.get("backup_count", 5),
+        )
+        logging.info(f"Recording MQTT messages to {capture.path}")
 
      # Authentification utilisateur
     username = mqtt_cfg.get("username")
@@ -89,10 +185,26 @@ def start_mqtt(cfg=None):
     
     broker = mqtt_cfg["broker"]
     port = mqtt_cfg.get("port", 8883 if mqtt_cfg.get("use_tls", False) else 1883)
+    return broker, port
 
+def start_mqtt(cfg=None, codec_cfg=None, ingest_cfg=None, capture_cfg=None, manager=None):
+    """Start the MQTT loop with the provided configuration."""
+    broker, port = setup_mqtt(cfg, codec_cfg, ingest_cfg, capture_cfg, manager)
     connect_with_retries(client, broker, port, keepalive=60)
     client.loop_forever()
 
 def stop_mqtt():
-    """Disconnect from the MQTT broker."""
-    client.disconnect()
\ No newline at end of file
+    """Disconnect from the MQTT broker and drain the ingest queues."""
+    if client is not None:
+        client.disconnect()
+    if ingest_pipeline is not None:
+        ingest_pipeline.stop()
+    if capture is not None:
+        capture.close()
+
+def ingest_stats():
+    """Queue depth and counters of the ingest pipeline and duplicate filter."""
+    stats = {"workers": 0} if ingest_pipeline is None else ingest_pipeline.stats()
+    if dedup is not None:
+        stats["duplicates"] = dedup.duplicates
+    return stats
\ No newline at end of file
@@ -1,22 +1,389 @@
 """Utility for sending TCP commands to relay controllers."""
 import socket
 import logging
+import threading
+import time
+import metrics
+
+RELAY_PORT = 17123
+CONNECT_TIMEOUT = 2
+IDLE_TIMEOUT = 30  # seconds before an unused session is closed
+LAST_ACK_GRACE = 0.2  # seconds to wait for the newline of a partly received last ack
+
+
+class _LinesRepr:
+    """Command lines rendered for a log message only if it is emitted."""
+
+    __slots__ = ("lines",)
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __str__(self):
+        return str([line.strip() for line in self.lines])
+
+
+def format_command(relay_index: int, state: bool) -> str:
+    """Build the SR command line for one relay."""
+    return f"SR {relay_index} {'on' if state else 'off'}\n"
+
+
+def format_query(relay_index: int) -> str:
+    """Build the GR line asking a controller for the state of one relay."""
+    return f"GR {relay_index}\n"
+
+
+def parse_status(ack: str):
+    """State reported in a GR answer ("on", "off", "1", "0", optionally prefixed), or None."""
+    words = ack.split()
+    value = words[-1].lower() if words else ""
+    if value in ("on", "1"):
+        return True
+    if value in ("off", "0"):
+        return False
+    return None
+
+
+class _AckReader:
+    """Split what a controller sends back into one ack per command line.
+
+    Performs no I/O, so the blocking and asyncio sessions share it. Acks are
+    newline-terminated, but controllers may leave the newline off the last
+    one: once every other ack is in, a partial line is taken as the last ack
+    at EOF or after LAST_ACK_GRACE seconds without more data.
+    """
+
+    __slots__ = ("buffer", "count", "acks")
+
+    def __init__(self, buffer, count):
+        self.buffer = buffer  # bytes received beyond the previous exchange
+        self.count = count
+        self.acks = []
+        self._take()
+
+    def _take(self):
+        while len(self.acks) < self.count and b"\n" in self.buffer:
+            ack, self.buffer = self.buffer.split(b"\n", 1)
+            ack = ack.decode("utf-8").strip()
+            if ack:  # skip blank lines, e.g. a late newline after an ack
+                self.acks.append(ack)
+
+    def timeout(self, default):
+        """Read timeout for the next chunk, or None once every ack is in."""
+        if len(self.acks) == self.count:
+            return None
+        return LAST_ACK_GRACE if self._partial_last() else default
+
+    def _partial_last(self):
+        return bool(self.buffer.strip()) and len(self.acks) == self.count - 1
+
+    def feed(self, chunk):
+        """Add received bytes; ``b""`` means EOF and None a read timeout."""
+        if chunk:
+            self.buffer += chunk
+            self._take()
+            return
+        if not self._partial_last():
+            if chunk is None:
+                raise TimeoutError("controller did not answer in time")
+            raise ConnectionError("connection closed by controller")
+        self.acks.append(self.buffer.decode("utf-8").strip())
+        self.buffer = b""
+
+
+class _RelaySession:
+    """Persistent TCP session to a single relay controller."""
+
+    def __init__(self, ip, port, timeout):
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = b""
+        self.last_used = 0.0
+        self.lock = threading.Lock()
+
+    def connect(self):
+        self.sock = socket.create_connection((self.ip, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.buffer = b""
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.buffer = b""
+
+    def exchange(self, lines):
+        """Send all lines in one write and return one ack per line (see _AckReader)."""
+        self.sock.sendall("".join(lines).encode("utf-8"))
+        ack_reader = _AckReader(self.buffer, len(lines))
+        current = self.timeout
+        try:
+            while True:
+                timeout = ack_reader.timeout(self.timeout)
+                if timeout is None:
+                    break
+                if timeout != current:
+                    self.sock.settimeout(timeout)
+                    current = timeout
+                try:
+                    chunk = self.sock.recv(1024)
+                except socket.timeout:
+                    chunk = None
+                ack_reader.feed(chunk)
+                if chunk == b"":
+                    self.close()  # the last ack came with EOF
+        finally:
+            if current != self.timeout and self.sock is not None:
+                self.sock.settimeout(self.timeout)
+        self.buffer = ack_reader.buffer
+        self.last_used = time.monotonic()
+        return ack_reader.acks
+
+
+class RelayConnectionPool:
+    """Keep one persistent TCP session per relay controller."""
+
+    def __init__(self, port=RELAY_PORT, timeout=CONNECT_TIMEOUT, idle_timeout=IDLE_TIMEOUT):
+        self.port = port
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session(self, ip):
+        with self._lock:
+            session = self._sessions.get(ip)
+            if session is None:
+                session = _RelaySession(ip, self.port, self.timeout)
+                self._sessions[ip] = session
+            return session
+
+    def send_lines(self, ip, lines):
+        """Pipeline command lines to a controller and return their acks.
+
+        A reused session that turns out to be broken is reopened and the whole
+        batch is sent again, which is safe because SR commands are idempotent.
+        """
+        self.expire_idle()
+        session = self._session(ip)
+        with session.lock:
+            while True:
+                reused = session.sock is not None
+                try:
+                    if not reused:
+                        session.connect()
+                    return session.exchange(lines)
+                except OSError as e:
+                    session.close()
+                    if not reused:
+                        raise
+                    logging.debug("[RELAY] Session to %s lost (%s), reconnecting", ip, e)
+
+    def expire_idle(self):
+        """Close sessions that have not been used for idle_timeout seconds."""
+        now = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            if session.sock is None or now - session.last_used < self.idle_timeout:
+                continue
+            if session.lock.acquire(blocking=False):
+                try:
+                    session.close()
+                finally:
+                    session.lock.release()
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions = {}
+        for session in sessions:
+            with session.lock:
+                session.close()
+
+
+class AsyncRelayConnectionPool:
+    """asyncio counterpart of RelayConnectionPool, one stream per controller."""
+
+    def __init__(self, port=RELAY_PORT, timeout=CONNECT_TIMEOUT, idle_timeout=IDLE_TIMEOUT):
+        self.port = port
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._streams = {}  # ip -> [reader, writer, buffer, last_used]
+        self._locks = {}
+
+    async def send_lines(self, ip, lines):
+        """Pipeline command lines to a controller and return their acks."""
+        import asyncio  # deferred: only the asyncio runtime loads it
+        lock = self._locks.setdefault(ip, asyncio.Lock())
+        async with lock:
+            stream = self._streams.get(ip)
+            if stream is not None and time.monotonic() - stream[3] >= self.idle_timeout:
+                self._close(ip)
+            while True:
+                stream = self._streams.get(ip)
+                reused = stream is not None
+                try:
+                    if not reused:
+                        reader, writer = await asyncio.wait_for(
+                            asyncio.open_connection(ip, self.port), self.timeout
+                        )
+                        sock = writer.get_extra_info("socket")
+                        if sock is not None:
+                            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                        stream = [reader, writer, b"", 0.0]
+                        self._streams[ip] = stream
+                    return await self._exchange(stream, lines)
+                except (OSError, asyncio.TimeoutError) as e:
+                    self._close(ip)
+                    if not reused:
+                        raise
+                    logging.debug("[RELAY] Session to %s lost (%s), reconnecting", ip, e)
+
+    async def _exchange(self, stream, lines):
+        """Same framing as _RelaySession.exchange(), through _AckReader."""
+        import asyncio
+        reader, writer = stream[0], stream[1]
+        writer.write("".join(lines).encode("utf-8"))
+        await writer.drain()
+        ack_reader = _AckReader(stream[2], len(lines))
+        while True:
+            timeout = ack_reader.timeout(self.timeout)
+            if timeout is None:
+                break
+            try:
+                chunk = await asyncio.wait_for(reader.read(1024), timeout)
+            except asyncio.TimeoutError:
+                chunk = None
+            ack_reader.feed(chunk)
+        stream[2] = ack_reader.buffer
+        stream[3] = time.monotonic()
+        return ack_reader.acks
+
+    def _close(self, ip):
+        stream = self._streams.pop(ip, None)
+        if stream is not None:
+            stream[1].close()
+
+    def close_all(self):
+        for ip in list(self._streams):
+            self._close(ip)
+
+
+_pool = RelayConnectionPool()
+
+
+def _command_lines(ip, commands):
+    lines = [format_command(relay_index, state) for relay_index, state in commands]
+    if lines:
+        logging.debug("[RELAY] Sending %d command(s) @ %s: %s", len(lines), ip, _LinesRepr(lines))
+    return lines
+
+
+def _commands_sent(ip, lines, acks, start):
+    metrics.RELAY_RTT_SECONDS.observe(time.perf_counter() - start, ip)
+    metrics.RELAY_COMMANDS.inc(ip, amount=len(acks))
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        for line, ack in zip(lines, acks):
+            logging.info("[RELAY] Request sent to %s : %s (ack: %s)", ip, line.strip(), ack)
+    return acks
+
+
+def _commands_failed(ip, lines, error):
+    metrics.RELAY_FAILURES.inc(ip)
+    # Kept identical per controller and error so repeats are rate-limited
+    logging.error("[RELAY] Fail sending to %s: %s", ip, error)
+    logging.debug("[RELAY] Commands not sent @ %s: %s", ip, _LinesRepr(lines))
+
+
+def send_tcp_commands(ip: str, commands):
+    """Send several (relay_index, state) commands to one controller over one session.
+
+    Returns the acks in command order, or None when the controller is unreachable.
+    """
+    lines = _command_lines(ip, commands)
+    if not lines:
+        return []
+    start = time.perf_counter()
+    try:
+        acks = _pool.send_lines(ip, lines)
+    except Exception as e:
+        _commands_failed(ip, lines, e)
+        return None
+    return _commands_sent(ip, lines, acks, start)
+
+
+async def async_send_tcp_commands(pool: AsyncRelayConnectionPool, ip: str, commands):
+    """asyncio version of send_tcp_commands using the given pool."""
+    lines = _command_lines(ip, commands)
+    if not lines:
+        return []
+    start = time.perf_counter()
+    try:
+        acks = await pool.send_lines(ip, lines)
+    except Exception as e:
+        _commands_failed(ip, lines, e)
+        return None
+    return _commands_sent(ip, lines, acks, start)
+
+
+def close_sessions():
+    """Close every pooled controller session."""
+    _pool.close_all()
+
 
 def send_tcp_command(ip: str, relay_index: int, state: bool):
     """Send a TCP command to toggle a relay on the target device."""
-    command = f"SR {relay_index} {'on' if state else 'off'}\n"
-    logging.debug(f"[RELAY] Sending relay {relay_index} @ {ip}: {command}")
+    acks = send_tcp_commands(ip, [(relay_index, state)])
+    return acks[0] if acks else None
+
+
+def query_relay_status(ip: str, relay_indexes):
+    """Read the state of several relays of one controller in one pipelined exchange.
+
+    Returns {relay_index: state}, where state is None for an answer that could
+    not be parsed, or None when the controller is unreachable.
+    """
+    relay_indexes = list(relay_indexes)
+    if not relay_indexes:
+        return {}
+    lines = [format_query(relay_index) for relay_index in relay_indexes]
+    start = time.perf_counter()
+    try:
+        acks = _pool.send_lines(ip, lines)
+    except Exception as e:
+        _query_failed(ip, e)
+        return None
+    return _relay_status(ip, relay_indexes, acks, start)
+
+
+async def async_query_relay_status(pool: AsyncRelayConnectionPool, ip: str, relay_indexes):
+    """asyncio version of query_relay_status using the given pool."""
+    relay_indexes = list(relay_indexes)
+    if not relay_indexes:
+        return {}
+    lines = [format_query(relay_index) for relay_index in relay_indexes]
+    start = time.perf_counter()
     try:
-        with socket.create_connection((ip, 17123), timeout=2) as sock:
-            sock.sendall(command.encode("utf-8"))
-            # Lecture de la réponse (accusé de réception)
-            ack = sock.recv(1024).decode("utf-8").strip()
-            logging.info(f"[RELAY] Received ack from {ip}: {ack}")
-        logging.info(f"[RELAY] Request sent to {ip} : {command.strip()}")
+        acks = await pool.send_lines(ip, lines)
     except Exception as e:
-        logging.error(f"[RELAY] Fail sending relay {relay_index} @ {ip}: {e}")
+        _query_failed(ip, e)
+        return None
+    return _relay_status(ip, relay_indexes, acks, start)
+
+
+def _query_failed(ip, error):
+    metrics.RELAY_FAILURES.inc(ip)
+    logging.error("[RELAY] Fail querying %s: %s", ip, error)
 
 
-# Optionnel : mémo pour future extension (ex: status, groups...)
-# def query_relay_status(ip: str):
-#     pass
+def _relay_status(ip, relay_indexes, acks, start):
+    metrics.RELAY_RTT_SECONDS.observe(time.perf_counter() - start, ip)
+    status = {relay_index: parse_status(ack) for relay_index, ack in zip(relay_indexes, acks)}
+    logging.debug("[RELAY] Status of %s: %s", ip, status)
+    return status
@@ -0,0 +1,155 @@
+"""Asynchronous relay command dispatch with one worker per controller."""
+
+import logging
+import threading
+from relay_controller import send_tcp_commands, query_relay_status
+
+
+def reconcile_commands(ip, desired, actual):
+    """{relay_index: state} for the relays whose read-back ``actual`` state is not ``desired``.
+
+    A relay the controller did not report, or every relay when it did not
+    answer (``actual`` is None), counts as differing: SR is idempotent, so
+    driving it is always safe.
+    """
+    if actual is None:
+        logging.warning("[RELAY] %s did not answer the status query, driving all its relays", ip)
+        actual = {}
+    commands = {index: state for index, state in desired.items() if actual.get(index) != state}
+    unknown = sum(1 for index in desired if actual.get(index) is None)
+    logging.info(
+        "[RELAY] Reconciled %s: %d of %d relays to drive, %d without a readable state",
+        ip, len(commands), len(desired), unknown,
+    )
+    return commands
+
+
+def unreached_fixes(fixes, commands, acks):
+    """The reconcile ``fixes`` among ``commands`` whose batch could not be sent (``acks`` is None)."""
+    if acks is not None or not fixes:
+        return {}
+    return {index: state for index, state in commands if fixes.get(index) == state}
+
+
+class _ControllerWorker:
+    """Queue and send the commands of a single relay controller."""
+
+    def __init__(self, ip, send, query):
+        self.ip = ip
+        self.send = send
+        self.query = query
+        self.pending = {}  # relay_index -> latest desired state
+        self.check = {}  # relay_index -> desired state to compare with the controller
+        self.on_unreached = None
+        self.busy = False
+        self.stopping = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, relay_index, state):
+        with self.cond:
+            # A newer command for the same relay replaces the queued one
+            self.pending[relay_index] = state
+            self.cond.notify()
+
+    def reconcile(self, desired, on_unreached=None):
+        with self.cond:
+            self.check.update(desired)
+            self.on_unreached = on_unreached
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or self.check or self.stopping)
+                if not self.pending and not self.check:
+                    return
+                check, self.check = self.check, {}
+                self.busy = True
+            commands = []
+            try:
+                fixes = reconcile_commands(self.ip, check, self.query(self.ip, check)) if check else {}
+                with self.cond:
+                    # Commands submitted meanwhile are newer than the checked state
+                    for relay_index, state in fixes.items():
+                        self.pending.setdefault(relay_index, state)
+                    # Everything queued so far goes out as one pipelined batch
+                    commands = list(self.pending.items())
+                    self.pending = {}
+                    on_unreached = self.on_unreached
+                if commands:
+                    acks = self.send(self.ip, commands)
+                    unreached = unreached_fixes(fixes, commands, acks)
+                    if unreached and on_unreached is not None:
+                        on_unreached(self.ip, unreached)
+            except Exception as e:
+                logging.error("[RELAY] Dispatch failed for %s @ %s: %s", commands, self.ip, e)
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pending and not self.check and not self.busy, timeout)
+
+    def stop(self, timeout=None):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        self.thread.join(timeout)
+
+
+class RelayDispatcher:
+    """Drive relay controllers in parallel without blocking the caller.
+
+    ``send(ip, commands)`` receives the (relay_index, state) pairs queued for
+    one controller since its previous batch; ``query(ip, relay_indexes)``
+    reads relay states back for reconcile().
+    """
+
+    def __init__(self, send=send_tcp_commands, query=query_relay_status):
+        self.send = send
+        self.query = query
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def _worker(self, ip):
+        worker = self._workers.get(ip)
+        if worker is None:
+            with self._lock:
+                worker = self._workers.get(ip)
+                if worker is None:
+                    worker = _ControllerWorker(ip, self.send, self.query)
+                    self._workers[ip] = worker
+        return worker
+
+    def submit(self, ip, relay_index, state):
+        """Queue a relay command; pending commands for the same relay collapse."""
+        self._worker(ip).submit(relay_index, state)
+
+    def reconcile(self, ip, desired, on_unreached=None):
+        """Read back the relays of ``desired`` ({relay_index: state}) on the controller's
+        worker and command those whose state differs or cannot be read.
+
+        ``on_unreached(ip, {relay_index: state})`` is called with the relays
+        that could not be commanded because the controller is unreachable.
+        """
+        self._worker(ip).reconcile(desired, on_unreached)
+
+    def pending_count(self):
+        """Number of relay commands waiting to be sent."""
+        return sum(len(w.pending) for w in list(self._workers.values()))
+
+    def wait_idle(self, timeout=None):
+        """Block until every queued command has been sent."""
+        return all(w.wait_idle(timeout) for w in list(self._workers.values()))
+
+    def stop(self, timeout=5.0):
+        """Send what is still queued, then stop the worker threads."""
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers = {}
+        for worker in workers:
+            worker.stop(timeout)
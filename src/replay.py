@@ -0,0 +1,221 @@
+"""Replay an MQTT capture through on_message and a StateManager.
+
+Messages recorded by capture.CaptureWriter go through the real decoding and
+state pipeline, against their own database and a stub relay controller, at
+maximum or recorded speed. Per-stage latencies and throughput are reported
+at the end. Replaying into a fresh --db rebuilds the sensor states; their
+last_seen is the replay time, not the capture time.
+
+    python src/replay.py capture.jsonl --db state.db --speed max
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+import mqtt_listener
+from capture import capture_files, read_capture
+from relay_dispatcher import RelayDispatcher
+from state_manager import StateManager
+
+
+class StageTimer:
+    """Collect durations of one pipeline stage."""
+
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def wrap(self, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        """Count and mean/p50/p95/p99/max in milliseconds."""
+        samples = sorted(self.samples)
+        if not samples:
+            return {"count": 0}
+
+        def pct(p):
+            return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+        return {
+            "count": len(samples),
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": samples[-1] * 1000,
+        }
+
+
+class StubRelay:
+    """Stand-in for the relay controllers that times commands from submit to send."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.commands = 0
+        self.batches = 0
+        self.timer = StageTimer()
+        self._submitted = {}  # (ip, relay_index) -> submit time of the oldest pending command
+        self._lock = threading.Lock()
+
+    def submitted(self, ip, relay_index):
+        with self._lock:
+            self._submitted.setdefault((ip, relay_index), time.perf_counter())
+
+    def send(self, ip, commands):
+        if self.latency:
+            time.sleep(self.latency)
+        now = time.perf_counter()
+        with self._lock:
+            self.batches += 1
+            self.commands += len(commands)
+            for relay_index, _ in commands:
+                submitted = self._submitted.pop((ip, relay_index), None)
+                if submitted is not None:
+                    self.timer.add(now - submitted)
+
+
+class _StubDispatcher(RelayDispatcher):
+    def __init__(self, relay):
+        super().__init__(relay.send)
+        self.relay = relay
+
+    def submit(self, ip, relay_index, state):
+        self.relay.submitted(ip, relay_index)
+        super().submit(ip, relay_index, state)
+
+
+class _Message:
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+def _stop_ingest():
+    pipeline, mqtt_listener.ingest_pipeline = mqtt_listener.ingest_pipeline, None
+    if pipeline is not None:
+        pipeline.stop()
+
+
+def replay(paths, db_path, speed=None, workers=0, relay_latency=0.0, codec_cfg=None, dedup_window=0):
+    """Replay the capture files ``paths``; ``speed`` None means as fast as possible.
+
+    Duplicate suppression is off unless ``dedup_window`` is set: its window is
+    wall-clock time, which an accelerated replay compresses.
+
+    Returns a report with throughput and per-stage latency summaries.
+    """
+    relay = StubRelay(relay_latency)
+    manager = StateManager(db_path=db_path, json_path=None, relay_dispatcher=_StubDispatcher(relay))
+    manager.enable_write_behind(flush_interval=1, batch_size=500)
+    stages = {name: StageTimer() for name in ("on_message", "process_message", "update_sensor")}
+
+    manager.update_sensor = stages["update_sensor"].wrap(manager.update_sensor)
+    # Block instead of dropping when the workers fall behind: every message counts
+    ingest_cfg = {"workers": workers, "overflow": "block", "dedup_window": dedup_window}
+    mqtt_listener.setup_mqtt(
+        {"broker": "replay"}, codec_cfg, ingest_cfg, manager=manager,
+        message_handler=stages["process_message"].wrap(mqtt_listener.process_message),
+    )
+    on_message = stages["on_message"].wrap(mqtt_listener.on_message)
+
+    count = 0
+    first_at = None
+    start = time.perf_counter()
+    try:
+        for received_at, topic, payload in read_capture(paths):
+            if speed:
+                if first_at is None:
+                    first_at = received_at
+                delay = (received_at - first_at) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            on_message(None, None, _Message(topic, payload))
+            count += 1
+        _stop_ingest()
+        manager.relay_dispatcher.wait_idle(timeout=30)
+        elapsed = time.perf_counter() - start
+    finally:
+        _stop_ingest()
+        # Leave no replay hook or manager behind for the next caller
+        mqtt_listener.handler = None
+        mqtt_listener.state_manager = None
+        manager.close()
+
+    report = {
+        "messages": count,
+        "seconds": elapsed,
+        "messages_per_second": count / elapsed if elapsed else 0.0,
+        "sensors": len(manager.state),
+        "relay_commands": relay.commands,
+        "relay_batches": relay.batches,
+        "stages": {name: timer.summary() for name, timer in stages.items()},
+    }
+    report["stages"]["relay"] = relay.timer.summary()
+    return report
+
+
+def format_report(report):
+    lines = [
+        f"Replayed {report['messages']} messages in {report['seconds']:.3f} s "
+        f"({report['messages_per_second']:.0f} msg/s), {report['sensors']} sensors",
+        f"Relay commands: {report['relay_commands']} in {report['relay_batches']} batches",
+        f"{'stage':<16}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)",
+    ]
+    for name, s in report["stages"].items():
+        if not s["count"]:
+            lines.append(f"{name:<16}{0:>8}")
+            continue
+        lines.append(
+            f"{name:<16}{s['count']:>8}{s['mean_ms']:>10.3f}{s['p50_ms']:>10.3f}"
+            f"{s['p95_ms']:>10.3f}{s['p99_ms']:>10.3f}{s['max_ms']:>10.3f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an MQTT capture")
+    parser.add_argument("capture", help="Capture file; its rotated backups are replayed first")
+    parser.add_argument("--db", default="replay.db", help="SQLite database to replay into")
+    parser.add_argument(
+        "--speed", default="max", help="max, recorded, or a factor of the recorded speed (e.g. 10)"
+    )
+    parser.add_argument("--workers", type=int, default=0, help="Ingest workers, 0 processes inline")
+    parser.add_argument("--relay-latency", type=float, default=0.0, help="Seconds per stub relay exchange")
+    parser.add_argument(
+        "--dedup-window", type=float, default=0, help="Seconds to drop uplink copies in, 0 keeps every copy"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args()
+
+    # force: importing the state manager may already have configured logging
+    logging.basicConfig(level=args.log_level.upper(), force=True)
+    speed = None if args.speed == "max" else 1.0 if args.speed == "recorded" else float(args.speed)
+    paths = capture_files(args.capture)
+    if not paths:
+        parser.error(f"No capture file at {args.capture}")
+
+    report = replay(
+        paths, args.db, speed=speed, workers=args.workers, relay_latency=args.relay_latency,
+        dedup_window=args.dedup_window,
+    )
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Single-thread scheduler for keyed, cancellable delayed callbacks."""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class Scheduler:
+    """Run callbacks at their deadline from one worker thread.
+
+    Each callback is registered under a key; scheduling the same key again
+    replaces the pending callback. Replaced and cancelled entries stay in the
+    heap and are skipped when they reach the top. Tuple keys are counted per
+    group, their first item.
+    """
+
+    def __init__(self):
+        self._heap = []  # (deadline, seq, key)
+        self._entries = {}  # key -> (deadline, seq, callback)
+        self._groups = {}  # group -> number of pending entries
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def schedule(self, key, delay, callback):
+        """Run ``callback()`` after ``delay`` seconds, replacing any pending one for ``key``."""
+        with self._cond:
+            deadline = time.monotonic() + delay
+            seq = next(self._seq)
+            if key not in self._entries:
+                self._count(key, 1)
+            self._entries[key] = (deadline, seq, callback)
+            heapq.heappush(self._heap, (deadline, seq, key))
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._compact()
+            if self._heap[0][1] == seq:
+                self._cond.notify()
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def cancel(self, key):
+        """Drop the pending callback for ``key``; return True if there was one."""
+        with self._cond:
+            if self._entries.pop(key, None) is None:
+                return False
+            self._count(key, -1)
+            return True
+
+    def _count(self, key, delta):
+        group = key[0] if isinstance(key, tuple) else key
+        self._groups[group] = self._groups.get(group, 0) + delta
+
+    def pending_count(self, group=None):
+        """Number of callbacks waiting to run, optionally for one key group."""
+        if group is None:
+            return len(self._entries)
+        return self._groups.get(group, 0)
+
+    def _compact(self):
+        self._heap = [(deadline, seq, key) for key, (deadline, seq, _) in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    def _next_due(self):
+        """Wait for the next due callback, or return None when stopping."""
+        with self._cond:
+            while not self._stopping:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                deadline, seq, key = self._heap[0]
+                entry = self._entries.get(key)
+                if entry is None or entry[1] != seq:
+                    heapq.heappop(self._heap)
+                    continue
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                del self._entries[key]
+                self._count(key, -1)
+                return entry[2]
+            return None
+
+    def _run(self):
+        while True:
+            callback = self._next_due()
+            if callback is None:
+                return
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Scheduled callback failed: {e}")
+
+    def stop(self):
+        """Stop the worker thread; pending callbacks are discarded."""
+        with self._cond:
+            self._stopping = True
+            self._entries.clear()
+            self._groups.clear()
+            self._heap.clear()
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
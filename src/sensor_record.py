@@ -0,0 +1,121 @@
+"""Compact in-memory state of one sensor."""
+
+import functools
+import time
+from collections.abc import Mapping
+from datetime import datetime
+
+FLAGS = ("alarm", "tamper", "battery_low", "offline")
+ALARM, TAMPER, BATTERY_LOW, OFFLINE = (1 << i for i in range(len(FLAGS)))
+FLAG_BITS = dict(zip(FLAGS, (ALARM, TAMPER, BATTERY_LOW, OFFLINE)))
+KEYS = ("dev_name", "zone", "last_seen") + FLAGS
+
+_set = object.__setattr__
+
+
+@functools.lru_cache(maxsize=1024)
+def format_epoch(epoch):
+    """ISO 8601 UTC timestamp with a Z suffix, or None for 0.
+
+    Cached: the sensors updated within the same second share the string.
+    """
+    if not epoch:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch))
+
+
+def parse_epoch(value):
+    """Integer epoch seconds of an ISO 8601 timestamp; 0 for an empty value.
+
+    Raises ValueError when the timestamp cannot be parsed.
+    """
+    if not value:
+        return 0
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+
+class SensorRecord(Mapping):
+    """Name, zone, last uplink time and flags of a sensor.
+
+    The four flags are packed in one int (bit i is FLAGS[i]) and last_seen is
+    kept as integer epoch seconds. Decoded uplink fields beyond those are not
+    kept. The record reads like the dict the API and the stores use:
+    ``record["alarm"]``, ``record.get("zone")``, ``dict(record)``.
+
+    Records are immutable: published state snapshots share them with lock-free
+    readers, so a change is made by building a new record.
+    """
+
+    __slots__ = ("dev_name", "zone", "seen", "flags")
+
+    def __init__(self, dev_name=None, zone=None, seen=0, flags=0):
+        _set(self, "dev_name", dev_name)
+        _set(self, "zone", zone)
+        _set(self, "seen", seen)
+        _set(self, "flags", flags)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"SensorRecord is read-only, cannot set {name!r}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"SensorRecord is read-only, cannot delete {name!r}")
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a record from a state dict such as a stored row."""
+        flags = 0
+        for name, bit in FLAG_BITS.items():
+            if data.get(name):
+                flags |= bit
+        return cls(data.get("dev_name"), data.get("zone"), parse_epoch(data.get("last_seen")), flags)
+
+    def copy(self):
+        return SensorRecord(self.dev_name, self.zone, self.seen, self.flags)
+
+    def as_dict(self):
+        flags = self.flags
+        return {
+            "dev_name": self.dev_name,
+            "zone": self.zone,
+            "last_seen": format_epoch(self.seen),
+            "alarm": bool(flags & ALARM),
+            "tamper": bool(flags & TAMPER),
+            "battery_low": bool(flags & BATTERY_LOW),
+            "offline": bool(flags & OFFLINE),
+        }
+
+    def __getitem__(self, key):
+        bit = FLAG_BITS.get(key)
+        if bit is not None:
+            return bool(self.flags & bit)
+        if key == "last_seen":
+            return format_epoch(self.seen)
+        if key == "dev_name":
+            return self.dev_name
+        if key == "zone":
+            return self.zone
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        bit = FLAG_BITS.get(key)
+        if bit is not None:
+            return bool(self.flags & bit)
+        if key == "last_seen":
+            return format_epoch(self.seen)
+        if key == "dev_name":
+            return self.dev_name
+        if key == "zone":
+            return self.zone
+        return default
+
+    def __iter__(self):
+        return iter(KEYS)
+
+    def __len__(self):
+        return len(KEYS)
+
+    def keys(self):
+        return KEYS
+
+    def __repr__(self):
+        return f"SensorRecord({self.as_dict()})"
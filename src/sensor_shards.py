@@ -0,0 +1,61 @@
+"""Immutable sensor state mapping updated by copying one shard."""
+
+from collections.abc import Mapping
+from itertools import chain
+
+SHARD_COUNT = 128  # an update copies the shard tuple and one shard dict
+
+
+class SensorShards(Mapping):
+    """dev_eui -> SensorRecord split over a fixed number of dicts.
+
+    Instances are never modified: replace() returns a new mapping sharing
+    every shard but the one holding the sensor, so a writer can publish the
+    result with a single assignment while readers keep iterating the old one
+    without a lock.
+    """
+
+    __slots__ = ("_shards", "_len")
+
+    def __init__(self, shards=None, length=0):
+        self._shards = shards if shards is not None else ({},) * SHARD_COUNT
+        self._len = length
+
+    @classmethod
+    def from_dict(cls, state, shard_count=SHARD_COUNT):
+        shards = tuple({} for _ in range(shard_count))
+        for dev_eui, record in state.items():
+            shards[hash(dev_eui) % shard_count][dev_eui] = record
+        return cls(shards, len(state))
+
+    def replace(self, dev_eui, record):
+        """Mapping with ``dev_eui`` set to ``record``, or removed if record is None."""
+        index = hash(dev_eui) % len(self._shards)
+        shard = dict(self._shards[index])
+        length = self._len - (dev_eui in shard)
+        if record is None:
+            shard.pop(dev_eui, None)
+        else:
+            shard[dev_eui] = record
+            length += 1
+        shards = list(self._shards)
+        shards[index] = shard
+        return SensorShards(tuple(shards), length)
+
+    def __getitem__(self, dev_eui):
+        return self._shards[hash(dev_eui) % len(self._shards)][dev_eui]
+
+    def get(self, dev_eui, default=None):
+        return self._shards[hash(dev_eui) % len(self._shards)].get(dev_eui, default)
+
+    def __contains__(self, dev_eui):
+        return dev_eui in self._shards[hash(dev_eui) % len(self._shards)]
+
+    def __iter__(self):
+        return chain.from_iterable(self._shards)
+
+    def items(self):
+        return chain.from_iterable(shard.items() for shard in self._shards)
+
+    def __len__(self):
+        return self._len
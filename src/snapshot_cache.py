@@ -0,0 +1,56 @@
+"""Pre-serialized JSON snapshot of the sensor states for the read API."""
+
+import json
+import threading
+
+
+def _fragment(dev_eui, entry):
+    """Encode one ``"dev_eui": {...}`` member of the state object."""
+    return (json.dumps(dev_eui) + ":" + json.dumps(dict(entry), separators=(",", ":"), default=str)).encode()
+
+
+class SnapshotCache:
+    """Keep one JSON fragment per sensor and rebuild only the changed ones.
+
+    Writers call mark() with the changed entry, a SensorRecord, which is
+    immutable and kept by reference; encoding is left to the next reader,
+    which joins the cached fragments into the response body and keeps it
+    until the version changes. Readers only take the cache's own lock, never
+    the state manager's.
+    """
+
+    def __init__(self):
+        self._fragments = {}  # dev_eui -> encoded member
+        self._dirty = {}  # dev_eui -> entry, or None once removed
+        self._lock = threading.Lock()
+        self.version = 0
+        self._body = None
+        self._body_version = None
+
+    def load(self, state, version):
+        """Mark every sensor of ``state`` as changed at ``version``."""
+        with self._lock:
+            self._dirty.update(state)
+            self.version = version
+
+    def mark(self, dev_eui, entry, version):
+        """Record a changed (or, with ``entry=None``, removed) sensor."""
+        with self._lock:
+            self._dirty[dev_eui] = entry
+            self.version = version
+
+    def body(self):
+        """Return (version, JSON body of the whole state as bytes)."""
+        with self._lock:
+            if self._body_version == self.version and self._body is not None:
+                return self.version, self._body
+            dirty, self._dirty = self._dirty, {}
+            fragments = self._fragments
+            for dev_eui, entry in dirty.items():
+                if entry is None:
+                    fragments.pop(dev_eui, None)
+                else:
+                    fragments[dev_eui] = _fragment(dev_eui, entry)
+            self._body = b"{" + b",".join(fragments.values()) + b"}"
+            self._body_version = self.version
+            return self.version, self._body
@@ -0,0 +1,96 @@
+"""Long-lived per-thread SQLite connections shared by the stores."""
+
+import sqlite3
+import logging
+import threading
+import weakref
+
+DEFAULT_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -2000,  # negative values are KiB
+    "mmap_size": 0,
+}
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA", "0", "1", "2", "3"}
+
+
+class _ThreadConnection:
+    """Connection owned by a single thread, closed when the thread ends."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.generation = -1
+
+    def close(self):
+        try:
+            self.conn.close()
+        except sqlite3.Error:
+            pass
+
+    def __del__(self):
+        self.close()
+
+
+class SQLiteConnectionManager:
+    """Hand out one connection per thread, in WAL mode with tuned pragmas."""
+
+    def __init__(self, db_path="state.db", **pragmas):
+        self.db_path = db_path
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        self._generation = 0
+        self._local = threading.local()
+        self._holders = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self.configure(**pragmas)
+
+    def configure(self, synchronous=None, cache_size=None, mmap_size=None):
+        """Update pragmas; each thread re-applies them on its next query."""
+        updates = {}
+        if synchronous is not None:
+            synchronous = str(synchronous).upper()
+            if synchronous not in SYNCHRONOUS_MODES:
+                raise ValueError(f"Invalid SQLite synchronous mode: {synchronous}")
+            updates["synchronous"] = synchronous
+        if cache_size is not None:
+            updates["cache_size"] = int(cache_size)
+        if mmap_size is not None:
+            updates["mmap_size"] = int(mmap_size)
+        with self._lock:
+            self.pragmas.update(updates)
+            self._generation += 1
+
+    def connection(self):
+        """Return the calling thread's connection, opening it if needed."""
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+            if mode.lower() != "wal":
+                logging.warning(f"SQLite WAL not available for {self.db_path}, using {mode}")
+            holder = _ThreadConnection(conn)
+            self._local.holder = holder
+            with self._lock:
+                self._holders.add(holder)
+        if holder.generation != self._generation:
+            self._apply_pragmas(holder)
+        return holder.conn
+
+    def _apply_pragmas(self, holder):
+        with self._lock:
+            pragmas = dict(self.pragmas)
+            generation = self._generation
+        for name, value in pragmas.items():
+            try:
+                holder.conn.execute(f"PRAGMA {name}={value}")
+            except sqlite3.Error as e:
+                logging.error(f"SQLite error setting PRAGMA {name}={value}: {e}")
+        holder.generation = generation
+
+    def close_all(self):
+        """Close every connection opened through this manager."""
+        with self._lock:
+            holders = list(self._holders)
+            self._holders = weakref.WeakSet()
+        for holder in holders:
+            holder.close()
+        self._local = threading.local()
@@ -0,0 +1,90 @@
+"""Database wrapper for the desired state of each relay in SQLite."""
+
+import sqlite3
+import logging
+import threading
+import metrics
+from sqlite_connection import SQLiteConnectionManager
+
+
+class SQLiteRelayStore:
+    """Load and persist the last commanded state of each (ip, relay_index).
+
+    queue_relay() only records the state, so it can be called under the
+    StateManager lock; flush() writes what was queued.
+    """
+
+    def __init__(self, db_path="state.db", connections=None):
+        self.db_path = db_path
+        self.db = connections or SQLiteConnectionManager(db_path)
+        self.lock = threading.Lock()  # held while writing, keeps flushes ordered
+        self._pending = {}  # (ip, relay_index) -> state
+        self._pending_lock = threading.Lock()
+        self._init_db()
+
+    def _init_db(self):
+        try:
+            with self.db.connection() as conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS relay_state (
+                        ip TEXT NOT NULL,
+                        relay_index INTEGER NOT NULL,
+                        state INTEGER NOT NULL,
+                        PRIMARY KEY (ip, relay_index)
+                    )
+                    """
+                )
+        except sqlite3.OperationalError as e:
+            logging.error(f"SQLite error during relay DB init: {e}")
+            raise
+
+    def load_all(self):
+        """Return {(ip, relay_index): state} for every stored relay."""
+        with self.db.connection() as conn:
+            cursor = conn.execute("SELECT ip, relay_index, state FROM relay_state")
+            return {(row["ip"], row["relay_index"]): bool(row["state"]) for row in cursor.fetchall()}
+
+    def queue_relay(self, ip, relay_index, state):
+        """Record the desired state of one relay for the next flush()."""
+        with self._pending_lock:
+            self._pending[(ip, relay_index)] = state
+
+    def flush(self):
+        """Write the queued relay states in one transaction."""
+        if not self._pending:
+            return
+        with self.lock:
+            with self._pending_lock:
+                rows = [(ip, index, int(state)) for (ip, index), state in self._pending.items()]
+                self._pending = {}
+            if not rows:
+                return
+            try:
+                with metrics.SQLITE_WRITE_SECONDS.time("relay_state"), self.db.connection() as conn:
+                    conn.executemany(
+                        """
+                        INSERT INTO relay_state (ip, relay_index, state) VALUES (?, ?, ?)
+                        ON CONFLICT(ip, relay_index) DO UPDATE SET state=excluded.state
+                        """,
+                        rows,
+                    )
+            except sqlite3.Error as e:
+                logging.error(f"SQLite error while saving {len(rows)} relay states: {e}")
+                with self._pending_lock:
+                    for ip, index, state in rows:
+                        self._pending.setdefault((ip, index), bool(state))
+                return
+        metrics.SQLITE_ROWS_WRITTEN.inc("relay_state", amount=len(rows))
+
+    def delete_relays(self, keys):
+        """Forget the (ip, relay_index) pairs in ``keys``, queued states included."""
+        keys = list(keys)
+        if not keys:
+            return
+        with self.lock:
+            with self._pending_lock:
+                for key in keys:
+                    self._pending.pop(key, None)
+            with self.db.connection() as conn:
+                conn.executemany("DELETE FROM relay_state WHERE ip = ? AND relay_index = ?", keys)
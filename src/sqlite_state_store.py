@@ -5,19 +5,28 @@ import json
 import os
 import logging
 import threading
+import metrics
+from sqlite_connection import SQLiteConnectionManager
 
 class SQLiteStateStore:
     """Store and retrieve sensor state from an SQLite database."""
-    def __init__(self, db_path="state.db", json_path="state.json"):
+    def __init__(self, db_path="state.db", json_path="state.json", connections=None):
         self.db_path = db_path
+        self.db = connections or SQLiteConnectionManager(db_path)
         self.lock = threading.Lock()
+        self._pending = {}
+        self._pending_cond = threading.Condition()
+        self._flusher = None
+        self._stopping = False
+        self.flush_interval = None
+        self.batch_size = None
         self._init_db()
         if json_path:
             self.migrate_from_json()
 
     def _init_db(self):
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.db.connection() as conn:
                 conn.execute('''
                     CREATE TABLE IF NOT EXISTS sensors (
                         dev_eui TEXT PRIMARY KEY,
@@ -35,8 +44,7 @@ class SQLiteStateStore:
             raise
 
     def load_all(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row  # pour accéder par noms de colonnes
+        with self.db.connection() as conn:
             cursor = conn.execute("SELECT * FROM sensors")
             return {
                 row["dev_eui"]: {
@@ -52,8 +60,32 @@ class SQLiteStateStore:
             }
 
     def save_sensor(self, dev_eui, state: dict):
-        with self.lock, sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
+        row = self._sensor_row(dev_eui, state)
+        if self._flusher is None:
+            with self.lock:
+                self._write_rows([row])
+            return
+        with self._pending_cond:
+            # Only the latest state of each sensor needs to reach the disk
+            self._pending[dev_eui] = row
+            if len(self._pending) >= self.batch_size:
+                self._pending_cond.notify()
+
+    def _sensor_row(self, dev_eui, state: dict):
+        return (
+            dev_eui,
+            state.get("dev_name"),
+            state.get("zone"),
+            state.get("last_seen"),
+            int(state.get("alarm", 0)),
+            int(state.get("tamper", 0)),
+            int(state.get("battery_low", 0)),
+            int(state.get("offline", 0)),
+        )
+
+    def _write_rows(self, rows):
+        with metrics.SQLITE_WRITE_SECONDS.time("sensors"), self.db.connection() as conn:
+            conn.executemany('''
                 INSERT INTO sensors (dev_eui, dev_name, zone, last_seen, alarm, tamper, battery_low, offline)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(dev_eui) DO UPDATE SET
@@ -64,16 +96,75 @@ class SQLiteStateStore:
                     tamper=excluded.tamper,
                     battery_low=excluded.battery_low,
                     offline=excluded.offline
-            ''', (
-                dev_eui,
-                state.get("dev_name"),
-                state.get("zone"),
-                state.get("last_seen"),
-                int(state.get("alarm", 0)),
-                int(state.get("tamper", 0)),
-                int(state.get("battery_low", 0)),
-                int(state.get("offline", 0)),
-            ))
+            ''', rows)
+        metrics.SQLITE_ROWS_WRITTEN.inc("sensors", amount=len(rows))
+
+    def delete_sensor(self, dev_eui):
+        with self._pending_cond:
+            self._pending.pop(dev_eui, None)
+        with self.lock, self.db.connection() as conn:
+            conn.execute("DELETE FROM sensors WHERE dev_eui = ?", (dev_eui,))
+
+    def start_write_behind(self, flush_interval=5.0, batch_size=500):
+        """Queue sensor writes and flush them in batches from a background thread.
+
+        Pending rows are written when ``batch_size`` sensors are dirty or
+        every ``flush_interval`` seconds, whichever comes first.
+        """
+        if self._flusher is not None:
+            return
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, int(batch_size))
+        self._stopping = False
+
+        def flush_loop():
+            while True:
+                with self._pending_cond:
+                    self._pending_cond.wait_for(
+                        lambda: self._stopping or len(self._pending) >= self.batch_size,
+                        timeout=self.flush_interval,
+                    )
+                    stopping = self._stopping
+                self.flush()
+                if stopping:
+                    return
+
+        self._flusher = threading.Thread(target=flush_loop, daemon=True)
+        self._flusher.start()
+
+    def flush(self):
+        """Write all queued sensor states in a single transaction."""
+        # self.lock keeps batches ordered when flush() races the flusher thread
+        with self.lock:
+            with self._pending_cond:
+                if not self._pending:
+                    return
+                rows = list(self._pending.values())
+                self._pending = {}
+            try:
+                self._write_rows(rows)
+            except sqlite3.Error as e:
+                logging.error(f"SQLite error while flushing {len(rows)} sensors: {e}")
+                with self._pending_cond:
+                    # Keep the rows for the next attempt unless newer ones arrived
+                    for row in rows:
+                        self._pending.setdefault(row[0], row)
+
+    def close(self):
+        """Stop the write-behind thread and flush what is still queued."""
+        flusher = self._flusher
+        if flusher is not None:
+            with self._pending_cond:
+                self._stopping = True
+                self._pending_cond.notify()
+            flusher.join()
+            self._flusher = None
+        self.flush()
+
+    @property
+    def queue_depth(self):
+        """Number of sensors waiting to be written."""
+        return len(self._pending)
 
     def migrate_from_json(self, json_path="state.json"):
         if not os.path.exists(json_path):
@@ -84,7 +175,7 @@ class SQLiteStateStore:
         try:
             with open(json_path, "r") as f:
                 data = json.load(f)
-            with sqlite3.connect(self.db_path) as conn:
+            with self.db.connection() as conn:
                 for dev_eui, entry in data.items():
                     conn.execute("""
                         INSERT OR REPLACE INTO sensors (dev_eui, dev_name, zone, alarm, tamper, battery_low, offline, last_seen)
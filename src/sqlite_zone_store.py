@@ -1,16 +1,18 @@
 """Database wrapper for storing zone configurations in SQLite."""
 
 import sqlite3
-import yaml
 import os
 import logging
 import threading
+import metrics
+from sqlite_connection import SQLiteConnectionManager
 
 class SQLiteZoneStore:
     """Load and persist zone configurations."""
 
-    def __init__(self, db_path="state.db", yaml_path="config/zones.yaml"):
+    def __init__(self, db_path="state.db", yaml_path="config/zones.yaml", connections=None):
         self.db_path = db_path
+        self.db = connections or SQLiteConnectionManager(db_path)
         self.yaml_path = yaml_path
         self.lock = threading.Lock()
         self._init_db()
@@ -19,7 +21,7 @@ class SQLiteZoneStore:
 
     def _init_db(self):
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.db.connection() as conn:
                 conn.execute(
                     """
                     CREATE TABLE IF NOT EXISTS zones (
@@ -37,8 +39,7 @@ class SQLiteZoneStore:
             raise
 
     def load_all(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.db.connection() as conn:
             cursor = conn.execute("SELECT * FROM zones")
             return {
                 row["zone"]: {
@@ -55,10 +56,11 @@ class SQLiteZoneStore:
         if not os.path.exists(self.yaml_path):
             return
         logging.info("Migrating zones.yaml to SQLite...")
+        import yaml  # only needed for this one-time migration
         try:
             with open(self.yaml_path, "r") as f:
                 data = yaml.safe_load(f) or {}
-            with sqlite3.connect(self.db_path) as conn:
+            with self.db.connection() as conn:
                 for zone, config in data.items():
                     if zone.startswith("__"):
                         continue
@@ -84,7 +86,7 @@ class SQLiteZoneStore:
 
     def save_zone(self, zone, config: dict):
         """Insert or update a zone configuration."""
-        with self.lock, sqlite3.connect(self.db_path) as conn:
+        with self.lock, metrics.SQLITE_WRITE_SECONDS.time("zones"), self.db.connection() as conn:
             conn.execute(
                 """
                 INSERT INTO zones (zone, ip, alarm, tamper, battery_low, conn_issue)
@@ -108,5 +110,5 @@ class SQLiteZoneStore:
 
     def delete_zone(self, zone):
         """Remove a zone from the table."""
-        with self.lock, sqlite3.connect(self.db_path) as conn:
+        with self.lock, self.db.connection() as conn:
             conn.execute("DELETE FROM zones WHERE zone = ?", (zone,))
\ No newline at end of file
@@ -1,145 +1,427 @@
-"""Central state management logic for sensors and zones."""
+"""Central state management logic for sensors and zones.
 
+Readers never lock: the sensor and zone states are immutable mappings that
+writers replace with an updated copy (one shard of the sensors, the small
+zone dict) and publish with a single assignment. Writers of a sensor hold
+the lock of its zone; StateManager.lock only guards the short shared
+bookkeeping (versions, offline deadlines, relay states) and is always taken
+after the zone locks.
+"""
+
+import contextlib
+import heapq
 import logging
+import metrics
 import time
 import os
+import sys
 import threading
-from datetime import datetime, timedelta, UTC
+from sensor_record import SensorRecord, FLAGS, FLAG_BITS, ALARM, OFFLINE
+from sensor_shards import SensorShards
 from sqlite_state_store import SQLiteStateStore
 from sqlite_zone_store import SQLiteZoneStore
-from relay_controller import send_tcp_command
+from sqlite_relay_store import SQLiteRelayStore
+from sqlite_connection import SQLiteConnectionManager
+from relay_controller import send_tcp_commands, query_relay_status, close_sessions
+from relay_dispatcher import RelayDispatcher
+from scheduler import Scheduler
+from event_hub import EventHub
+from snapshot_cache import SnapshotCache
 
 STATE_FILE = "state.json"
 DB_FILE = "state.db"
-SAVE_INTERVAL_SECONDS = 3600  # toutes les heures
+SAVE_INTERVAL_SECONDS = 5  # write-behind flush period
+SAVE_BATCH_SIZE = 500
 OFFLINE_THRESHOLD_HOURS = 24
+ALARM_RESET_SECONDS = 5.0
+ALARM_RESET_KEY = "alarm_reset"
+OFFLINE_CHECK_KEY = "offline_check"
+ZONE_FLAGS = FLAGS  # bit i of SensorRecord.flags
+MAX_TOMBSTONES = 10000
+
+
+def _zone_order(zone):
+    return zone is not None, zone or ""
+
+
+class _ZoneLocks:
+    """One lock per zone (None included), created on first use."""
+
+    def __init__(self):
+        self._locks = {}
+
+    def _lock(self, zone):
+        lock = self._locks.get(zone)
+        if lock is None:
+            lock = self._locks.setdefault(zone, threading.Lock())
+        return lock
+
+    def acquire(self, *zones):
+        """Take the locks of ``zones`` in sorted order, so writers cannot deadlock.
+
+        Returns the locks to hand to release().
+        """
+        if len(zones) == 1 or len(zones) == 2 and zones[0] == zones[1]:
+            locks = (self._lock(zones[0]),)
+        else:
+            locks = tuple(self._lock(zone) for zone in sorted(set(zones), key=_zone_order))
+        for lock in locks:
+            lock.acquire()
+        return locks
+
+    @staticmethod
+    def release(locks):
+        for lock in reversed(locks):
+            lock.release()
+
+    @contextlib.contextmanager
+    def hold(self, *zones):
+        locks = self.acquire(*zones)
+        try:
+            yield
+        finally:
+            self.release(locks)
 
 
 class StateManager:
     """Handle sensor state and relay logic using SQLite stores."""
     
-    def __init__(self, db_path=DB_FILE, json_path=STATE_FILE):
-        self.store = SQLiteStateStore(db_path=db_path, json_path=json_path)
-        self.zone_store = SQLiteZoneStore(db_path=db_path)
-        self.state = self.store.load_all()
+    def __init__(self, db_path=DB_FILE, json_path=STATE_FILE, relay_dispatcher=None, scheduler=None):
+        started = time.perf_counter()
+        self.db = SQLiteConnectionManager(db_path)
+        self.store = SQLiteStateStore(db_path=db_path, json_path=json_path, connections=self.db)
+        self.zone_store = SQLiteZoneStore(db_path=db_path, connections=self.db)
+        self.relay_store = SQLiteRelayStore(db_path=db_path, connections=self.db)
+        opened = time.perf_counter()
+        state = {dev_eui: self._load_record(dev_eui, row) for dev_eui, row in self.store.load_all().items()}
         self.zone_config = self.zone_store.load_all()
-        self._reset_timers = {}
-        self.zones = {}
-        self.relay_state = {}
-        self.lock = threading.Lock()
+        loaded = time.perf_counter()
+        self._build_relay_groups()
+        self.scheduler = scheduler or Scheduler()
+        self._zone_counts = {}  # zone -> number of sensors raising each ZONE_FLAGS
+        self._indexed = {}  # dev_eui -> (zone, flags) currently counted
+        for dev_eui, entry in state.items():
+            self._index_sensor(dev_eui, entry)
+        self._zone_locks = _ZoneLocks()
+        self.zones = {}  # zone -> status; replaced, never modified in place
+        self.events = EventHub()
+        # Change versions: every sensor or zone change takes the next number.
+        # Starting from the clock keeps versions increasing across restarts,
+        # and the per-key dicts stay in version order (changed keys move last)
+        self.version = int(time.time() * 1000)
+        self.state_version = self.version
+        self.zones_version = self.version
+        # Published (version, states) pairs read by the lock-free getters
+        self._state_snapshot = (self.version, SensorShards.from_dict(state))
+        self._zones_snapshot = (self.version, self.zones)
+        self._sensor_versions = {}
+        self._zone_versions = {}
+        self._tombstones = {}  # removed dev_eui -> version
+        self._tombstone_floor = self.version  # older clients need a full resync
+        self.snapshot = SnapshotCache()
+        self.snapshot.load(state, self.version)
+        # Last desired state of each (ip, relay_index), persisted across restarts;
+        # reconcile_relays() brings the controllers in line with it
+        self.relay_state = self.relay_store.load_all()
+        self.relay_store.delete_relays(self._stale_relays())
+        self.relay_dispatcher = relay_dispatcher or RelayDispatcher(send_tcp_commands, query_relay_status)
+        self.lock = metrics.TimedLock(metrics.STATE_LOCK_WAIT_SECONDS, metrics.STATE_LOCK_HOLD_SECONDS)
+        self._offline_deadlines = {}  # dev_eui -> epoch after which the sensor is offline
+        self._offline_heap = []  # (deadline, dev_eui), at most one live entry per sensor
+        self._offline_check_at = None  # deadline the scheduler is armed for
+        self._offline_checking = False
+        with self.lock:
+            for dev_eui, entry in state.items():
+                self._load_deadline(dev_eui, entry)
         self._start_offline_checker()
+        logging.debug(
+            f"StateManager ready with {len(state)} sensors and {len(self.zone_config)} zones: "
+            f"open and migrate {(opened - started) * 1000:.1f} ms, load {(loaded - opened) * 1000:.1f} ms, "
+            f"index {(time.perf_counter() - loaded) * 1000:.1f} ms"
+        )
+
+    @property
+    def state(self):
+        """Current sensor states, dev_eui -> SensorRecord; an immutable mapping."""
+        return self._state_snapshot[1]
 
     
     def _start_offline_checker(self):
-        def check_loop():
-            while True:
-                time.sleep(60)  # vérifie toutes les minutes
-                self.run_offline_check()
+        with self.lock:
+            self._offline_checking = True
+            self._schedule_offline_check()
 
-        threading.Thread(target=check_loop, daemon=True).start()
+    def _schedule_offline_check(self):
+        """Arm the scheduler for the earliest offline deadline."""
+        if not self._offline_checking or not self._offline_heap:
+            return
+        deadline = self._offline_heap[0][0]
+        if self._offline_check_at is not None and self._offline_check_at <= deadline:
+            return
+        self._offline_check_at = deadline
+        self.scheduler.schedule(OFFLINE_CHECK_KEY, max(0.0, deadline - time.time()), self.run_offline_check)
 
-    def run_offline_check(self):
-        """Check sensor last_seen timestamps and update offline status."""
-        with self.lock:
-            now = datetime.now(UTC)
-            updated = False
-            for dev_eui, entry in self.state.items():
-                last_seen = entry.get("last_seen")
-                if not last_seen:
+    def _load_record(self, dev_eui, row):
+        try:
+            return SensorRecord.from_dict(row)
+        except ValueError as e:
+            logging.warning(f"Could not parse last_seen for {dev_eui}: {e}")
+            return SensorRecord.from_dict(dict(row, last_seen=None))
+
+    def _load_deadline(self, dev_eui, entry):
+        if entry.seen:
+            self._set_deadline(dev_eui, entry.seen)
+
+    def _set_deadline(self, dev_eui, seen_epoch):
+        """Record when the sensor goes offline if it is not seen again."""
+        deadline = seen_epoch + OFFLINE_THRESHOLD_HOURS * 3600
+        previous = self._offline_deadlines.get(dev_eui)
+        self._offline_deadlines[dev_eui] = deadline
+        # Later deadlines reuse the queued entry, which is re-queued when it pops
+        if previous is None or deadline < previous:
+            heapq.heappush(self._offline_heap, (deadline, dev_eui))
+            if self._offline_heap[0][1] == dev_eui:
+                self._schedule_offline_check()
+
+    def _pop_expired(self, now):
+        """Remove and return the sensors whose offline deadline passed."""
+        heap = self._offline_heap
+        expired = []
+        while heap and heap[0][0] <= now:
+            _, dev_eui = heapq.heappop(heap)
+            deadline = self._offline_deadlines.get(dev_eui)
+            if deadline is None:
+                continue  # already expired through another entry
+            if deadline > now:
+                heapq.heappush(heap, (deadline, dev_eui))
+                continue
+            del self._offline_deadlines[dev_eui]
+            expired.append(dev_eui)
+        return expired
+
+    def _expire_offline(self, zone, expired):
+        """Mark the sensors of ``zone`` in ``expired`` as offline."""
+        with self._zone_locks.hold(zone):
+            changed = False
+            for dev_eui in expired:
+                entry = self.state.get(dev_eui)
+                # Seen again (new deadline) or moved since the deadline popped
+                if entry is None or entry.zone != zone or entry.flags & OFFLINE:
                     continue
-                try:
-                    seen_time = datetime.fromisoformat(
-                                last_seen.replace("Z", "+00:00")
-                            )
-                except Exception as e:
-                    logging.warning(f"Could not parse last_seen for {dev_eui}: {e}")
+                if dev_eui in self._offline_deadlines:
                     continue
-                offline = (now - seen_time) > timedelta(hours=OFFLINE_THRESHOLD_HOURS)
-                if entry.get("offline") != offline:
-                    entry["offline"] = offline
-                    updated = True
-            if updated:
-                self._recompute_zones()
-                self._update_shared_relays()
+                record = SensorRecord(entry.dev_name, zone, entry.seen, entry.flags | OFFLINE)
+                with self.lock:
+                    self._sensor_changed(dev_eui, record)
+                self._index_sensor(dev_eui, record)
+                changed = True
+            if changed and zone:
+                self._update_zone_status(zone)
 
-    def update_sensor(self, dev_eui, dev_name, new_data: dict, touch_last_seen=True):
+    def run_offline_check(self):
+        """Mark sensors not seen for OFFLINE_THRESHOLD_HOURS as offline."""
         with self.lock:
-            current = self.state.get(dev_eui, {})
+            self._offline_check_at = None
+            expired = self._pop_expired(time.time())
+            self._schedule_offline_check()
+        by_zone = {}
+        for dev_eui in expired:
+            entry = self.state.get(dev_eui)
+            if entry is not None:
+                by_zone.setdefault(entry.zone, []).append(dev_eui)
+        for zone, dev_euis in by_zone.items():
+            self._expire_offline(zone, dev_euis)
+        self._save_relay_states()
+
+    def _lock_sensor(self, dev_eui, *zones):
+        """Take the locks of the sensor's current zone and of ``zones``.
+
+        Returns (current record, locks to pass to self._zone_locks.release()).
+        """
+        while True:
+            current = self._state_snapshot[1].get(dev_eui)
+            old_zone = current.zone if current is not None else None
+            locks = self._zone_locks.acquire(old_zone, *zones)
+            latest = self._state_snapshot[1].get(dev_eui)
+            if latest is current or (latest.zone if latest is not None else None) == old_zone:
+                return latest, locks
+            # Another writer moved the sensor before we got the lock
+            self._zone_locks.release(locks)
+
+    def update_sensor(self, dev_eui, dev_name, new_data: dict, touch_last_seen=True):
+        """Merge decoded uplink fields into the sensor's record.
+
+        Flags missing from ``new_data`` or None keep their current value;
+        other decoded fields are not stored.
+        """
+        # Interned: every sensor of a zone shares the string
+        zone = sys.intern(dev_name.rsplit("_", 1)[-1]) if dev_name and "_" in dev_name else None
+        current, locks = self._lock_sensor(dev_eui, zone)
+        try:
+            flags = current.flags if current is not None else 0
+            for key in ("alarm", "tamper", "battery_low"):
+                value = new_data.get(key)
+                if value is not None:
+                    bit = FLAG_BITS[key]
+                    flags = flags | bit if value else flags & ~bit
 
             if touch_last_seen:
-                new_data["last_seen"] = (
-                    datetime.now(UTC).isoformat().replace("+00:00", "Z")
-                )
-                new_data["offline"] = False  # capteur vu = actif
-            
-            new_data["zone"] = dev_name.rsplit("_", 1)[-1] if dev_name and "_" in dev_name else None
-            new_data["dev_name"] = dev_name
-
-            # Merge intelligemment : on garde les anciens états si non précisés
-            for key in ["alarm", "tamper", "battery_low"]:
-                if key not in new_data or new_data[key] is None:
-                    new_data[key] = current.get(key, False) # False si la valeur n'a jamais existe
-
-            old_zone = current.get("zone")
-            self.state[dev_eui] = new_data
-            self.store.save_sensor(dev_eui, new_data)
-            logging.debug(f"Updated state for {dev_eui}: {new_data}")
-            if old_zone and old_zone != new_data.get("zone"):
-                self._update_zone_status(old_zone)
-            if new_data.get("zone"):
-                self._update_zone_status(new_data["zone"])
-            if new_data.get("alarm") and new_data.get("alarm_expire"):
-                self._schedule_alarm_reset(dev_eui, dev_name)
+                now = time.time()
+                seen = int(now)
+                flags &= ~OFFLINE  # capteur vu = actif
+            else:
+                seen = current.seen if current is not None else 0
+            record = SensorRecord(dev_name, zone, seen, flags)
+            old_zone = current.zone if current is not None else None
+            zones = (old_zone, zone) if old_zone and old_zone != zone else (zone,) if zone else ()
+
+            self._index_sensor(dev_eui, record)
+            with self.lock:
+                if touch_last_seen:
+                    self._set_deadline(dev_eui, now)
+                self._sensor_changed(dev_eui, record)
+                results = [self._refresh_zone(z) for z in zones]
+            self.store.save_sensor(dev_eui, record)
+            logging.debug("Updated state for %s: %s", dev_eui, record)
+            for result in results:
+                self._log_zone_status(*result)
+        finally:
+            self._zone_locks.release(locks)
+        self._save_relay_states()
+        if flags & ALARM and new_data.get("alarm_expire"):
+            self._schedule_alarm_reset(dev_eui, dev_name)
 
     def _schedule_alarm_reset(self, dev_eui, dev_name):
         def reset():
             entry = self.state.get(dev_eui)
-            if entry and entry.get("alarm"):
-                logging.debug(f"Alarm reset for {dev_eui}")
-                entry["alarm"] = False
-                self.update_sensor(dev_eui, dev_name, entry, touch_last_seen=False)
-            self._reset_timers.pop(dev_eui, None)
+            if entry is not None and entry.flags & ALARM:
+                logging.debug("Alarm reset for %s", dev_eui)
+                self.update_sensor(dev_eui, dev_name, {"alarm": False}, touch_last_seen=False)
+
+        # Re-triggering the sensor pushes the pending reset back
+        self.scheduler.schedule((ALARM_RESET_KEY, dev_eui), ALARM_RESET_SECONDS, reset)
+
+    def pending_alarm_resets(self):
+        """Number of alarms waiting for their automatic reset."""
+        return self.scheduler.pending_count(ALARM_RESET_KEY)
+
+
+
+    def _index_sensor(self, dev_eui, entry):
+        """Move the sensor's contribution in the zone counters to its current values.
+
+        A None entry removes the sensor from the index. The caller holds the
+        locks of the sensor's old and new zones.
+        """
+        if entry is None:
+            zone, flags = None, 0
+        else:
+            zone = entry.zone or None
+            flags = entry.flags
+        indexed = self._indexed.get(dev_eui)
+        if indexed == (zone, flags):
+            return
+        if indexed:
+            old_zone, old_flags = indexed
+            if old_zone:
+                counts = self._zone_counts[old_zone]
+                for i in range(len(ZONE_FLAGS)):
+                    counts[i] -= (old_flags >> i) & 1
+        if zone:
+            counts = self._zone_counts.setdefault(zone, [0] * len(ZONE_FLAGS))
+            for i in range(len(ZONE_FLAGS)):
+                counts[i] += (flags >> i) & 1
+        if entry is None:
+            self._indexed.pop(dev_eui, None)
+        else:
+            self._indexed[dev_eui] = (zone, flags)
 
-        if dev_eui in self._reset_timers:
-            self._reset_timers[dev_eui].cancel()
+    def _next_version(self):
+        self.version += 1
+        return self.version
 
-        timer = threading.Timer(5.0, reset)
-        timer.daemon = True
-        self._reset_timers[dev_eui] = timer
-        timer.start()
+    def _sensor_changed(self, dev_eui, entry):
+        """Publish the sensor's new record, version the change and notify readers."""
+        version = self._next_version()
+        self._state_snapshot = (version, self.state.replace(dev_eui, entry))
+        self.state_version = version
+        self._sensor_versions.pop(dev_eui, None)
+        self._sensor_versions[dev_eui] = version
+        self._tombstones.pop(dev_eui, None)
+        self.snapshot.mark(dev_eui, entry, version)
+        if self.events.has_subscribers():
+            self.events.publish("sensor", {"dev_eui": dev_eui, "state": entry.as_dict()})
 
+    def _sensor_removed(self, dev_eui):
+        version = self._next_version()
+        self._state_snapshot = (version, self.state.replace(dev_eui, None))
+        self.state_version = version
+        self._sensor_versions.pop(dev_eui, None)
+        self._tombstones[dev_eui] = version
+        self.snapshot.mark(dev_eui, None, version)
+        if len(self._tombstones) > MAX_TOMBSTONES:
+            oldest = next(iter(self._tombstones))
+            self._tombstone_floor = self._tombstones.pop(oldest)
+        if self.events.has_subscribers():
+            self.events.publish("sensor_removed", {"dev_eui": dev_eui})
 
+    def _zone_changed(self, zone, status):
+        """Publish the zone's new status, version the change and notify readers."""
+        version = self._next_version()
+        self.zones = dict(self.zones)
+        self.zones[zone] = status
+        self._zones_snapshot = (version, self.zones)
+        self.zones_version = version
+        self._zone_versions.pop(zone, None)
+        self._zone_versions[zone] = version
+        if self.events.has_subscribers():
+            self.events.publish("zone", {"zone": zone, "state": dict(status)})
 
     def _update_zone_status(self, zone):
-        sensors = [c for c in self.state.values() if c.get("zone") == zone]
-        prev = self.zones.get(zone, {})
-        alarm = any(c.get("alarm") for c in sensors)
-        tamper = any(c.get("tamper") for c in sensors)
-        battery_low = any(c.get("battery_low") for c in sensors)
-        offline = any(c.get("offline") for c in sensors)
-        self.zones[zone] = {
+        """Recompute the zone's status and drive its relays; the caller holds the zone's lock."""
+        with self.lock:
+            result = self._refresh_zone(zone)
+        self._log_zone_status(*result)
+
+    def _refresh_zone(self, zone):
+        """_update_zone_status() under self.lock; returns the arguments of _log_zone_status()."""
+        alarm, tamper, battery_low, offline = (
+            count > 0 for count in self._zone_counts.get(zone, [0] * len(ZONE_FLAGS))
+        )
+        status = {
             "alarm": alarm,
             "tamper": tamper,
             "battery_low": battery_low,
             "offline": offline
         }
-        logging.info(f"Updates zones: {self.zones}")
+        prev = self.zones.get(zone, {})
+        changed = status != prev
+        if changed:
+            self._zone_changed(zone, status)
         config = self.zone_config.get(zone)
-        if not config:
-            logging.warning("no config file for zones found")
-            return
+        if config:
+            # Commande pour le champ non partagé 'alarm'
+            if "alarm" in config and prev.get("alarm") != alarm:
+                self._apply_relay_state(config["ip"], config["alarm"], alarm)
 
-        # Commande pour le champ non partagé 'alarm'
-        if "alarm" in config and prev.get("alarm") != alarm:
-            self._apply_relay_state(config["ip"], config["alarm"], alarm)
+            # MàJ des relais partagés dont le champ a changé pour cette zone
+            fields = {field for field, value in status.items() if prev.get(field) != value}
+            if fields:
+                self._update_shared_relays(zone, fields)
+        return zone, status if changed else None, bool(config)
 
-        # MàJ des relais partagés
-        self._update_shared_relays()
+    @staticmethod
+    def _log_zone_status(zone, changed_status, configured):
+        # Outside self.lock
+        if changed_status is not None:
+            logging.info("Zone %s status: %s", zone, changed_status)
+        if not configured:
+            logging.warning("No relay configuration for zone %s", zone)
 
 
 
-    def _update_shared_relays(self):
-        """Gère les relais partagés (hors 'alarm') : tamper, battery_low, offline."""
+    def _build_relay_groups(self):
+        """Index shared relays by (ip, relay_index) and by zone after a config change."""
         relay_groups = {}
 
         for zone, config in self.zone_config.items():
@@ -154,34 +436,253 @@ class StateManager:
                     relay_groups[key] = {"field": field, "zones": []}
                 relay_groups[key]["zones"].append(zone)
 
-        for (ip, relay_index), group in relay_groups.items():
+        zone_groups = {}
+        for key, group in relay_groups.items():
+            for zone in group["zones"]:
+                zone_groups.setdefault(zone, []).append(key)
+
+        self._relay_groups = relay_groups
+        self._zone_groups = zone_groups
+
+    def _update_shared_relays(self, zone=None, changed=None):
+        """Gère les relais partagés (hors 'alarm') : tamper, battery_low, offline.
+
+        Without arguments every group is evaluated; otherwise only the groups
+        of ``zone`` whose field is in ``changed``.
+        """
+        if zone is None:
+            keys = self._relay_groups
+        else:
+            keys = [
+                key for key in self._zone_groups.get(zone, ())
+                if self._relay_groups[key]["field"] in changed
+            ]
+
+        for key in keys:
+            ip, relay_index = key
+            group = self._relay_groups[key]
             field = group["field"]
-            zones = group["zones"]
 
             # Le relais doit être ON si au moins une zone a le champ concerné à True
-            active = any(self.zones.get(z, {}).get(field, False) for z in zones)
+            active = any(self.zones.get(z, {}).get(field, False) for z in group["zones"])
             self._apply_relay_state(ip, relay_index, active)
-    
+
     def _apply_relay_state(self, ip, index, new_state):
         key = (ip, index)
         old_state = self.relay_state.get(key)
         if old_state != new_state:
             self.relay_state[key] = new_state
-            send_tcp_command(ip, index, new_state)
+            self.relay_dispatcher.submit(ip, index, new_state)
+            # Written by _save_relay_states() once the locks are released
+            self.relay_store.queue_relay(ip, index, new_state)
+
+    def _save_relay_states(self):
+        """Persist the relay states queued by _apply_relay_state(); called without locks."""
+        self.relay_store.flush()
+
+    def _stale_relays(self):
+        """Drop the desired states of relays no zone is configured with any more."""
+        configured = set(self._relay_groups)
+        for config in self.zone_config.values():
+            if config.get("alarm") is not None:
+                configured.add((config.get("ip"), config["alarm"]))
+        stale = [key for key in self.relay_state if key not in configured]
+        for key in stale:
+            del self.relay_state[key]
+        return stale
+
+    def reconcile_relays(self):
+        """Drive the relays whose physical state differs from the desired one.
+
+        Meant for startup and non-blocking: each controller's dispatcher worker
+        reads its relays with one pipelined query and commands those that
+        differ or whose state it cannot read. The relays of an unreachable
+        controller are forgotten, so the next evaluation drives them. Returns
+        the number of controllers queued for reconciliation.
+        """
+        with self.lock:
+            by_ip = {}
+            for (ip, index), state in self.relay_state.items():
+                by_ip.setdefault(ip, {})[index] = state
+            # Under the lock: later submits are queued after the check and win
+            for ip, desired in by_ip.items():
+                self.relay_dispatcher.reconcile(ip, desired, self._forget_relays)
+        logging.info(
+            f"Reconciling {sum(len(desired) for desired in by_ip.values())} relays "
+            f"on {len(by_ip)} controllers"
+        )
+        return len(by_ip)
+
+    def _forget_relays(self, ip, states):
+        """Forget the desired ``states`` that could not be sent, unless superseded."""
+        with self.lock:
+            for index, state in states.items():
+                if self.relay_state.get((ip, index)) == state:
+                    del self.relay_state[(ip, index)]
+        logging.warning(f"Relays {sorted(states)} @ {ip} not reconciled, driven at their next evaluation")
+
+    def _reload_zone_config(self):
+        """Rebuild relay groups from the stored zones and drive every relay."""
+        with self.lock:
+            self.zone_config = self.zone_store.load_all()
+            self._build_relay_groups()
+            zones = list(self.zone_config)
+        for zone in zones:
+            with self._zone_locks.hold(zone):
+                self._update_zone_status(zone)
+        with self.lock:
+            for zone, config in self.zone_config.items():
+                if config.get("alarm") is not None:
+                    alarm = self.zones.get(zone, {}).get("alarm", False)
+                    self._apply_relay_state(config["ip"], config["alarm"], alarm)
+            self._update_shared_relays()
+            # Relays of removed zones must not be driven again at startup
+            stale = self._stale_relays()
+        self.relay_store.delete_relays(stale)
+        self._save_relay_states()
+
+    def save_zone_config(self, zone, config: dict):
+        """Persist a zone configuration and apply it to the relays."""
+        self.zone_store.save_zone(zone, config)
+        self._reload_zone_config()
+
+    def delete_zone_config(self, zone):
+        """Remove a zone configuration and re-evaluate the remaining relays."""
+        self.zone_store.delete_zone(zone)
+        self._reload_zone_config()
+
+
+
+    def set_runtime(self, relay_dispatcher=None, scheduler=None):
+        """Swap the relay dispatcher and timer scheduler, e.g. for the asyncio runtime.
+
+        Meant to be called before ingestion starts: pending alarm resets of the
+        previous scheduler are dropped, the offline check is re-armed.
+        """
+        with self.lock:
+            old_dispatcher, old_scheduler = None, None
+            if relay_dispatcher is not None:
+                old_dispatcher, self.relay_dispatcher = self.relay_dispatcher, relay_dispatcher
+            if scheduler is not None:
+                old_scheduler, self.scheduler = self.scheduler, scheduler
+                self._offline_check_at = None
+                self._schedule_offline_check()
+        # Stopped outside the lock: their threads may be waiting for it
+        if old_scheduler is not None:
+            old_scheduler.stop()
+        if old_dispatcher is not None:
+            old_dispatcher.stop()
+
+    def enable_write_behind(self, flush_interval=SAVE_INTERVAL_SECONDS, batch_size=SAVE_BATCH_SIZE):
+        """Batch sensor writes instead of committing one row per uplink.
 
-    def _recompute_zones(self):
-        for zone in self.zone_config:
-            self._update_zone_status(zone)
+        Off by default: rows queued since the last flush, up to
+        ``flush_interval`` seconds of updates, are lost if the process crashes.
+        """
+        self.store.start_write_behind(flush_interval, batch_size)
 
+    def configure_database(self, synchronous=None, cache_size=None, mmap_size=None):
+        """Tune the SQLite pragmas used by both stores."""
+        self.db.configure(synchronous=synchronous, cache_size=cache_size, mmap_size=mmap_size)
 
+    def close(self):
+        """Send queued relay commands, flush pending writes and close the database."""
+        self.scheduler.stop()
+        self.relay_dispatcher.stop()
+        close_sessions()
+        self._save_relay_states()
+        self.store.close()
+        self.db.close_all()
 
     def get_state(self):
+        return {dev_eui: entry.as_dict() for dev_eui, entry in self.state.items()}
+
+    def get_state_versioned(self):
+        """Return (state_version, copy of the sensor states)."""
+        version, state = self._state_snapshot
+        return version, {dev_eui: entry.as_dict() for dev_eui, entry in state.items()}
+
+    def get_state_json(self):
+        """Return (state_version, JSON body of the sensor states)."""
+        return self.snapshot.body()
+
+    def get_state_since(self, since):
+        """Sensors changed after version ``since`` and sensors removed since then.
+
+        When ``since`` predates this process or the oldest kept tombstone, the
+        full state is returned with ``full`` set and the client must replace
+        its copy. Only the walk over the change log takes the state lock.
+        """
         with self.lock:
-            return dict(self.state)
+            version, state = self._state_snapshot
+            if since < self._tombstone_floor or since > version:
+                changed = None
+            else:
+                changed = []
+                for dev_eui in reversed(self._sensor_versions):
+                    if self._sensor_versions[dev_eui] <= since:
+                        break
+                    changed.append(dev_eui)
+                removed = []
+                for dev_eui in reversed(self._tombstones):
+                    if self._tombstones[dev_eui] <= since:
+                        break
+                    removed.append(dev_eui)
+        if changed is None:
+            return {
+                "version": version,
+                "full": True,
+                "state": {dev_eui: entry.as_dict() for dev_eui, entry in state.items()},
+                "removed": [],
+            }
+        return {
+            "version": version,
+            "full": False,
+            "state": {dev_eui: state[dev_eui].as_dict() for dev_eui in changed},
+            "removed": removed,
+        }
+
+    def remove_sensor(self, dev_eui):
+        """Forget a sensor; return False if it was unknown."""
+        entry, locks = self._lock_sensor(dev_eui)
+        try:
+            if entry is None:
+                return False
+            with self.lock:
+                self._offline_deadlines.pop(dev_eui, None)
+                self._sensor_removed(dev_eui)
+            self._index_sensor(dev_eui, None)
+            self.store.delete_sensor(dev_eui)
+            if entry.zone:
+                self._update_zone_status(entry.zone)
+        finally:
+            self._zone_locks.release(locks)
+        self._save_relay_states()
+        return True
 
     def get_sensor(self, devEUI):
+        entry = self.state.get(devEUI)
+        return entry.as_dict() if entry is not None else None
+
+    def subscribe_events(self):
+        """Subscribe to sensor and zone changes.
+
+        Returns the subscription with consistent copies of the sensor and
+        zone states, taken before any event is queued to it.
+        """
         with self.lock:
-            return self.state.get(devEUI)
+            subscription = self.events.subscribe()
+            state = self.state
+            zones = self.zones
+        return (
+            subscription,
+            {dev_eui: entry.as_dict() for dev_eui, entry in state.items()},
+            {zone: dict(status) for zone, status in zones.items()},
+        )
 
     def get_zone_states(self):
-        return self.zones
\ No newline at end of file
+        return self.zones
+
+    def get_zone_states_versioned(self):
+        """Return (zones_version, zone states)."""
+        return self._zones_snapshot
@@ -1,3 +1,27 @@
-from state_manager import StateManager
+"""Process-wide StateManager, created on first use instead of at import."""
 
-state_manager = StateManager()
\ No newline at end of file
+import threading
+
+_state_manager = None
+_lock = threading.Lock()
+
+
+def get_state_manager(**kwargs):
+    """Return the shared StateManager, creating it on the first call.
+
+    ``kwargs`` (db_path, json_path, ...) are passed to the constructor and
+    only matter for that first call.
+    """
+    global _state_manager
+    with _lock:
+        if _state_manager is None:
+            from state_manager import StateManager
+            _state_manager = StateManager(**kwargs)
+        return _state_manager
+
+
+def __getattr__(name):
+    # Keeps ``from state_manager_instance import state_manager`` working, lazily
+    if name == "state_manager":
+        return get_state_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
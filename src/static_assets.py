@@ -0,0 +1,58 @@
+"""Static files held in memory with a gzip copy, for production serving."""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import Response
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+
+class StaticAssets:
+    """Load every file of ``folder`` once and serve it with caching headers.
+
+    Text files are gzipped at load time and sent compressed to clients that
+    accept it. Responses carry an ETag, so an unchanged file costs a 304.
+    """
+
+    def __init__(self, folder, max_age=86400):
+        self.max_age = max_age
+        self._files = {}  # relative path -> (body, gzip body or None, mimetype, etag)
+        for root, _, names in os.walk(folder):
+            for name in names:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, folder).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    body = f.read()
+                mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                compressed = None
+                if mimetype.startswith(COMPRESSIBLE_TYPES):
+                    compressed = gzip.compress(body, 9, mtime=0)
+                    if len(compressed) >= len(body):
+                        compressed = None
+                etag = hashlib.sha1(body).hexdigest()[:16]
+                self._files[rel] = (body, compressed, mimetype, etag)
+
+    def response(self, request, filename, max_age=None):
+        """Response for ``filename``, or None when there is no such file.
+
+        ``max_age`` overrides the configured lifetime; 0 makes clients
+        revalidate on every use.
+        """
+        asset = self._files.get(filename)
+        if asset is None:
+            return None
+        body, compressed, mimetype, etag = asset
+        max_age = self.max_age if max_age is None else max_age
+        if compressed is not None and "gzip" in request.accept_encodings:
+            response = Response(compressed, mimetype=mimetype)
+            response.headers["Content-Encoding"] = "gzip"
+            etag += "-gz"
+        else:
+            response = Response(body, mimetype=mimetype)
+        if compressed is not None:
+            response.headers["Vary"] = "Accept-Encoding"
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = f"public, max-age={max_age}" if max_age else "no-cache"
+        return response.make_conditional(request)
@@ -0,0 +1,56 @@
+"""Drop copies of an uplink delivered once per gateway that heard it."""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+def uplink_key(payload):
+    """(devEUI, fCnt) of a parsed uplink, or None when it has no fCnt.
+
+    Gateway metadata such as rxInfo differs between the copies of an uplink
+    and is not part of the key. Without a frame counter a copy cannot be told
+    from a device sending the same frame twice, so such uplinks are never
+    treated as duplicates.
+    """
+    f_cnt = payload.get("fCnt")
+    if f_cnt is None:
+        return None
+    return payload.get("devEUI"), f_cnt
+
+
+class DuplicateFilter:
+    """Remember uplink keys for ``ttl`` seconds, at most ``max_entries`` of them.
+
+    Keys are kept in arrival order, so expired keys are evicted from the front
+    and the oldest key makes room when the cache is full. A copy does not
+    extend the window of the first uplink.
+    """
+
+    def __init__(self, ttl=10.0, max_entries=10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max(1, int(max_entries))
+        self.clock = clock
+        self.duplicates = 0
+        self._seen = OrderedDict()  # key -> arrival time
+        self._lock = threading.Lock()
+
+    def is_duplicate(self, key):
+        """True if ``key`` arrived less than ttl seconds ago, else remember it."""
+        now = self.clock()
+        with self._lock:
+            seen = self._seen
+            arrived = seen.get(key)
+            if arrived is not None and now - arrived < self.ttl:
+                self.duplicates += 1
+                return True
+            while seen:
+                oldest = next(iter(seen.values()))
+                if now - oldest < self.ttl and len(seen) < self.max_entries:
+                    break
+                seen.popitem(last=False)
+            seen[key] = now
+            return False
+
+    def __len__(self):
+        return len(self._seen)
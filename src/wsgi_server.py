@@ -0,0 +1,158 @@
+"""Thread-pool WSGI server for the dashboard and API in production mode.
+
+Built on Werkzeug's server classes so it needs nothing beyond Flask's own
+dependencies: a fixed pool of worker threads, HTTP/1.1 keep-alive with an
+idle timeout (for requests without a body, the dashboard's polling GETs)
+and a timeout on every request.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+class _PooledRequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        self.timeout = self.server.request_timeout
+        self._idle = False
+        super().setup()
+
+    def parse_request(self):
+        # A request line arrived, the rest of the request gets the full timeout
+        self._idle = False
+        self.connection.settimeout(self.server.request_timeout)
+        return super().parse_request()
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.server.saturated():
+            # Other connections wait for a thread: do not idle on this one
+            self.close_connection = True
+            return
+        # Wait for the next request on the kept-alive connection
+        self._idle = True
+        self.connection.settimeout(self.server.keepalive_timeout)
+
+    def _reusable(self):
+        if self.close_connection:
+            return False  # HTTP/1.0 or Connection: close from the client
+        return self.headers.get("Content-Length", "0") == "0" and "Transfer-Encoding" not in self.headers
+
+    def run_wsgi(self):
+        # Werkzeug closes every connection because it cannot tell whether the
+        # request body was read. Requests without a body are run here instead
+        # and leave the connection open for the next one.
+        if not self._reusable():
+            return super().run_wsgi()
+        self.environ = environ = self.make_environ()
+        response = {"status": None, "headers": None, "sent": False, "chunked": False}
+        head = environ["REQUEST_METHOD"] == "HEAD"
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response["sent"]:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"], response["headers"] = status, headers
+            return write
+
+        def write(data):
+            if not response["sent"]:
+                response["sent"] = True
+                code, _, msg = response["status"].partition(" ")
+                code = int(code)
+                self.send_response(code, msg)
+                keys = set()
+                for key, value in response["headers"]:
+                    self.send_header(key, value)
+                    keys.add(key.lower())
+                if "content-length" not in keys and not head and code not in (204, 304):
+                    response["chunked"] = True
+                    self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+            if data and not head:
+                if response["chunked"]:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                else:
+                    self.wfile.write(data)
+
+        try:
+            application_iter = self.server.app(environ, start_response)
+            try:
+                for data in application_iter:
+                    write(data)
+                if not response["sent"]:
+                    write(b"")
+                if response["chunked"]:
+                    self.wfile.write(b"0\r\n\r\n")
+            finally:
+                if hasattr(application_iter, "close"):
+                    application_iter.close()
+        except Exception as e:
+            self.close_connection = True
+            if isinstance(e, (ConnectionError, TimeoutError)):
+                raise
+            self.log_error("Error on request %s: %r", self.path, e)
+            if not response["sent"]:
+                self.send_error(500)
+
+    def log_error(self, format, *args):
+        if self._idle:
+            return  # keep-alive connection closed after its idle timeout
+        super().log_error(format, *args)
+
+
+class ThreadPoolWSGIServer(BaseWSGIServer):
+    """Serve each connection on a bounded pool of worker threads.
+
+    A connection holds its worker while it is kept alive, so long-lived
+    responses (the /api/stream event stream) each occupy one thread; the
+    app caps them. An idle kept-alive connection is closed right after its
+    response when other connections wait for a worker.
+    """
+
+    multithread = True
+    daemon_threads = True
+
+    def __init__(self, host, port, app, threads=8, keepalive_timeout=2, request_timeout=30):
+        self.threads = threads
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        self._connections = 0  # accepted and not yet closed, queued ones included
+        self._connections_lock = threading.Lock()
+        super().__init__(host, port, app, handler=_PooledRequestHandler)
+
+    def saturated(self):
+        """True when some connection waits for a free worker."""
+        return self._connections > self.threads
+
+    def process_request(self, request, client_address):
+        with self._connections_lock:
+            self._connections += 1
+        self._pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._connections_lock:
+                self._connections -= 1
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
+
+def serve(app, host, port, threads=8, keepalive_timeout=2, request_timeout=30):
+    """Run ``app`` on a ThreadPoolWSGIServer until interrupted."""
+    server = ThreadPoolWSGIServer(host, port, app, threads, keepalive_timeout, request_timeout)
+    logging.info(f"Serving dashboard on {host}:{port} with {threads} threads")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,112 @@
+import gzip
+import http.client
+import threading
+import time
+import types
+
+import main
+from event_hub import EventHub
+from static_assets import StaticAssets
+from wsgi_server import ThreadPoolWSGIServer
+
+
+def make_client(monkeypatch):
+    manager = types.SimpleNamespace(
+        state_version=7,
+        zones_version=3,
+        get_state_json=lambda: (7, b'{"A":{"zone":"Z1"}}'),
+        get_state_since=lambda since: {"version": 7, "full": False, "state": {}, "removed": ["B"]},
+        get_zone_states_versioned=lambda: (3, {"Z1": {"alarm": False}}),
+    )
+    monkeypatch.setattr(main, "state_manager", manager)
+    return main.create_app().test_client()
+
+
+def test_state_etag_and_304(monkeypatch):
+    client = make_client(monkeypatch)
+
+    res = client.get("/api/state")
+    assert res.status_code == 200
+    assert res.get_json() == {"A": {"zone": "Z1"}}
+    etag = res.headers["ETag"]
+
+    res = client.get("/api/state", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.data == b""
+
+    res = client.get("/api/zones", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    res = client.get("/api/zones", headers={"If-None-Match": res.headers["ETag"]})
+    assert res.status_code == 304
+
+
+def test_state_since(monkeypatch):
+    client = make_client(monkeypatch)
+
+    res = client.get("/api/state?since=5")
+    assert res.get_json()["removed"] == ["B"]
+
+
+def test_static_assets_gzip_and_cache(tmp_path, monkeypatch):
+    (tmp_path / "index.html").write_text("<html>" + "dashboard " * 200 + "</html>")
+    (tmp_path / "zones.html").write_text("<html>zones</html>" * 50)
+    monkeypatch.setattr(main, "state_manager", types.SimpleNamespace())
+    client = main.create_app(StaticAssets(str(tmp_path), max_age=600)).test_client()
+
+    res = client.get("/static/zones.html", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert res.headers["Cache-Control"] == "public, max-age=600"
+    assert gzip.decompress(res.data) == (tmp_path / "zones.html").read_bytes()
+
+    res = client.get("/static/zones.html", headers={"If-None-Match": res.headers["ETag"], "Accept-Encoding": "gzip"})
+    assert res.status_code == 304
+
+    res = client.get("/")
+    assert "Content-Encoding" not in res.headers
+    assert res.headers["Cache-Control"] == "no-cache"
+    assert client.get("/static/missing.js").status_code == 404
+
+
+def test_streams_past_the_cap_get_503_and_requests_still_run(monkeypatch):
+    manager = types.SimpleNamespace(
+        state_version=1,
+        get_state_json=lambda: (1, b"{}"),
+        events=EventHub(),
+    )
+    manager.subscribe_events = lambda: (manager.events.subscribe(), {}, {})
+    monkeypatch.setattr(main, "state_manager", manager)
+    # Streams notice their closed client at the next keepalive
+    monkeypatch.setattr(main, "STREAM_KEEPALIVE_SECONDS", 0.05)
+    streams = 2
+    server = ThreadPoolWSGIServer(
+        "127.0.0.1", 0, main.create_app(max_streams=streams), threads=streams + 1, keepalive_timeout=0.5
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connections = []
+    try:
+        for n in range(streams + 1):
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=2)
+            conn.request("GET", "/api/stream")
+            res = conn.getresponse()
+            connections.append(conn)
+            if n < streams:
+                assert res.status == 200
+                assert res.read1().startswith(b"event: snapshot")
+            else:
+                assert res.status == 503
+                res.read()
+                conn.close()
+        assert manager.events.subscriber_count() == streams
+
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=2)
+        conn.request("GET", "/api/state")
+        assert conn.getresponse().status == 200
+        conn.close()
+    finally:
+        for conn in connections:
+            conn.close()
+        deadline = time.monotonic() + 2
+        while manager.events.subscriber_count() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+
+from async_runtime import AsyncIngestPipeline, AsyncRelayDispatcher, AsyncScheduler
+from relay_controller import AsyncRelayConnectionPool
+
+
+def test_async_scheduler_replaces_pending_callback():
+    async def scenario():
+        scheduler = AsyncScheduler(asyncio.get_running_loop())
+        ran = []
+        scheduler.schedule(("reset", "A"), 0.01, lambda: ran.append("first"))
+        scheduler.schedule(("reset", "A"), 0.02, lambda: ran.append("second"))
+        scheduler.schedule("check", 0.01, lambda: ran.append("check"))
+        assert scheduler.pending_count("reset") == 1
+        await asyncio.sleep(0.05)
+        assert scheduler.pending_count() == 0
+        return ran
+
+    assert asyncio.run(scenario()) == ["check", "second"]
+
+
+def test_async_scheduler_runs_callbacks_off_the_loop():
+    async def scenario():
+        scheduler = AsyncScheduler(asyncio.get_running_loop())
+        threads = []
+        scheduler.schedule("reset", 0, lambda: threads.append(threading.get_ident()))
+        await asyncio.sleep(0.05)
+        return threads
+
+    threads = asyncio.run(scenario())
+    assert len(threads) == 1 and threads[0] != threading.get_ident()
+
+
+def test_async_ingest_pipeline_keeps_device_order_off_the_loop():
+    handled = []
+
+    def handler(payload):
+        handled.append((payload, threading.get_ident()))
+
+    async def scenario():
+        pipeline = AsyncIngestPipeline(asyncio.get_running_loop(), handler, workers=2, queue_size=2, overflow="block")
+        pipeline.start()
+        for n in range(10):
+            pipeline.submit("application/1/device/A/rx", ("A", n))
+            pipeline.submit("application/1/device/B/rx", ("B", n))
+        await pipeline.aclose()
+        return pipeline.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["received"] == stats["processed"] == 20 and stats["dropped"] == 0
+    for device in "AB":
+        assert [n for (d, n), _ in handled if d == device] == list(range(10))
+    assert threading.get_ident() not in {thread for _, thread in handled}
+
+
+def test_async_ingest_pipeline_drops_oldest_when_full():
+    handled = []
+
+    async def scenario():
+        pipeline = AsyncIngestPipeline(asyncio.get_running_loop(), handled.append, workers=1, queue_size=2)
+        for n in range(5):
+            pipeline.submit("application/1/device/A/rx", n)
+        pipeline.start()
+        await pipeline.aclose()
+        return pipeline.stats()
+
+    stats = asyncio.run(scenario())
+    assert handled == [3, 4]
+    assert stats["dropped"] == 3 and stats["queue_depth"] == 0
+
+
+def test_async_dispatcher_pipelines_over_one_stream():
+    received = []
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        while line := await reader.readline():
+            received.append(line.decode().strip())
+            writer.write(b"OK\n")
+            await writer.drain()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        dispatcher = AsyncRelayDispatcher(
+            asyncio.get_running_loop(), AsyncRelayConnectionPool(port=port)
+        )
+        dispatcher.submit("127.0.0.1", 1, True)
+        dispatcher.submit("127.0.0.1", 2, True)
+        dispatcher.submit("127.0.0.1", 2, False)
+        assert dispatcher.pending_count() == 2
+        await dispatcher._wait_idle()
+        dispatcher.submit("127.0.0.1", 3, True)
+        await dispatcher._wait_idle()
+        dispatcher.pool.close_all()
+        server.close()
+
+    asyncio.run(scenario())
+    assert received == ["SR 1 on", "SR 2 off", "SR 3 on"]
+    assert len(connections) == 1
+
+
+def test_async_dispatcher_reconciles_only_mismatching_relays():
+    received = []
+    relays = {1: True, 2: False}
+
+    async def handle(reader, writer):
+        while line := await reader.readline():
+            parts = line.decode().split()
+            received.append(" ".join(parts))
+            if parts[0] == "GR":
+                writer.write(b"on\n" if relays.get(int(parts[1])) else b"off\n")
+            else:
+                writer.write(b"OK\n")
+            await writer.drain()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        dispatcher = AsyncRelayDispatcher(
+            asyncio.get_running_loop(), AsyncRelayConnectionPool(port=port)
+        )
+        dispatcher.reconcile("127.0.0.1", {1: True, 2: True})
+        await dispatcher._wait_idle()
+        dispatcher.pool.close_all()
+        server.close()
+
+    asyncio.run(scenario())
+    assert received == ["GR 1", "GR 2", "SR 2 on"]
+
+
+def test_async_dispatcher_reports_relays_of_an_unreachable_controller():
+    unreached = []
+
+    async def scenario():
+        server = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        dispatcher = AsyncRelayDispatcher(
+            asyncio.get_running_loop(), AsyncRelayConnectionPool(port=port)
+        )
+        dispatcher.reconcile("127.0.0.1", {1: True, 2: False}, lambda ip, states: unreached.append((ip, states)))
+        await dispatcher._wait_idle()
+
+    asyncio.run(scenario())
+    assert unreached == [("127.0.0.1", {1: True, 2: False})]
@@ -0,0 +1,49 @@
+import json
+
+import mqtt_listener
+import replay
+from capture import CaptureWriter, capture_files, read_capture
+
+
+def test_capture_round_trip_and_rotation(tmp_path):
+    path = str(tmp_path / "capture.jsonl")
+    writer = CaptureWriter(path, max_bytes=200, backup_count=2)
+    for i in range(10):
+        writer.record(f"application/1/device/{i}/event/up", b'{"n": %d}' % i, received_at=1000 + i)
+    writer.record("binary", b"\xff\x00", received_at=2000)
+    writer.close()
+
+    files = capture_files(path)
+    assert files[-1] == path
+    assert len(files) == 3  # current file and two backups, older ones dropped
+    messages = list(read_capture(files))
+    assert messages[-1] == (2000, "binary", b"\xff\x00")
+    received = [t for t, _, _ in messages]
+    assert received == sorted(received)
+
+
+def test_replay_reports_stages(tmp_path, monkeypatch):
+    for name in ("state_manager", "handler", "ingest_pipeline", "codec_registry", "capture", "dedup"):
+        monkeypatch.setattr(mqtt_listener, name, getattr(mqtt_listener, name))
+    monkeypatch.setattr(replay.StateManager, "_start_offline_checker", lambda self: None)
+
+    path = str(tmp_path / "capture.jsonl")
+    writer = CaptureWriter(path)
+    uplink = {"devEUI": "A", "deviceName": "sensor_Z1", "applicationName": "invissys", "data": "00230110100001"}
+    for i in range(5):
+        writer.record("application/1/device/A/event/up", json.dumps(uplink).encode(), received_at=i)
+    writer.close()
+
+    report = replay.replay(capture_files(path), str(tmp_path / "replay.db"))
+
+    assert report["messages"] == 5
+    assert report["sensors"] == 1
+    assert report["stages"]["update_sensor"]["count"] == 5
+    assert "replayed 5 messages" in replay.format_report(report).lower()
+
+    # A second replay times each message once: nothing was left patched
+    process_message = mqtt_listener.process_message
+    report = replay.replay(capture_files(path), str(tmp_path / "replay2.db"), workers=2)
+    assert report["stages"]["process_message"]["count"] == 5
+    assert mqtt_listener.process_message is process_message
+    assert mqtt_listener.handler is None and mqtt_listener.ingest_pipeline is None
@@ -0,0 +1,53 @@
+import logging
+
+from codec import invissys, milesight
+import codec_registry
+from codec_registry import CodecRegistry
+
+
+def test_discovers_codec_modules():
+    registry = CodecRegistry()
+    registry.discover()
+
+    assert registry.get("invissys") is invissys.decode
+    assert registry.get("milesight") is milesight.decode
+
+
+def test_allowed_restricts_codecs():
+    registry = CodecRegistry(allowed=["milesight"])
+
+    assert registry.get("invissys") is None
+    assert registry.get("milesight") is milesight.decode
+
+
+def test_unknown_codec_warns_once(caplog):
+    registry = CodecRegistry()
+
+    with caplog.at_level(logging.WARNING):
+        for _ in range(3):
+            assert registry.get("unknown") is None
+
+    assert len([r for r in caplog.records if "unknown" in r.getMessage()]) == 1
+    assert registry.unknown_counts() == {"unknown": 3}
+
+
+def test_unknown_names_are_bounded(monkeypatch):
+    monkeypatch.setattr(codec_registry, "MAX_UNKNOWN_NAMES", 2)
+    registry = CodecRegistry()
+    registry.discover()
+
+    for name in ("a", "b", "a", "c"):
+        registry.get(name)
+
+    # "b" was the least recently seen name
+    assert registry.unknown_counts() == {"a": 2, "c": 1}
+
+
+def test_batch_decoder_falls_back_to_decode():
+    registry = CodecRegistry()
+    registry.discover()
+    registry._decoders["plain"] = lambda payload: {"length": len(payload)}
+
+    assert registry.get_batch("invissys") is invissys.decode_batch
+    assert registry.get_batch("plain")([b"ab", b"c"]) == {"length": [2, 1], "error": [None, None]}
+    assert registry.get_batch("unknown") is None
@@ -130,4 +130,40 @@ def test_milesight_button_event():
         "battery_low": None,
         "alarm": True,
         "alarm_expire": True,
-    }
\ No newline at end of file
+    }
+
+BATCH = [
+    bytes([0x00, 0x21, 0x01, 0x00, 0x00]),
+    bytes([0x00, 0x23, 0x01, 0x10, 0x10, 0x01]),
+    bytes([0x01, 0x19, 0x10, 0x00]),
+    bytes([0x01, 0x1E, 0x10, 0x10, 0x01, 0x08]),
+    bytes([0x00, 0x1E, 0x10, 0x10, 0x01, 0x00]),
+    bytes([0x00, 0x1E, 0x02, 0x10]),
+    bytes([0x00, 0x1E, 0x10, 0x10, 0x01]),
+    bytes([0x00, 0x1E]),
+]
+
+
+@pytest.mark.parametrize("vectorize", [False, True])
+def test_invissys_decode_batch_matches_decode(vectorize):
+    if vectorize:
+        pytest.importorskip("numpy")
+    columns = invissys.decode_batch(BATCH, vectorize=vectorize)
+
+    for i, payload in enumerate(BATCH):
+        try:
+            expected = invissys.decode(payload)
+        except ValueError as e:
+            assert columns["error"][i] == str(e)
+            assert all(columns[field][i] is None for field in invissys.FIELDS)
+            continue
+        assert columns["error"][i] is None
+        assert {field: columns[field][i] for field in invissys.FIELDS} == expected
+
+
+def test_milesight_decode_batch():
+    columns = milesight.decode_batch([bytes([0x01, 0x75, 0x64]), bytes([0xff, 0x2e, 0x03]), b""])
+    assert columns["frameType"] == ["UP_HEARTBEAT", "UP_EVENT", None]
+    assert columns["alarm"] == [None, True, None]
+    assert columns["error"][:2] == [None, None]
+    assert columns["error"][2]
@@ -0,0 +1,26 @@
+from event_hub import OVERFLOW, EventHub
+
+
+def test_publish_fans_out_to_subscribers():
+    hub = EventHub()
+    first = hub.subscribe()
+    second = hub.subscribe()
+
+    hub.publish("sensor", {"dev_eui": "A"})
+
+    assert first.get(timeout=0) == ("sensor", {"dev_eui": "A"})
+    assert second.get(timeout=0) == ("sensor", {"dev_eui": "A"})
+    assert first.get(timeout=0) is None
+
+
+def test_slow_subscriber_is_dropped():
+    hub = EventHub(max_queue=2)
+    slow = hub.subscribe()
+
+    for i in range(3):
+        hub.publish("sensor", i)
+
+    assert hub.subscriber_count() == 0
+    assert slow.get(timeout=0) == ("sensor", 0)
+    assert slow.get(timeout=0) == ("sensor", 1)
+    assert slow.get(timeout=0) is OVERFLOW
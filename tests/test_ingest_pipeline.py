@@ -0,0 +1,45 @@
+import threading
+
+from ingest_pipeline import IngestPipeline, shard_key
+
+
+def test_shard_key_uses_dev_eui():
+    assert shard_key("application/1/device/0011aabb/event/up") == "0011aabb"
+    assert shard_key("other/topic") == "other/topic"
+
+
+def test_messages_of_a_device_keep_their_order():
+    handled = []
+    lock = threading.Lock()
+
+    def handler(payload):
+        with lock:
+            handled.append(payload)
+
+    pipeline = IngestPipeline(handler, workers=4, queue_size=100, overflow="block")
+    pipeline.start()
+    for i in range(50):
+        for dev in ("a", "b", "c"):
+            pipeline.submit(f"application/1/device/{dev}/event/up", (dev, i))
+    pipeline.stop()
+
+    for dev in ("a", "b", "c"):
+        assert [i for d, i in handled if d == dev] == list(range(50))
+    assert pipeline.stats()["processed"] == 150
+
+
+def test_drop_oldest_and_drop_newest():
+    topic = "application/1/device/a/event/up"
+    for overflow, expected in (("drop_oldest", [2, 3]), ("drop_newest", [0, 1])):
+        handled = []
+        pipeline = IngestPipeline(handled.append, workers=1, queue_size=2, overflow=overflow)
+        for i in range(4):
+            pipeline.submit(topic, i)
+
+        stats = pipeline.stats()
+        assert stats["dropped"] == 2
+        assert stats["queue_depth"] == 2
+
+        pipeline.start()
+        pipeline.stop()
+        assert handled == expected
@@ -0,0 +1,71 @@
+import logging
+
+import logger_config
+from logger_config import RateLimitFilter
+
+
+def make_record(msg, *args, level=logging.ERROR, lineno=10):
+    return logging.LogRecord("root", level, "relay.py", lineno, msg, args, None)
+
+
+def test_identical_errors_are_rate_limited(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(logger_config.time, "monotonic", lambda: clock[0])
+    limiter = RateLimitFilter(interval=60)
+
+    assert limiter.filter(make_record("Fail sending to %s", "10.0.0.1"))
+    assert not limiter.filter(make_record("Fail sending to %s", "10.0.0.1"))
+    assert not limiter.filter(make_record("Fail sending to %s", "10.0.0.1"))
+    assert limiter.filter(make_record("Fail sending to %s", "10.0.0.2"))
+    assert limiter.filter(make_record("debug", level=logging.DEBUG))
+    assert limiter.filter(make_record("debug", level=logging.DEBUG))
+
+    clock[0] += 61
+    record = make_record("Fail sending to %s", "10.0.0.1")
+    assert limiter.filter(record)
+    assert record.getMessage() == "Fail sending to 10.0.0.1 (2 identical messages suppressed)"
+
+
+def test_pending_summaries_are_flushed_without_another_copy(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(logger_config.time, "monotonic", lambda: clock[0])
+    limiter = RateLimitFilter(interval=60)
+    for _ in range(3):
+        limiter.filter(make_record("Fail sending to %s", "10.0.0.1"))
+    limiter.filter(make_record("once"))
+
+    assert limiter.pending() == []
+    clock[0] += 61
+    (summary,) = limiter.pending()
+    assert summary.getMessage() == "Fail sending to 10.0.0.1 (2 identical messages suppressed)"
+    assert summary.levelno == logging.ERROR
+    # Forgotten once reported: the next copy is logged right away
+    assert limiter.filter(make_record("Fail sending to %s", "10.0.0.1"))
+
+
+def test_shutdown_reports_suppressed_and_dropped_records(capsys):
+    logger_config.setup_logging("INFO", queue_size=1)
+    try:
+        logger_config._listener.stop()  # nothing drains the queue for now
+        for message in ("burst", "burst", "other", "another"):
+            logging.warning(message)
+        logger_config._listener.start()
+        assert logger_config.dropped_records() == 2
+    finally:
+        logger_config.stop_logging()
+        logging.basicConfig(force=True)
+
+    out = capsys.readouterr().out
+    assert "burst (1 identical messages suppressed)" in out
+    assert "2 log records were dropped" in out
+
+
+def test_records_are_written_by_the_listener(capsys):
+    logger_config.setup_logging("INFO")
+    try:
+        logging.info("hello %s", "queue")
+    finally:
+        logger_config.stop_logging()
+        logging.basicConfig(force=True)
+
+    assert "[INFO] hello queue" in capsys.readouterr().out
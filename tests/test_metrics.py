@@ -0,0 +1,57 @@
+import types
+
+import main
+import metrics
+
+
+def test_counter_and_histogram_render():
+    counter = metrics.Counter("test_events_total", "Events", ("kind",))
+    counter.inc("a")
+    counter.inc("a", amount=2)
+    histogram = metrics.Histogram("test_seconds", "Durations", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    lines = list(counter.samples()) + list(histogram.samples())
+
+    assert ("test_events_total", '{kind="a"}', 3) in lines
+    assert ("test_seconds_bucket", '{le="0.1"}', 1) in lines
+    assert ("test_seconds_bucket", '{le="1.0"}', 2) in lines
+    assert ("test_seconds_bucket", '{le="+Inf"}', 3) in lines
+    assert ("test_seconds_count", "", 3) in lines
+
+
+def test_timed_lock_observes_wait_and_hold():
+    wait = metrics.Histogram("wait", "")
+    hold = metrics.Histogram("hold", "")
+    lock = metrics.TimedLock(wait, hold)
+
+    with lock:
+        assert lock.locked()
+    assert lock.acquire(blocking=False)
+    lock.release()
+
+    assert wait.count() == 2
+    assert hold.count() == 2
+
+
+def test_metrics_route(monkeypatch):
+    manager = types.SimpleNamespace(
+        state={"A": {}},
+        scheduler=types.SimpleNamespace(pending_count=lambda group=None: 1),
+        relay_dispatcher=types.SimpleNamespace(pending_count=lambda: 0),
+        store=types.SimpleNamespace(queue_depth=4),
+        events=types.SimpleNamespace(subscriber_count=lambda: 0),
+    )
+    monkeypatch.setattr(main, "state_manager", manager)
+    metrics.MESSAGES_RECEIVED.inc()
+
+    res = main.create_app().test_client().get("/metrics")
+
+    body = res.get_data(as_text=True)
+    assert res.mimetype == "text/plain"
+    assert "# TYPE relaycontrol_mqtt_messages_total counter" in body
+    assert "relaycontrol_sensors 1" in body
+    assert 'relaycontrol_scheduler_pending{kind="alarm_reset"} 1' in body
+    assert "relaycontrol_write_behind_pending 4" in body
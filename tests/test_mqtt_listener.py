@@ -1,15 +1,10 @@
 import base64
 import json
-import sys
-import types
-
-# Provide a minimal stub for the paho.mqtt.client module used by mqtt_listener
-mqtt_stub = types.SimpleNamespace(Client=lambda client_id=None: types.SimpleNamespace())
-sys.modules.setdefault("paho", types.SimpleNamespace(mqtt=types.SimpleNamespace(client=mqtt_stub)))
-sys.modules.setdefault("paho.mqtt", types.SimpleNamespace(client=mqtt_stub))
-sys.modules.setdefault("paho.mqtt.client", mqtt_stub)
 
+import metrics
 import mqtt_listener
+from ingest_pipeline import IngestPipeline
+from uplink_dedup import DuplicateFilter
 
 class DummyStateManager:
     def __init__(self):
@@ -19,6 +14,8 @@ class DummyStateManager:
         self.calls.append((dev_eui, dev_name, data))
 
 class DummyMsg:
+    topic = "application/1/device/A/event/up"
+
     def __init__(self, payload):
         self.payload = payload
 
@@ -73,4 +70,50 @@ def test_on_message_base64(monkeypatch):
         "data": payload_base64,
     }
     calls = run_on_message(payload, monkeypatch)
-    assert calls == [("B", "sensor", expected)]
\ No newline at end of file
+    assert calls == [("B", "sensor", expected)]
+
+
+def test_duplicate_uplinks_are_processed_once(monkeypatch):
+    monkeypatch.setattr(mqtt_listener, "dedup", DuplicateFilter(ttl=60))
+    payload = {
+        "devEUI": "C",
+        "deviceName": "sensor",
+        "applicationName": "invissys",
+        "fCnt": 12,
+        "data": "0021010000",
+    }
+    calls = run_on_message(payload, monkeypatch)
+    calls += run_on_message(dict(payload, rxInfo=[{"gatewayID": "gw2"}]), monkeypatch)
+    calls += run_on_message(dict(payload, fCnt=13), monkeypatch)
+
+    assert [c[0] for c in calls] == ["C", "C"]
+    assert mqtt_listener.ingest_stats()["duplicates"] == 1
+
+    # Without fCnt a repeated identical frame is a real uplink
+    del payload["fCnt"]
+    calls = run_on_message(payload, monkeypatch) + run_on_message(payload, monkeypatch)
+    assert len(calls) == 2
+
+
+def test_duplicates_are_dropped_before_the_ingest_queue(monkeypatch):
+    monkeypatch.setattr(mqtt_listener, "dedup", DuplicateFilter(ttl=60))
+    # Workers not started: the single queue slot stays taken
+    pipeline = IngestPipeline(mqtt_listener.process_message, workers=1, queue_size=1, overflow="drop_newest")
+    monkeypatch.setattr(mqtt_listener, "ingest_pipeline", pipeline)
+    uplink = {"devEUI": "D", "applicationName": "invissys", "fCnt": 1, "data": "0021010000"}
+    for _ in range(3):
+        mqtt_listener.on_message(None, None, DummyMsg(json.dumps(uplink).encode()))
+
+    assert pipeline.stats()["received"] == 1
+    assert pipeline.stats()["dropped"] == 0
+
+
+def test_unregistered_codec_names_share_one_metric_label(monkeypatch):
+    monkeypatch.setattr(metrics, "MESSAGES_FAILED", metrics.Counter("failed", "", ("codec", "reason")))
+    for n in range(50):
+        run_on_message({"devEUI": "A", "applicationName": f"app{n}", "data": "00"}, monkeypatch)
+    run_on_message({"devEUI": "A", "applicationName": "invissys", "data_encode": "rot13"}, monkeypatch)
+    assert metrics.MESSAGES_FAILED._values == {
+        ("unknown", "unknown_codec"): 50,
+        ("invissys", "encoding"): 1,
+    }
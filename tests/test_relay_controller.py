@@ -1,15 +1,132 @@
 import socket
 from unittest import mock
 
-from relay_controller import send_tcp_command
+import pytest
+
+import relay_controller
+from relay_controller import send_tcp_command, send_tcp_commands, query_relay_status
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(relay_controller, "_pool", relay_controller.RelayConnectionPool())
+
 
 def test_send_tcp_command():
     sock_mock = mock.MagicMock()
-    conn_mock = mock.MagicMock()
-    conn_mock.__enter__.return_value = sock_mock
+    sock_mock.recv.return_value = b"OK\n"
 
-    with mock.patch('socket.create_connection', return_value=conn_mock) as create_conn:
-        send_tcp_command('10.0.0.1', 3, True)
+    with mock.patch('socket.create_connection', return_value=sock_mock) as create_conn:
+        assert send_tcp_command('10.0.0.1', 3, True) == "OK"
 
     create_conn.assert_called_with(('10.0.0.1', 17123), timeout=2)
-    sock_mock.sendall.assert_called_once_with(b'SR 3 on\n')
\ No newline at end of file
+    sock_mock.sendall.assert_called_once_with(b'SR 3 on\n')
+
+
+def test_session_is_reused():
+    sock_mock = mock.MagicMock()
+    sock_mock.recv.return_value = b"OK\n"
+
+    with mock.patch('socket.create_connection', return_value=sock_mock) as create_conn:
+        send_tcp_command('10.0.0.1', 3, True)
+        send_tcp_command('10.0.0.1', 3, False)
+
+    assert create_conn.call_count == 1
+    assert sock_mock.sendall.call_count == 2
+
+
+def test_broken_session_reconnects():
+    stale = mock.MagicMock()
+    stale.recv.side_effect = [b"OK\n", b""]
+    fresh = mock.MagicMock()
+    fresh.recv.return_value = b"OK\n"
+
+    with mock.patch('socket.create_connection', side_effect=[stale, fresh]) as create_conn:
+        send_tcp_command('10.0.0.1', 1, True)
+        assert send_tcp_command('10.0.0.1', 1, False) == "OK"
+
+    assert create_conn.call_count == 2
+    fresh.sendall.assert_called_once_with(b'SR 1 off\n')
+
+
+def test_batch_is_pipelined_and_acks_matched():
+    sock_mock = mock.MagicMock()
+    sock_mock.recv.side_effect = [b"OK 1\nOK", b" 2\nOK 3\n"]
+
+    with mock.patch('socket.create_connection', return_value=sock_mock):
+        acks = send_tcp_commands('10.0.0.1', [(1, True), (2, False), (3, True)])
+
+    sock_mock.sendall.assert_called_once_with(b'SR 1 on\nSR 2 off\nSR 3 on\n')
+    assert acks == ["OK 1", "OK 2", "OK 3"]
+
+
+def test_unreachable_controller_returns_none():
+    with mock.patch('socket.create_connection', side_effect=OSError("unreachable")) as create_conn:
+        assert send_tcp_commands('10.0.0.1', [(1, True)]) is None
+
+    assert create_conn.call_count == 1
+
+
+def test_query_relay_status_reads_all_relays_in_one_exchange():
+    sock_mock = mock.MagicMock()
+    sock_mock.recv.side_effect = [b"on\nOFF\n", b"GR 4 1\n?\n"]
+
+    with mock.patch('socket.create_connection', return_value=sock_mock) as create_conn:
+        status = query_relay_status('10.0.0.1', [1, 2, 4, 7])
+
+    assert create_conn.call_count == 1
+    sock_mock.sendall.assert_called_once_with(b'GR 1\nGR 2\nGR 4\nGR 7\n')
+    assert status == {1: True, 2: False, 4: True, 7: None}
+
+    with mock.patch('socket.create_connection', side_effect=OSError("unreachable")):
+        relay_controller._pool.close_all()
+        assert query_relay_status('10.0.0.2', [1]) is None
+
+
+def test_single_ack_without_newline_is_taken_after_the_grace_period():
+    sock_mock = mock.MagicMock()
+    sock_mock.recv.side_effect = [b"O", b"K", socket.timeout()]
+
+    with mock.patch('socket.create_connection', return_value=sock_mock):
+        assert send_tcp_command('10.0.0.1', 3, True) == "OK"
+
+    # A partial first read is not taken as the whole ack
+    assert sock_mock.recv.call_count == 3
+    sock_mock.settimeout.assert_any_call(relay_controller.LAST_ACK_GRACE)
+    sock_mock.settimeout.assert_called_with(2)
+
+
+def test_batch_last_ack_without_newline_is_framed_like_a_single_one():
+    sock_mock = mock.MagicMock()
+    sock_mock.recv.side_effect = [b"OK 1\nOK 2\nOK", socket.timeout()]
+
+    with mock.patch('socket.create_connection', return_value=sock_mock):
+        acks = send_tcp_commands('10.0.0.1', [(1, True), (2, False), (3, True)])
+
+    assert acks == ["OK 1", "OK 2", "OK"]
+    sock_mock.settimeout.assert_any_call(relay_controller.LAST_ACK_GRACE)
+
+    # At EOF the partial last ack is kept too, and the next batch reconnects
+    closing = mock.MagicMock()
+    closing.recv.side_effect = [b"OK 1\nOK 2", b""]
+    with mock.patch('socket.create_connection', return_value=closing):
+        relay_controller._pool.close_all()
+        assert send_tcp_commands('10.0.0.1', [(1, True), (2, False)]) == ["OK 1", "OK 2"]
+    closing.close.assert_called_once()
+
+
+def test_ack_reader_frames_acks_for_both_transports():
+    reader = relay_controller._AckReader(b"OK\n\n", 3)
+    assert reader.acks == ["OK"]
+    assert reader.timeout(2) == 2
+    reader.feed(b"OK\nO")
+    assert reader.timeout(2) == relay_controller.LAST_ACK_GRACE
+    reader.feed(b"K")
+    reader.feed(None)  # no newline within the grace period
+    assert reader.acks == ["OK", "OK", "OK"] and reader.timeout(2) is None
+
+    reader = relay_controller._AckReader(b"", 2)
+    with pytest.raises(ConnectionError):
+        reader.feed(b"")
+    with pytest.raises(TimeoutError):
+        reader.feed(None)
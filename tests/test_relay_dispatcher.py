@@ -0,0 +1,96 @@
+import socket
+import threading
+
+import relay_controller
+from relay_controller import RelayConnectionPool
+from relay_dispatcher import RelayDispatcher
+
+
+def test_pending_commands_for_same_relay_collapse():
+    started = threading.Event()
+    release = threading.Event()
+    sent = []
+
+    def send(ip, commands):
+        started.set()
+        release.wait(1)
+        sent.append((ip, commands))
+
+    dispatcher = RelayDispatcher(send)
+    dispatcher.submit("10.0.0.1", 1, True)
+    assert started.wait(1)  # the worker is now blocked sending relay 1
+    dispatcher.submit("10.0.0.1", 2, True)
+    dispatcher.submit("10.0.0.1", 2, False)
+    dispatcher.submit("10.0.0.1", 2, True)
+    assert dispatcher.pending_count() == 1
+
+    release.set()
+    assert dispatcher.wait_idle(timeout=1)
+    assert sent == [("10.0.0.1", [(1, True)]), ("10.0.0.1", [(2, True)])]
+    dispatcher.stop()
+
+
+def test_queued_commands_are_sent_as_one_batch():
+    started = threading.Event()
+    release = threading.Event()
+    sent = []
+
+    def send(ip, commands):
+        started.set()
+        release.wait(1)
+        sent.append(commands)
+
+    dispatcher = RelayDispatcher(send)
+    dispatcher.submit("10.0.0.1", 1, True)
+    assert started.wait(1)
+    for index in (2, 3, 4):
+        dispatcher.submit("10.0.0.1", index, True)
+
+    release.set()
+    dispatcher.stop()
+    assert sent == [[(1, True)], [(2, True), (3, True), (4, True)]]
+
+
+def test_controllers_are_driven_in_parallel():
+    blocked = threading.Event()
+    sent = []
+
+    def send(ip, commands):
+        if ip == "10.0.0.1":
+            blocked.wait(1)
+        sent.append(ip)
+
+    dispatcher = RelayDispatcher(send)
+    dispatcher.submit("10.0.0.1", 1, True)
+    dispatcher.submit("10.0.0.2", 1, True)
+
+    assert dispatcher._workers["10.0.0.2"].wait_idle(timeout=1)
+    assert sent == ["10.0.0.2"]
+
+    blocked.set()
+    dispatcher.stop()
+    assert sent == ["10.0.0.2", "10.0.0.1"]
+
+
+def test_reconcile_drives_relays_of_a_controller_without_gr(monkeypatch):
+    received = []
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def serve():
+        conn, _ = server.accept()
+        with conn, conn.makefile("rb") as lines:
+            for line in lines:
+                received.append(line.decode().strip())
+                conn.sendall(b"ERR unknown command\n" if line.startswith(b"GR") else b"OK\n")
+
+    threading.Thread(target=serve, daemon=True).start()
+    monkeypatch.setattr(relay_controller, "_pool", RelayConnectionPool(port=server.getsockname()[1]))
+    unreached = []
+    dispatcher = RelayDispatcher()
+    dispatcher.reconcile("127.0.0.1", {1: True, 2: False}, lambda ip, states: unreached.append(states))
+    assert dispatcher.wait_idle(timeout=2)
+    dispatcher.stop()
+    relay_controller._pool.close_all()
+    server.close()
+    assert received == ["GR 1", "GR 2", "SR 1 on", "SR 2 off"]
+    assert unreached == []
@@ -0,0 +1,62 @@
+import threading
+import time
+
+from scheduler import Scheduler
+
+
+def test_callbacks_run_in_deadline_order():
+    scheduler = Scheduler()
+    ran = []
+    done = threading.Event()
+
+    scheduler.schedule("b", 0.04, lambda: (ran.append("b"), done.set()))
+    scheduler.schedule("a", 0.01, lambda: ran.append("a"))
+
+    assert done.wait(1)
+    assert ran == ["a", "b"]
+    assert scheduler.pending_count() == 0
+    scheduler.stop()
+
+
+def test_reschedule_replaces_pending_callback():
+    scheduler = Scheduler()
+    ran = []
+    done = threading.Event()
+
+    scheduler.schedule("a", 0.01, lambda: ran.append("first"))
+    scheduler.schedule("a", 0.03, lambda: (ran.append("second"), done.set()))
+    assert scheduler.pending_count() == 1
+
+    assert done.wait(1)
+    time.sleep(0.02)
+    assert ran == ["second"]
+    scheduler.stop()
+
+
+def test_cancel():
+    scheduler = Scheduler()
+    ran = []
+
+    scheduler.schedule("a", 0.01, lambda: ran.append("a"))
+    assert scheduler.cancel("a") is True
+    assert scheduler.cancel("a") is False
+    assert scheduler.pending_count() == 0
+
+    time.sleep(0.03)
+    assert ran == []
+    scheduler.stop()
+
+
+def test_pending_count_per_group():
+    scheduler = Scheduler()
+
+    scheduler.schedule(("reset", "A"), 10, lambda: None)
+    scheduler.schedule(("reset", "B"), 10, lambda: None)
+    scheduler.schedule(("reset", "B"), 10, lambda: None)
+    scheduler.schedule("check", 10, lambda: None)
+
+    assert scheduler.pending_count() == 3
+    assert scheduler.pending_count("reset") == 2
+    scheduler.cancel(("reset", "A"))
+    assert scheduler.pending_count("reset") == 1
+    scheduler.stop()
@@ -0,0 +1,31 @@
+import pytest
+
+from sensor_record import SensorRecord, ALARM, OFFLINE
+
+
+def test_record_reads_like_a_state_dict():
+    row = {
+        "dev_name": "sensor1_Z1",
+        "zone": "Z1",
+        "last_seen": "2026-01-02T03:04:05Z",
+        "alarm": True,
+        "tamper": False,
+        "battery_low": False,
+        "offline": True,
+    }
+    record = SensorRecord.from_dict(row)
+    assert record.flags == ALARM | OFFLINE
+    assert record["alarm"] is True and record["tamper"] is False
+    assert record.get("zone") == "Z1"
+    assert record.get("battery_voltage") is None
+    assert dict(record) == row == record.as_dict()
+
+    with pytest.raises(TypeError):
+        record["offline"] = False
+    with pytest.raises(AttributeError):
+        record.flags = ALARM
+    assert record.flags == ALARM | OFFLINE
+
+
+def test_record_has_no_instance_dict():
+    assert not hasattr(SensorRecord(), "__dict__")
@@ -0,0 +1,12 @@
+from sensor_shards import SensorShards
+
+
+def test_replace_leaves_the_published_mapping_untouched():
+    before = SensorShards.from_dict({"A": 1, "B": 2}, shard_count=4)
+    after = before.replace("C", 3).replace("A", None).replace("B", 5)
+
+    assert dict(before) == {"A": 1, "B": 2}
+    assert dict(after) == {"B": 5, "C": 3}
+    assert len(after) == 2 and "A" not in after
+    assert after.get("A") is None and after["C"] == 3
+    assert dict(after.items()) == {"B": 5, "C": 3}
@@ -0,0 +1,26 @@
+import json
+
+import snapshot_cache
+from snapshot_cache import SnapshotCache
+
+
+def test_body_reencodes_only_dirty_sensors(monkeypatch):
+    cache = SnapshotCache()
+    cache.load({"A": {"alarm": False}, "B": {"alarm": True}}, 1)
+    version, body = cache.body()
+    assert version == 1
+    assert json.loads(body) == {"A": {"alarm": False}, "B": {"alarm": True}}
+    assert cache.body()[1] is body  # cached until the version changes
+
+    encoded = []
+    original = snapshot_cache._fragment
+    monkeypatch.setattr(snapshot_cache, "_fragment", lambda k, e: encoded.append(k) or original(k, e))
+
+    entry = {"alarm": False}
+    cache.mark("B", entry, 2)
+    assert cache._dirty["B"] is entry  # records are immutable, never copied
+    cache.mark("A", None, 3)
+    version, body = cache.body()
+    assert version == 3
+    assert encoded == ["B"]
+    assert json.loads(body) == {"B": {"alarm": False}}
@@ -0,0 +1,30 @@
+import threading
+
+from sqlite_connection import SQLiteConnectionManager
+
+
+def test_connection_is_reused_per_thread(tmp_path):
+    db = SQLiteConnectionManager(str(tmp_path / "state.db"))
+
+    conn = db.connection()
+    assert db.connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db.connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+    db.close_all()
+
+
+def test_configure_reapplies_pragmas(tmp_path):
+    db = SQLiteConnectionManager(str(tmp_path / "state.db"), synchronous="FULL")
+    conn = db.connection()
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+
+    db.configure(synchronous="off", cache_size=-4096)
+    conn = db.connection()
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 0
+    assert conn.execute("PRAGMA cache_size").fetchone()[0] == -4096
+    db.close_all()
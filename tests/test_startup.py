@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import threading
+import types
+
+import pytest
+
+import state_manager_instance
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def test_importing_main_has_no_side_effects(tmp_path):
+    code = (
+        "import sys, main, mqtt_listener\n"
+        "print(sorted(m for m in ('flask', 'yaml', 'paho', 'numpy', 'sqlite3', 'state_manager') if m in sys.modules))\n"
+        "print(main.state_manager, mqtt_listener.client)\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=tmp_path, env=dict(os.environ, PYTHONPATH=SRC),
+        capture_output=True, text=True, check=True,
+    ).stdout.splitlines()
+    assert out == ["[]", "None None"]
+    assert os.listdir(tmp_path) == []  # no state.db opened
+
+
+def test_state_manager_created_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(state_manager_instance, "_state_manager", None)
+    monkeypatch.setattr("state_manager.StateManager._start_offline_checker", lambda self: None)
+    db_path = str(tmp_path / "state.db")
+
+    manager = state_manager_instance.get_state_manager(db_path=db_path, json_path=None)
+    assert state_manager_instance.get_state_manager() is manager
+    assert state_manager_instance.state_manager is manager
+    manager.close()
+
+
+def test_graceful_exit_waits_for_the_asyncio_runtime(monkeypatch):
+    import main
+
+    events = []
+    stopped = threading.Event()
+
+    def run():
+        stopped.wait(1)
+        events.append("runtime drained")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    monkeypatch.setattr(main, "runtime", types.SimpleNamespace(stop=stopped.set))
+    monkeypatch.setattr(main, "mqtt_thread", thread)
+    monkeypatch.setattr(main, "state_manager", types.SimpleNamespace(close=lambda: events.append("closed")))
+    monkeypatch.setattr(main, "stop_logging", lambda: None)
+    with pytest.raises(SystemExit):
+        main.graceful_exit(None, None)
+    assert events == ["runtime drained", "closed"]
@@ -0,0 +1,55 @@
+import sqlite3
+import time
+
+from sqlite_state_store import SQLiteStateStore
+
+
+def count_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM sensors").fetchone()[0]
+
+
+def test_save_sensor_is_synchronous_by_default(tmp_path):
+    db = str(tmp_path / "state.db")
+    store = SQLiteStateStore(db_path=db, json_path=None)
+
+    store.save_sensor("A", {"dev_name": "s_Z1", "zone": "Z1", "alarm": True})
+
+    assert store.queue_depth == 0
+    assert store.load_all()["A"]["alarm"] is True
+
+
+def test_write_behind_coalesces_and_flushes(tmp_path):
+    db = str(tmp_path / "state.db")
+    store = SQLiteStateStore(db_path=db, json_path=None)
+    store.start_write_behind(flush_interval=60, batch_size=100)
+
+    store.save_sensor("A", {"zone": "Z1", "alarm": True})
+    store.save_sensor("A", {"zone": "Z1", "alarm": False})
+    store.save_sensor("B", {"zone": "Z2", "tamper": True})
+
+    assert store.queue_depth == 2
+    assert count_rows(db) == 0
+
+    store.close()
+
+    assert store.queue_depth == 0
+    data = store.load_all()
+    assert data["A"]["alarm"] is False
+    assert data["B"]["tamper"] is True
+
+
+def test_write_behind_flushes_on_batch_size(tmp_path):
+    db = str(tmp_path / "state.db")
+    store = SQLiteStateStore(db_path=db, json_path=None)
+    store.start_write_behind(flush_interval=60, batch_size=2)
+
+    store.save_sensor("A", {"zone": "Z1"})
+    store.save_sensor("B", {"zone": "Z1"})
+
+    for _ in range(100):
+        if count_rows(db) == 2:
+            break
+        time.sleep(0.01)
+    assert count_rows(db) == 2
+    store.close()
@@ -0,0 +1,28 @@
+from uplink_dedup import DuplicateFilter, uplink_key
+
+
+def test_copies_are_dropped_within_the_window():
+    now = [0.0]
+    dedup = DuplicateFilter(ttl=10, max_entries=2, clock=lambda: now[0])
+
+    assert not dedup.is_duplicate(("A", 1))
+    now[0] = 9.0
+    assert dedup.is_duplicate(("A", 1))
+    assert not dedup.is_duplicate(("B", 1))
+    now[0] = 10.0
+    # The copy at 9 s did not extend the window of ("A", 1)
+    assert not dedup.is_duplicate(("A", 1))
+    assert dedup.duplicates == 1
+
+    # Full: the oldest key goes first
+    assert not dedup.is_duplicate(("C", 1))
+    assert len(dedup) == 2
+    assert not dedup.is_duplicate(("B", 1))
+
+
+def test_uplink_key_ignores_gateway_metadata():
+    first = {"devEUI": "A", "fCnt": 7, "data": "00", "rxInfo": [{"gatewayID": "gw1"}]}
+    copy = {"devEUI": "A", "fCnt": 7, "data": "00", "rxInfo": [{"gatewayID": "gw2"}]}
+    assert uplink_key(first) == uplink_key(copy) == ("A", 7)
+    # Without fCnt an identical repeated frame is legitimate and always kept
+    assert uplink_key({"devEUI": "A", "data": "00"}) is None
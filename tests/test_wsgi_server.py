@@ -0,0 +1,47 @@
+import http.client
+import threading
+
+from wsgi_server import ThreadPoolWSGIServer
+
+
+def app(environ, start_response):
+    body = environ["PATH_INFO"].encode()
+    start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+def test_keep_alive_on_pooled_server():
+    server = ThreadPoolWSGIServer("127.0.0.1", 0, app, threads=2, keepalive_timeout=1, request_timeout=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=2)
+        for path in ("/a", "/b"):
+            conn.request("GET", path)
+            res = conn.getresponse()
+            assert res.version == 11
+            assert res.read() == path.encode()
+        # Both requests went over the same socket
+        assert conn.sock is not None
+        conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_idle_keep_alive_connection_frees_its_worker():
+    server = ThreadPoolWSGIServer("127.0.0.1", 0, app, threads=1, keepalive_timeout=0.2, request_timeout=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        idle = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=2)
+        idle.request("GET", "/idle")
+        assert idle.getresponse().read() == b"/idle"
+        # The only worker is free again once the idle connection times out
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=2)
+        conn.request("GET", "/next")
+        assert conn.getresponse().read() == b"/next"
+        conn.close()
+        idle.close()
+    finally:
+        server.shutdown()
+        server.server_close()
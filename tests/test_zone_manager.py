@@ -1,6 +1,7 @@
 import logging
 import pytest
 import time
+import types
 
 import state_manager as sm
 from sqlite_zone_store import SQLiteZoneStore
@@ -18,9 +19,11 @@ def setup_manager(monkeypatch):
     monkeypatch.setattr(SQLiteZoneStore, "load_all", lambda self: zone_cfg)
 
     commands = []
-    def fake_send(ip, index, state):
-        commands.append((ip, index, state))
-    monkeypatch.setattr(sm, "send_tcp_command", fake_send)
+    def fake_send(ip, batch):
+        for index, state in batch:
+            commands.append((ip, index, state))
+        return ["OK"] * len(batch)
+    monkeypatch.setattr(sm, "send_tcp_commands", fake_send)
 
     tmp = tempfile.NamedTemporaryFile(delete=False)
     tmp.close()
@@ -28,10 +31,15 @@ def setup_manager(monkeypatch):
     return manager, commands
 
 
+def update(manager, *args):
+    manager.update_sensor(*args)
+    manager.relay_dispatcher.wait_idle(timeout=1)
+
+
 def test_zone_update(monkeypatch):
     manager, commands = setup_manager(monkeypatch)
 
-    manager.update_sensor("A", "sensor1_Z1", {"alarm": True, "tamper": True})
+    update(manager, "A", "sensor1_Z1", {"alarm": True, "tamper": True})
     assert manager.zones["Z1"]["alarm"] is True
     assert manager.zones["Z1"]["tamper"] is True
     assert manager.zones["Z1"]["battery_low"] is False
@@ -43,64 +51,320 @@ def test_zone_update(monkeypatch):
     assert ("127.0.0.1", 4, False) in commands
 
     commands.clear()
-    manager.update_sensor("B", "sensor2_Z1", {"battery_low": True})
+    update(manager, "B", "sensor2_Z1", {"battery_low": True})
     assert manager.zones["Z1"]["battery_low"] is True
     assert len(commands) == 1
     assert ("127.0.0.1", 3, True) in commands
 
     commands.clear()
-    manager.update_sensor("C", "sensor3_Z2", {"battery_low": True})
+    update(manager, "C", "sensor3_Z2", {"battery_low": True})
     assert manager.zones["Z2"]["battery_low"] is True
     assert len(commands) == 1
     assert ("127.0.0.1", 5, False) in commands
 
     commands.clear()
-    manager.update_sensor("B", "sensor2_Z1", {"battery_low": False})
+    update(manager, "B", "sensor2_Z1", {"battery_low": False})
     assert manager.zones["Z1"]["battery_low"] is False
     assert len(commands) == 0
 
     commands.clear()
-    manager.update_sensor("C", "sensor3_Z2", {"battery_low": False})
+    update(manager, "C", "sensor3_Z2", {"battery_low": False})
     assert manager.zones["Z2"]["battery_low"] is False
     assert len(commands) == 1
     assert ("127.0.0.1", 3, False) in commands
 
 
+def test_sensor_moving_between_zones(monkeypatch):
+    manager, commands = setup_manager(monkeypatch)
+
+    update(manager, "A", "sensor_Z1", {"alarm": True, "tamper": True})
+    update(manager, "B", "sensor_Z2", {"tamper": True})
+    assert manager.zones["Z1"]["alarm"] is True
+
+    update(manager, "A", "sensor_Z2", {"alarm": True, "tamper": False})
+    assert manager.zones["Z1"] == {
+        "alarm": False, "tamper": False, "battery_low": False, "offline": False
+    }
+    assert manager.zones["Z2"]["alarm"] is True
+    assert manager.zones["Z2"]["tamper"] is True
+    assert manager._zone_counts == {"Z1": [0, 0, 0, 0], "Z2": [1, 1, 0, 0]}
+    assert ("127.0.0.1", 1, False) in commands
+    assert ("127.0.0.1", 5, True) in commands
+
+
+def test_only_changed_shared_relays_are_evaluated(monkeypatch):
+    manager, commands = setup_manager(monkeypatch)
+    update(manager, "A", "sensor_Z1", {"tamper": False})
+
+    evaluated = []
+    apply = manager._apply_relay_state
+    monkeypatch.setattr(
+        manager, "_apply_relay_state",
+        lambda ip, index, state: (evaluated.append(index), apply(ip, index, state)),
+    )
+
+    update(manager, "A", "sensor_Z1", {"tamper": False})
+    assert evaluated == []
+
+    update(manager, "A", "sensor_Z1", {"battery_low": True})
+    assert evaluated == [3]
+
+
+def test_zone_config_change_rebuilds_relay_groups(monkeypatch):
+    monkeypatch.setattr(sm.StateManager, "_start_offline_checker", lambda self: None)
+    monkeypatch.setattr(SQLiteZoneStore, "migrate_from_yaml", lambda self: None)
+    commands = []
+    monkeypatch.setattr(
+        sm, "send_tcp_commands",
+        lambda ip, batch: commands.extend((ip, index, state) for index, state in batch),
+    )
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    tmp.close()
+    manager = sm.StateManager(db_path=tmp.name, json_path=None)
+
+    update(manager, "A", "sensor_Z1", {"tamper": True})
+    assert commands == []
+
+    manager.save_zone_config("Z1", {"ip": "10.0.0.1", "alarm": 1, "tamper": 2})
+    manager.relay_dispatcher.wait_idle(timeout=1)
+    assert manager._zone_groups == {"Z1": [("10.0.0.1", 2)]}
+    assert sorted(commands) == [("10.0.0.1", 1, False), ("10.0.0.1", 2, True)]
+
+    commands.clear()
+    manager.delete_zone_config("Z1")
+    assert manager._relay_groups == {}
+    assert commands == []
+
+
 def test_offline_detection(monkeypatch):
     manager, commands = setup_manager(monkeypatch)
-    monkeypatch.setattr(sm, "OFFLINE_THRESHOLD_HOURS", 0)
+    clock = [1_000_000.0]
+    monkeypatch.setattr(sm, "time", types.SimpleNamespace(time=lambda: clock[0]))
+    monkeypatch.setattr(sm, "OFFLINE_THRESHOLD_HOURS", 1)
 
-    manager.update_sensor("X", "sensor_Z1", {"alarm": False})
-    manager.update_sensor("Y", "sensor_Z2", {"alarm": False})
+    update(manager, "X", "sensor_Z1", {"alarm": False})
+    update(manager, "Y", "sensor_Z2", {"alarm": False})
     commands.clear()
-    manager.state["X"]["last_seen"] = "2000-01-01T00:00:00Z"
 
+    clock[0] += 1800
+    update(manager, "Y", "sensor_Z2", {"alarm": False})
+    clock[0] += 1801
     manager.run_offline_check()
+    manager.relay_dispatcher.wait_idle(timeout=1)
 
     assert manager.state["X"]["offline"] is True
+    assert manager.state["Y"]["offline"] is False
     assert manager.zones["Z1"]["offline"] is True
-    assert len(commands) == 1
-    assert ("127.0.0.1", 4, True) in commands
+    assert manager.zones["Z2"]["offline"] is False
+    assert commands == [("127.0.0.1", 4, True)]
+    assert manager._offline_heap == [(1_000_000.0 + 5400, "Y")]
 
+    clock[0] += 1800
+    manager.run_offline_check()
+    assert manager.state["Y"]["offline"] is True
+    assert manager._offline_heap == []
 
-class FakeTimer:
-    def __init__(self, interval, func):
-        self.func = func
 
-    def start(self):
-        sm.threading.Thread(target=self.func).start()
+def test_offline_deadlines_loaded_at_startup(monkeypatch):
+    manager, commands = setup_manager(monkeypatch)
+    manager.update_sensor("X", "sensor_Z1", {"alarm": False})
+    manager.store.save_sensor("X", dict(manager.state["X"], last_seen="2000-01-01T00:00:00Z"))
 
-    def cancel(self):
+    reloaded = sm.StateManager(db_path=manager.store.db_path, json_path=None)
+    assert list(reloaded._offline_deadlines) == ["X"]
+    reloaded.run_offline_check()
+    assert reloaded.state["X"]["offline"] is True
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.callbacks = {}
+
+    def schedule(self, key, delay, callback):
+        self.callbacks[key] = (delay, callback)
+
+    def pending_count(self, group=None):
+        return len([key for key in self.callbacks if group is None or key[0] == group])
+
+    def stop(self):
         pass
 
 
 def test_alarm_auto_reset(monkeypatch):
     manager, commands = setup_manager(monkeypatch)
-    monkeypatch.setattr(sm.threading, "Timer", FakeTimer)
+    manager.scheduler = FakeScheduler()
 
-    manager.update_sensor("A1", "sensor_Z1", {"alarm": True, "alarm_expire": True})
-    time.sleep(0.05)
+    update(manager, "A1", "sensor_Z1", {"alarm": True, "alarm_expire": True})
+    update(manager, "A1", "sensor_Z1", {"alarm": True, "alarm_expire": True})
+    assert ("127.0.0.1", 1, True) in commands
+    assert manager.pending_alarm_resets() == 1
+
+    delay, reset = manager.scheduler.callbacks.pop(("alarm_reset", "A1"))
+    assert delay == sm.ALARM_RESET_SECONDS
+    reset()
+    manager.relay_dispatcher.wait_idle(timeout=1)
 
     assert manager.zones["Z1"]["alarm"] is False
+    assert ("127.0.0.1", 1, False) in commands
+
+
+def test_update_sensor_does_not_wait_for_relays(monkeypatch):
+    manager, commands = setup_manager(monkeypatch)
+    release = sm.threading.Event()
+
+    def slow_send(ip, batch):
+        release.wait(1)
+        commands.extend((ip, index, state) for index, state in batch)
+
+    manager.relay_dispatcher = sm.RelayDispatcher(slow_send)
+    start = time.monotonic()
+    manager.update_sensor("A", "sensor_Z1", {"alarm": True})
+    assert time.monotonic() - start < 0.5
+    assert manager.relay_state[("127.0.0.1", 1)] is True
+
+    release.set()
+    manager.relay_dispatcher.wait_idle(timeout=1)
     assert ("127.0.0.1", 1, True) in commands
-    assert ("127.0.0.1", 1, False) in commands
\ No newline at end of file
+
+
+def test_relay_state_survives_restart_and_is_reconciled(monkeypatch):
+    manager, commands = setup_manager(monkeypatch)
+    update(manager, "A", "sensor_Z1", {"alarm": True, "tamper": True})
+    desired = dict(manager.relay_state)
+    manager.close()
+
+    queried = []
+    answering = [True]
+    def fake_query(ip, indexes):
+        if not answering[0]:
+            return None
+        queried.append((ip, sorted(indexes)))
+        # Relay 1 was switched off by hand while the service was down
+        return {index: index != 1 and desired[(ip, index)] for index in indexes}
+    monkeypatch.setattr(sm, "query_relay_status", fake_query)
+
+    restarted = sm.StateManager(db_path=manager.db.db_path, json_path=None)
+    assert restarted.relay_state == desired
+    commands.clear()
+    assert restarted.reconcile_relays() == 1
+    restarted.relay_dispatcher.wait_idle(timeout=1)
+    assert queried == [("127.0.0.1", sorted(index for _, index in desired))]
+    assert commands == [("127.0.0.1", 1, True)]
+
+    # The unchanged desired state does not resend the relay on the next uplink
+    update(restarted, "A", "sensor_Z1", {"alarm": True, "tamper": True})
+    assert commands == [("127.0.0.1", 1, True)]
+
+    # Relays whose state cannot be read back are driven all the same
+    answering[0] = False
+    commands.clear()
+    restarted.reconcile_relays()
+    restarted.relay_dispatcher.wait_idle(timeout=1)
+    assert sorted(commands) == sorted((ip, index, state) for (ip, index), state in desired.items())
+
+    # Those of an unreachable controller are forgotten, so the next evaluation drives them
+    restarted.relay_dispatcher = sm.RelayDispatcher(lambda ip, batch: None, fake_query)
+    restarted.reconcile_relays()
+    restarted.relay_dispatcher.wait_idle(timeout=1)
+    assert restarted.relay_state == {}
+    commands.clear()
+    restarted.relay_dispatcher = sm.RelayDispatcher(sm.send_tcp_commands, fake_query)
+    update(restarted, "A", "sensor_Z1", {"alarm": False, "tamper": True})
+    assert ("127.0.0.1", 1, False) in commands
+
+
+def test_relay_states_are_saved_outside_the_lock_and_pruned(monkeypatch):
+    manager, commands = setup_manager(monkeypatch)
+    flush = manager.relay_store.flush
+    def checked_flush():
+        assert not manager.lock.locked()
+        flush()
+    monkeypatch.setattr(manager.relay_store, "flush", checked_flush)
+
+    update(manager, "A", "sensor_Z2", {"alarm": True})
+    assert manager.relay_store.load_all()[("127.0.0.1", 5)] is True
+
+    # Removing Z2 forgets its alarm relay; the shared ones still serve Z1
+    del manager.zone_store.load_all()["Z2"]
+    manager.delete_zone_config("Z2")
+    assert ("127.0.0.1", 5) not in manager.relay_state
+    assert set(manager.relay_store.load_all()) == {("127.0.0.1", i) for i in (1, 2, 3, 4)}
+
+
+def test_state_delta_since_version(monkeypatch):
+    manager, commands = setup_manager(monkeypatch)
+
+    update(manager, "A", "sensor1_Z1", {"alarm": True})
+    version, state = manager.get_state_versioned()
+    assert set(state) == {"A"}
+
+    update(manager, "B", "sensor2_Z1", {"tamper": True})
+    delta = manager.get_state_since(version)
+    assert delta["full"] is False
+    assert set(delta["state"]) == {"B"}
+    assert delta["removed"] == []
+
+    assert manager.remove_sensor("A") is True
+    assert manager.remove_sensor("A") is False
+    assert manager.zones["Z1"]["alarm"] is False
+    delta = manager.get_state_since(version)
+    assert set(delta["state"]) == {"B"}
+    assert delta["removed"] == ["A"]
+
+    assert manager.get_state_since(delta["version"])["state"] == {}
+    # Unknown or pre-restart versions get the whole state
+    assert manager.get_state_since(0)["full"] is True
+    assert manager.get_state_since(delta["version"] + 1)["full"] is True
+
+
+def test_update_sensor_keeps_only_state_fields(monkeypatch):
+    manager, commands = setup_manager(monkeypatch)
+
+    update(manager, "A", "sensor1_Z1", {"alarm": True, "battery_voltage": 3.1, "frameType": 2})
+    update(manager, "A", "sensor1_Z1", {"tamper": True, "alarm": None})
+    state = manager.get_sensor("A")
+    assert set(state) == {"dev_name", "zone", "last_seen", "alarm", "tamper", "battery_low", "offline"}
+    assert state["alarm"] is True and state["tamper"] is True
+    assert state["zone"] == "Z1"
+    assert state["last_seen"].endswith("Z")
+
+
+def test_reads_do_not_wait_for_writers(monkeypatch):
+    manager, commands = setup_manager(monkeypatch)
+    update(manager, "A", "sensor1_Z1", {"alarm": True})
+
+    with manager.lock, manager._zone_locks.hold("Z1"):
+        result = []
+        reader = sm.threading.Thread(target=lambda: result.append((
+            manager.get_sensor("A"), manager.get_state_versioned(), manager.get_zone_states_versioned()
+        )))
+        reader.start()
+        reader.join(timeout=1)
+        assert result, "reader blocked on a writer lock"
+    sensor, (version, state), (zones_version, zones) = result[0]
+    assert sensor["alarm"] is True
+    assert state["A"] == sensor and version == manager.state_version
+    assert zones["Z1"]["alarm"] is True
+
+
+def test_concurrent_updates_keep_zone_counters_consistent(monkeypatch):
+    manager, commands = setup_manager(monkeypatch)
+
+    def writer(n):
+        for i in range(200):
+            # Sensors hop between zones to exercise the two-zone locking
+            manager.update_sensor(f"S{i % 20}", f"sensor_Z{1 + (i + n) % 2}", {"alarm": bool((i + n) & 1)})
+
+    threads = [sm.threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    manager.relay_dispatcher.wait_idle(timeout=1)
+
+    for zone in ("Z1", "Z2"):
+        members = {d for d, e in manager.state.items() if e.zone == zone}
+        assert {d for d, (z, _) in manager._indexed.items() if z == zone} == members
+        alarms = sum(1 for d in members if manager.state[d]["alarm"])
+        assert manager._zone_counts[zone][0] == alarms
+        assert manager.zones[zone]["alarm"] is (alarms > 0)